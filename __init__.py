@@ -1,12 +1,18 @@
 
 from utils.db_manager import(
+    db,
     conn, 
     cursor, 
     is_valid_email, 
     is_valid_password, 
     hash_password, 
     check_password,
+    update_password_hash,
     log_transaction, 
+    record_transaction,
+    new_idempotency_key,
+    transaction,
+    bulk_insert_transactions,
     get_user_cards, 
     debug_transactions, 
     get_total_balance,
@@ -15,6 +21,12 @@ from utils.db_manager import(
     update_user_card, 
     delete_user_card,
     transfer_money_between_cards, 
+    record_balance_checkpoint,
+    refresh_balance_checkpoints,
+    get_card_balance_at,
+    get_card_balance_series,
+    reconcile_card_balances,
+    accept_card_balances,
     log_savings_transaction, 
     get_user_envelopes,
     create_envelope, 
@@ -23,12 +35,23 @@ from utils.db_manager import(
     get_envelope_stats,
     update_envelope, 
     get_analytics_data, 
+    get_daily_series,
+    get_spending_forecasts,
+    get_spending_anomalies,
+    dismiss_spending_anomaly,
     get_category_breakdown, 
     get_top_categories,
+    get_category_rules,
+    add_category_rule,
+    delete_category_rule,
+    recategorize_transactions,
     get_cards_analytics, 
     get_budget_progress, 
     get_insights_and_forecasts,
     get_monthly_comparison, 
+    bump_data_version,
+    get_analytics_cache_stats,
+    clear_analytics_cache,
     save_profile_photo, 
     get_profile_photo,
     log_user_session, 
@@ -42,14 +65,22 @@ from utils.db_manager import(
     get_user_by_email,
     get_user_savings_plans, 
     get_user_transactions,
+    get_transactions_page,
+    search_transactions,
     setup_db,
-    safe_color_conversion  # Додано для повноти
+    wait_db_ready,
+    checkpoint_database,
+    safe_color_conversion,  # Додано для повноти
+    to_cents,
+    from_cents,
+    period_range
 )
 
 # Хардкод списку функцій для __all__. Це гарантує, що
 # ці імена будуть доступні при імпорті 'from utils import *'.
 __all__ = [
     # Глобальні об'єкти
+    'db',
     'conn', 
     'cursor', 
     
@@ -58,6 +89,7 @@ __all__ = [
     'is_valid_password', 
     'hash_password', 
     'check_password', 
+    'update_password_hash',
     'create_user', 
     'get_user_by_email',
     'log_user_session',
@@ -74,10 +106,22 @@ __all__ = [
     'delete_user_card', 
     'transfer_money_between_cards',
     'get_user_card_by_id',
+    'record_balance_checkpoint',
+    'refresh_balance_checkpoints',
+    'get_card_balance_at',
+    'get_card_balance_series',
+    'reconcile_card_balances',
+    'accept_card_balances',
 
     # Транзакції
     'log_transaction', 
+    'record_transaction',
+    'new_idempotency_key',
+    'transaction',
+    'bulk_insert_transactions',
     'get_user_transactions',
+    'get_transactions_page',
+    'search_transactions',
     'debug_transactions',
     
     # Конверти (Бюджетування)
@@ -94,12 +138,24 @@ __all__ = [
 
     # Аналітика
     'get_analytics_data', 
+    'get_daily_series',
+    'get_spending_forecasts',
+    'get_spending_anomalies',
+    'dismiss_spending_anomaly',
     'get_category_breakdown', 
     'get_top_categories',
+    'get_category_rules',
+    'add_category_rule',
+    'delete_category_rule',
+    'recategorize_transactions',
     'get_cards_analytics', 
     'get_budget_progress', 
     'get_insights_and_forecasts', 
     'get_monthly_comparison',
+    'bump_data_version',
+    'analytics_snapshot',
+    'get_analytics_cache_stats',
+    'clear_analytics_cache',
     
     # Профіль та Налаштування
     'save_profile_photo', 
@@ -112,5 +168,10 @@ __all__ = [
     
     # Утиліти
     'setup_db',
-    'safe_color_conversion'
+    'wait_db_ready',
+    'checkpoint_database',
+    'safe_color_conversion',
+    'to_cents',
+    'from_cents',
+    'period_range'
 ]
\ No newline at end of file
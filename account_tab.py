@@ -13,6 +13,8 @@ from kivy.uix.button import Button
 from kivy.uix.filechooser import FileChooserListView
 from kivy.uix.image import Image
 from kivy.uix.progressbar import ProgressBar
+from kivy.uix.checkbox import CheckBox
+from kivy.uix.gridlayout import GridLayout
 from kivy.core.window import Window
 from kivy.graphics import Color, Rectangle, Line, RoundedRectangle, Ellipse
 from kivy.metrics import dp
@@ -32,11 +34,15 @@ try:
         log_user_session, get_login_history, get_user_settings, 
         update_user_settings, get_user_level, update_user_experience,
         log_security_action, get_user_by_email, check_password, 
-        hash_password, get_total_balance, get_user_cards, get_user_envelopes,
-        get_user_savings_plans, get_user_transactions, get_analytics_data,
-        get_category_breakdown, get_top_categories, get_budget_progress,
-        log_user_logout, create_envelope, add_to_envelope, safe_color_conversion, update_envelope
+        hash_password, get_total_balance,
+        get_category_breakdown, get_budget_progress,
+        log_user_logout, create_envelope, add_to_envelope, safe_color_conversion, update_envelope,
+        bump_data_version
     )
+    from utils.data_export import export_user_data_stream, export_text_report, export_path
+    from utils.jobs import job_queue, JOB_DONE
+    from utils.auth_service import check_password_async, hash_password_async
+    from utils.db_executor import run_read_query, cancel_pending
     DB_MANAGER_AVAILABLE = True
 
     # --- ІМПОРТ PLYER ТА PARTIAL ДЛЯ ДОЗВОЛІВ ---
@@ -62,6 +68,8 @@ except ImportError:
     get_user_level = lambda *args: {'level': 1, 'experience': 0, 'next_level_xp': 100, 'progress_percentage': 0, 'achievements': []}
     check_password = lambda *args: False
     hash_password = lambda p: p
+    check_password_async = lambda password, stored, on_result, on_error=None: on_result((check_password(password, stored), None))
+    hash_password_async = lambda password, on_result, on_error=None: on_result(hash_password(password))
     save_profile_photo = lambda *args: True
     get_profile_photo = lambda *args: None
     get_login_history = lambda *args: []
@@ -69,6 +77,19 @@ except ImportError:
     create_envelope = lambda *args: None
     add_to_envelope = lambda *args: None
     update_envelope = lambda *args: True
+    bump_data_version = lambda *args: None
+    export_user_data_stream = lambda *args, **kwargs: {'path': '', 'rows': {}, 'total': 0, 'cancelled': False, 'error': None}
+    export_text_report = lambda *args, **kwargs: {'path': '', 'cancelled': False, 'error': None}
+    export_path = lambda directory, username, fmt='jsonl', compress=False: os.path.join(directory, f"{username}.{fmt}")
+    JOB_DONE = 'done'
+    class _MockJobQueue:
+        jobs = []
+        def submit(self, name, fn, *args, on_done=None, **kwargs): return None
+    job_queue = _MockJobQueue()
+    def run_read_query(fn, *args, owner=None, on_result=None, on_error=None, **kwargs):
+        result = fn(cursor, *args, **kwargs)
+        if on_result: on_result(result)
+    def cancel_pending(owner): pass
     safe_color_conversion = lambda c: c if isinstance(c, list) else [0.2, 0.4, 0.8, 1]
     DB_MANAGER_AVAILABLE = False
     PLYER_AVAILABLE = False
@@ -534,6 +555,7 @@ class AccountTab(Screen):
             self.show_unauthorized_state()
 
     def on_leave(self):
+        cancel_pending(self)
         self.log_session_end()
 
     def log_session_start(self):
@@ -553,6 +575,7 @@ class AccountTab(Screen):
             print(f"Помилка логування кінця сесії: {e}")
 
     def update_account_tab(self):
+        """Показує заглушки й завантажує профіль у фоновому потоці; відображення — в on_account_loaded."""
         try:
             app = App.get_running_app()
             
@@ -560,50 +583,78 @@ class AccountTab(Screen):
                 self.show_unauthorized_state()
                 return
             
-            user_data = cursor.execute("SELECT username, email, created_at FROM users WHERE id=?", (app.current_user_id,)).fetchone()
+            if not self.ids.username_label.text:
+                self.ids.username_label.text = "Завантаження..."
             
-            if user_data:
-                username, email, created_at = user_data
+            cancel_pending(self)
+            run_read_query(self.fetch_account, app.current_user_id, owner=self,
+                           on_result=self.on_account_loaded, on_error=self.on_account_error)
                 
-                self.ids.username_label.text = f"{username}"
-                self.ids.email_label.text = f"{email}"
-                
-                total_balance = get_total_balance(cursor, app.current_user_id)
-                self.ids.balance_label.text = f"${total_balance:.2f}"
-                
-                if created_at:
-                    reg_date = created_at.split()[0] if ' ' in created_at else created_at
-                    self.ids.registration_label.text = f"З нами з: {reg_date}"
-                
-                level_info = get_user_level(cursor, app.current_user_id)
-                self.ids.status_label.text = f"Рівень {level_info['level']} • {level_info['experience']} XP"
-                
-                login_history = get_login_history(cursor, app.current_user_id, 1)
-                if login_history:
-                    last_login = login_history[0]['login_time'].split()[0]
-                    self.ids.last_login_label.text = f"Останній вхід: {last_login}"
-                else:
-                    self.ids.last_login_label.text = "Останній вхід: сьогодні"
-                
-                self.load_profile_photo()
-            else:
+        except Exception as e:
+            print(f"Помилка оновлення акаунту: {traceback.format_exc()}")
+            self.show_error_state()
+
+    def fetch_account(self, c, user_id):
+        """Виконується в робочому потоці: профіль, баланс, рівень, останній вхід і фото."""
+        user_data = c.execute("SELECT username, email, created_at FROM users WHERE id=?", (user_id,)).fetchone()
+        if not user_data:
+            return None
+        return {
+            'user': user_data,
+            'balance': get_total_balance(c, user_id),
+            'level': get_user_level(c, user_id),
+            'login_history': get_login_history(c, user_id, 1),
+            'photo': get_profile_photo(c, user_id),
+        }
+
+    def on_account_error(self, error):
+        print(f"Помилка завантаження акаунту: {error}")
+        self.show_error_state()
+
+    def on_account_loaded(self, data):
+        try:
+            if not data:
                 self.show_unauthorized_state()
+                return
+
+            username, email, created_at = data['user']
+            
+            self.ids.username_label.text = f"{username}"
+            self.ids.email_label.text = f"{email}"
+            self.ids.balance_label.text = f"${data['balance']:.2f}"
+            
+            if created_at:
+                reg_date = created_at.split()[0] if ' ' in created_at else created_at
+                self.ids.registration_label.text = f"З нами з: {reg_date}"
+            
+            level_info = data['level']
+            self.ids.status_label.text = f"Рівень {level_info['level']} • {level_info['experience']} XP"
+            
+            login_history = data['login_history']
+            if login_history:
+                last_login = login_history[0]['login_time'].split()[0]
+                self.ids.last_login_label.text = f"Останній вхід: {last_login}"
+            else:
+                self.ids.last_login_label.text = "Останній вхід: сьогодні"
+            
+            self.show_profile_photo(data['photo'])
                 
         except Exception as e:
             print(f"Помилка оновлення акаунту: {traceback.format_exc()}")
             self.show_error_state()
 
     def load_profile_photo(self):
-        """Завантажити фото з підтримкою Android"""
+        """Завантажити фото з підтримкою Android (шлях читається у фоні)"""
+        app = App.get_running_app()
+        if hasattr(app, 'current_user_id') and app.current_user_id:
+            run_read_query(get_profile_photo, app.current_user_id, owner=self, on_result=self.show_profile_photo)
+        else:
+            self.show_profile_photo(None)
+
+    def show_profile_photo(self, photo_path):
         try:
-            app = App.get_running_app()
-            if hasattr(app, 'current_user_id') and app.current_user_id:
-                photo_path = get_profile_photo(cursor, app.current_user_id)
-                
-                if photo_path and os.path.exists(photo_path):
-                    self.ids.profile_image.source = photo_path
-                else:
-                    self.ids.profile_image.source = "assets/icons/default_avatar.png"
+            if photo_path and os.path.exists(photo_path):
+                self.ids.profile_image.source = photo_path
             else:
                 self.ids.profile_image.source = "assets/icons/default_avatar.png"
         except Exception as e:
@@ -733,13 +784,23 @@ class AccountTab(Screen):
         btn_confirm = WhiteButton(text='Видалити акаунт', background_color=ERROR_RED)
         btn_cancel = WhiteButton(text='Скасувати', background_color=LIGHT_GRAY, color=DARK_TEXT)
         
-        def confirm_delete(instance):
-            password = password_input.text.strip()
-            if password and self.verify_password_for_deletion(password):
+        def on_verified(is_valid):
+            btn_confirm.disabled = False
+            btn_confirm.text = 'Видалити акаунт'
+            if is_valid:
                 self.perform_account_deletion()
                 popup.dismiss()
             else:
                 self.show_message("Невірний пароль або поле пусте")
+
+        def confirm_delete(instance):
+            password = password_input.text.strip()
+            if not password:
+                self.show_message("Невірний пароль або поле пусте")
+                return
+            btn_confirm.disabled = True
+            btn_confirm.text = 'Перевірка...'
+            self.verify_password_for_deletion(password, on_verified)
         
         btn_confirm.bind(on_press=confirm_delete)
         btn_cancel.bind(on_press=lambda x: popup.dismiss())
@@ -751,18 +812,28 @@ class AccountTab(Screen):
         popup = WhitePopup(title='Видалення акаунта', content=content, size_hint=(0.8, 0.6))
         popup.open()
 
-    def verify_password_for_deletion(self, password):
-        """Перевіряє пароль користувача для критичних дій."""
+    def fetch_password_hash(self, c, user_id):
+        """Виконується в робочому потоці: збережений хеш пароля або None."""
+        row = c.execute("SELECT password FROM users WHERE id=?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def verify_password_for_deletion(self, password, on_result):
+        """Перевіряє пароль користувача для критичних дій у фоні; on_result(вірний) — у головному потоці."""
+        def on_error(error):
+            print(f"Помилка верифікації пароля: {error}")
+            on_result(False)
+
+        def on_hash(stored):
+            if not stored:
+                on_result(False)
+                return
+            check_password_async(password, stored, on_result=lambda check: on_result(check[0]), on_error=on_error)
+
         try:
             app = App.get_running_app()
-            cursor.execute("SELECT password FROM users WHERE id=?", (app.current_user_id,))
-            result = cursor.fetchone()
-            if result:
-                return check_password(password, result[0])
-            return False
+            run_read_query(self.fetch_password_hash, app.current_user_id, owner=self, on_result=on_hash, on_error=on_error)
         except Exception as e:
-            print(f"Помилка верифікації пароля: {e}")
-            return False
+            on_error(e)
 
     def perform_account_deletion(self):
         """Видаляє всі дані користувача з бази даних."""
@@ -775,9 +846,15 @@ class AccountTab(Screen):
             tables = [
                 'envelope_transactions', 'envelopes', 'savings_transactions', 
                 'savings_plans', 'transactions', 'user_cards', 'security_logs', 
-                'user_sessions', 'user_settings', 'user_levels', 'user_profile_photos', 'wallets' 
+                'user_sessions', 'user_settings', 'user_levels', 'user_profile_photos', 'wallets',
+                'category_stats', 'spending_anomalies'
             ]
             
+            # Контрольні точки балансу прив'язані до карток, тож видаляються до них
+            cursor.execute(
+                "DELETE FROM card_balance_checkpoints WHERE card_id IN (SELECT id FROM user_cards WHERE user_id=?)",
+                (user_id,)
+            )
             for table in tables:
                 try:
                     cursor.execute(f"DELETE FROM {table} WHERE user_id=?", (user_id,))
@@ -786,6 +863,7 @@ class AccountTab(Screen):
             
             cursor.execute("DELETE FROM users WHERE id=?", (user_id,))
             conn.commit()
+            bump_data_version(user_id)
             
             self.cleanup_profile_photos(user_id) 
             
@@ -814,11 +892,17 @@ class AccountTab(Screen):
             print(f"Помилка очищення фото: {e}")
 
     def show_login_history(self):
-        """Показує історію входів з прокруткою."""
+        """Показує історію входів з прокруткою; історія читається у фоновому потоці."""
+        def on_error(error):
+            print(f"Помилка показу історії: {error}")
+            self.show_message("Помилка завантаження історії входів")
+
+        app = App.get_running_app()
+        run_read_query(get_login_history, app.current_user_id, 20, owner=self,
+                       on_result=self._show_login_history_popup, on_error=on_error)
+
+    def _show_login_history_popup(self, sessions):
         try:
-            app = App.get_running_app()
-            sessions = get_login_history(cursor, app.current_user_id, 20)
-            
             content = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(15))
             
             content.add_widget(Label(text='Історія входів', size_hint_y=None, height=dp(40), bold=True, color=PRIMARY_PINK, font_size=dp(18)))
@@ -875,12 +959,20 @@ class AccountTab(Screen):
             instance.rect.size = instance.size
 
     def edit_profile(self):
+        """Відкриває редактор профілю, заповнений поточними даними (читаються у фоні)."""
+        def on_error(error):
+            print(f"Помилка редагування профілю: {error}")
+            self.show_message("Помилка відкриття редактора")
+
+        app = App.get_running_app()
+        run_read_query(self.fetch_profile, app.current_user_id, owner=self,
+                       on_result=self._open_profile_editor, on_error=on_error)
+
+    def fetch_profile(self, c, user_id):
+        return c.execute("SELECT username, email FROM users WHERE id=?", (user_id,)).fetchone()
+
+    def _open_profile_editor(self, user_data):
         try:
-            app = App.get_running_app()
-          
-            cursor.execute("SELECT username, email FROM users WHERE id=?", (app.current_user_id,)).fetchone()
-            user_data = cursor.fetchone() 
-            
             content = BoxLayout(orientation='vertical', spacing=dp(15), padding=dp(20))
             
             content.add_widget(Label(text='Ім\'я:', color=DARK_TEXT))
@@ -951,22 +1043,48 @@ class AccountTab(Screen):
             self.show_message("Помилка відкриття редактора")
 
     def update_user_profile(self, username, email, current_password=None, new_password=None):
+        """Оновлює профіль; при зміні пароля старий перевіряється, а новий хешується у фоні."""
+        if not new_password:
+            self.save_user_profile(username, email)
+            return
+
+        def on_error(error):
+            print(f"Помилка оновлення профілю: {error}")
+            self.show_message("Помилка при оновленні профілю")
+
+        def on_checked(check):
+            if not check[0]:
+                self.show_message("Невірний поточний пароль")
+                return
+            hash_password_async(
+                new_password,
+                on_result=lambda password_hash: self.save_user_profile(username, email, password_hash),
+                on_error=on_error
+            )
+
+        def on_hash(stored):
+            if not stored or not current_password:
+                self.show_message("Невірний поточний пароль")
+                return
+            check_password_async(current_password, stored, on_result=on_checked, on_error=on_error)
+
+        try:
+            app = App.get_running_app()
+            run_read_query(self.fetch_password_hash, app.current_user_id, owner=self, on_result=on_hash, on_error=on_error)
+        except Exception as e:
+            on_error(e)
+
+    def save_user_profile(self, username, email, password_hash=None):
+        """Записує ім'я, email і (за наявності) новий хеш пароля."""
         try:
             app = App.get_running_app()
-            
-            if current_password and new_password:
-                cursor.execute("SELECT password FROM users WHERE id=?", (app.current_user_id,))
-                result = cursor.fetchone()
-                if not result or not check_password(current_password, result[0]):
-                    self.show_message("Невірний поточний пароль")
-                    return
             
             update_fields = ["username=?", "email=?", "updated_at=CURRENT_TIMESTAMP"]
             params = [username, email]
             
-            if new_password:
+            if password_hash:
                 update_fields.append("password=?")
-                params.append(hash_password(new_password))
+                params.append(password_hash)
             
             params.append(app.current_user_id)
             
@@ -977,7 +1095,7 @@ class AccountTab(Screen):
             app.current_user = username
             
             action_desc = "Оновлено профіль"
-            if new_password: action_desc += " зі зміною пароля"
+            if password_hash: action_desc += " зі зміною пароля"
             log_security_action(cursor, conn, app.current_user_id, "profile_updated", action_desc)
             
             self.update_account_tab()
@@ -990,124 +1108,92 @@ class AccountTab(Screen):
             self.show_message("Помилка при оновленні профілю")
 
     def download_user_data(self):
-   
-        try:
-            app = App.get_running_app()
-            exports_dir = "user_exports"
-         
-            if not os.path.exists(exports_dir):
-                os.makedirs(exports_dir)
-            filename = f"financial_data_{app.current_user}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-            filepath = os.path.join(exports_dir, filename)
-            
-            self.create_text_report(filepath, app.current_user_id, app.current_user)
-            
-            log_security_action(cursor, conn, app.current_user_id, "data_export", "Користувач експортував дані")
-            
-            self.show_message(f"Дані експортовано:\n{filename}")
-            
-        except Exception as e:
-            print(f"Помилка експорту: {e}")
-            self.show_message("Помилка при експорті даних")
+        """Вікно експорту: звіти ставляться в чергу й виконуються у фоні, список показує їхній прогрес."""
+        content = BoxLayout(orientation='vertical', spacing=dp(8), padding=dp(12))
+        content.add_widget(Label(text='Додати звіт у чергу', font_size=dp(16), bold=True, color=DARK_TEXT, size_hint_y=None, height=dp(30)))
+
+        buttons = GridLayout(cols=3, spacing=dp(6), size_hint_y=None, height=dp(40))
+        for text, fmt, color in (('Текст', 'txt', PRIMARY_PINK), ('JSON Lines', 'jsonl', PRIMARY_BLUE), ('CSV', 'csv', SUCCESS_GREEN)):
+            btn = WhiteButton(text=text, background_color=color)
+            btn.bind(on_press=lambda x, fmt=fmt: self.queue_export(fmt, compress_box.active))
+            buttons.add_widget(btn)
+        content.add_widget(buttons)
+
+        compress_row = BoxLayout(size_hint_y=None, height=dp(35), spacing=dp(8))
+        compress_box = CheckBox(active=True, size_hint_x=None, width=dp(35), color=PRIMARY_BLUE)
+        compress_row.add_widget(compress_box)
+        compress_row.add_widget(Label(text='Стиснути JSON/CSV (gzip)', color=DARK_TEXT, halign='left', valign='middle', text_size=(dp(220), None)))
+        content.add_widget(compress_row)
+
+        jobs_list = BoxLayout(orientation='vertical', spacing=dp(6), size_hint_y=None)
+        jobs_list.bind(minimum_height=jobs_list.setter('height'))
+        scroll = ScrollView()
+        scroll.add_widget(jobs_list)
+        content.add_widget(scroll)
+
+        btn_close = WhiteButton(text='Закрити', background_color=LIGHT_GRAY, color=DARK_TEXT, size_hint_y=None, height=dp(40))
+        content.add_widget(btn_close)
+
+        popup = WhitePopup(title='Експорт даних', content=content, size_hint=(0.9, 0.8))
+        rows = {}
+
+        def refresh(dt=None):
+            for job in job_queue.jobs:
+                if job.id not in rows:
+                    rows[job.id] = self._create_job_row(job)
+                    jobs_list.add_widget(rows[job.id][0])
+                row, progress_bar, status_label, cancel_btn = rows[job.id]
+                progress_bar.value = job.progress
+                status_label.text = f"{job.name}: {job.state_label}" + (f" ({job.detail})" if job.detail and not job.finished else "")
+                cancel_btn.disabled = job.finished
+
+        # Задачі оновлюють лише свої поля, а віджети перемальовуються таймером поки вікно відкрите
+        refresh_event = Clock.schedule_interval(refresh, 0.25)
+        popup.bind(on_dismiss=lambda x: refresh_event.cancel())
+        btn_close.bind(on_press=lambda x: popup.dismiss())
+        refresh()
+        popup.open()
 
-    def create_text_report(self, filepath, user_id, username):
-     
-        try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write("=" * 60 + "\n")
-                f.write(f"ФІНАНСОВИЙ ЗВІТ - {username}\n")
-                f.write("=" * 60 + "\n")
-                f.write(f"Дата експорту: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-                
-                f.write("ОСНОВНА ІНФОРМАЦІЯ:\n")
-                f.write("-" * 40 + "\n")
-                cursor.execute("SELECT username, email, created_at FROM users WHERE id=?", (user_id,))
-                user_data = cursor.fetchone()
-                if user_data:
-                    f.write(f"Ім'я: {user_data[0]}\n")
-                    f.write(f"Email: {user_data[1]}\n")
-                    f.write(f"Дата реєстрації: {user_data[2]}\n")
-                
-                total_balance = get_total_balance(cursor, user_id)
-                f.write(f"Загальний баланс: ${total_balance:.2f}\n\n")
-                
-                cards = get_user_cards(cursor, user_id)
-                f.write("КАРТКИ:\n")
-                f.write("-" * 40 + "\n")
-                if cards:
-                    for card in cards:
-                        f.write(f"• {card['name']} ({card['bank']}): ${card['balance']:.2f}\n")
-                else:
-                    f.write("Картки відсутні\n")
-                f.write("\n")
-                
-                envelopes = get_user_envelopes(cursor, user_id)
-                f.write("КОНВЕРТИ:\n")
-                f.write("-" * 40 + "\n")
-                if envelopes:
-                    for env in envelopes:
-                        f.write(f"• {env['name']}: ${env['current_amount']:.2f}/${env['budget_limit']:.2f} ({env['usage_percentage']:.1f}%)\n")
-                else:
-                    f.write("Конверти відсутні\n")
-                f.write("\n")
-                
-                savings = get_user_savings_plans(cursor, user_id)
-                f.write("ПЛАНИ ЗАОЩАДЖЕНЬ:\n")
-                f.write("-" * 40 + "\n")
-                if savings:
-                    for plan in savings:
-                        f.write(f"• {plan['name']}: ${plan['current_amount']:.2f}/${plan['target_amount']:.2f} ({plan['progress_percentage']:.1f}%)\n")
-                else:
-                    f.write("Плани заощаджень відсутні\n")
-                f.write("\n")
-                
-                f.write("АНАЛІТИКА ЗА МІСЯЦЬ:\n")
-                f.write("-" * 40 + "\n")
-                analytics = get_analytics_data(cursor, user_id, 'month')
-                if analytics:
-                    f.write(f"Доходи: ${analytics['total_income']:.2f}\n")
-                    f.write(f"Витрати: ${analytics['total_expenses']:.2f}\n")
-                    f.write(f"Чистий баланс: ${analytics['net_balance']:.2f}\n")
-                    f.write(f"Середні витрати/день: ${analytics['average_daily']:.2f}\n")
-                    f.write(f"Транзакції: {analytics['transactions_count']}\n")
-                    f.write(f"Рівень заощаджень: {analytics['savings_rate']:.1f}%\n\n")
-                
-                top_categories = get_top_categories(cursor, user_id, 'month', 5)
-                f.write("ТОП КАТЕГОРІЇ ВИТРАТ:\n")
-                f.write("-" * 40 + "\n")
-                if top_categories:
-                    for cat in top_categories:
-                        f.write(f"• {cat['name']}: ${cat['amount']:.2f} ({cat['value']:.1f}%)\n")
-                else:
-                    f.write("Дані про категорії відсутні\n")
-                f.write("\n")
-                
-                transactions = get_user_transactions(cursor, user_id, 10)
-                f.write("ОСТАННІ ТРАНЗАКЦІЇ:\n")
-                f.write("-" * 40 + "\n")
-                if transactions:
-                    for trans in transactions:
-                        amount_str = f"${trans['amount']:.2f}" if trans['amount'] >= 0 else f"-${abs(trans['amount']):.2f}"
-                        f.write(f"• {trans['date'][:10]} | {trans['type']} | {amount_str} | {trans['description']}\n")
-                else:
-                    f.write("Транзакції відсутні\n")
-                f.write("\n")
-                
-                f.write("=" * 60 + "\n")
-                f.write("Звіт створено автоматично системою Financial Assistant\n")
-                f.write("Усі дані захищено та конфіденційно\n")
-                f.write("=" * 60 + "\n")
-                
-        except Exception as e:
-            print(f"Помилка створення звіту: {e}")
-            raise
+    def _create_job_row(self, job):
+        row = BoxLayout(orientation='vertical', size_hint_y=None, height=dp(55), spacing=dp(2))
+        top = BoxLayout(size_hint_y=None, height=dp(30), spacing=dp(6))
+        status_label = Label(text=job.name, color=DARK_TEXT, font_size=dp(12), halign='left', valign='middle')
+        status_label.bind(size=lambda inst, size: setattr(inst, 'text_size', size))
+        cancel_btn = WhiteButton(text='Скасувати', background_color=LIGHT_GRAY, color=DARK_TEXT, font_size=dp(11), size_hint_x=None, width=dp(80))
+        cancel_btn.bind(on_press=lambda x: job.cancel())
+        top.add_widget(status_label)
+        top.add_widget(cancel_btn)
+        progress_bar = ProgressBar(max=1.0, value=0, size_hint_y=None, height=dp(15))
+        row.add_widget(top)
+        row.add_widget(progress_bar)
+        return row, progress_bar, status_label, cancel_btn
+
+    def queue_export(self, fmt, compress=False):
+        """Ставить звіт у фонову чергу; результат атомарно з'являється в user_exports/."""
+        app = App.get_running_app()
+        exports_dir = "user_exports"
+        os.makedirs(exports_dir, exist_ok=True)
+        path = export_path(exports_dir, app.current_user, fmt, compress)
+        user_id = app.current_user_id
+
+        def on_done(job):
+            if job.state == JOB_DONE:
+                log_security_action(cursor, conn, user_id, "data_export", f"Користувач експортував дані ({fmt})")
+                print(f"Дані експортовано: {path}")
+
+        if fmt == 'txt':
+            return job_queue.submit("Текстовий звіт", export_text_report, user_id, app.current_user, path, on_done=on_done)
+        name = "JSON Lines" if fmt == 'jsonl' else "CSV"
+        return job_queue.submit(name, export_user_data_stream, user_id, path, fmt=fmt, compress=compress, on_done=on_done)
 
     def show_level_info(self):
+        """Показує рівень і досягнення; дані читаються у фоновому потоці."""
+        app = App.get_running_app()
+        run_read_query(get_user_level, app.current_user_id, owner=self, on_result=self._show_level_popup,
+                       on_error=lambda error: print(f"Помилка показу інформації про рівень: {error}"))
 
+    def _show_level_popup(self, level_info):
         try:
-            app = App.get_running_app()
-            level_info = get_user_level(cursor, app.current_user_id)
-            
             content = BoxLayout(orientation='vertical', spacing=dp(15), padding=dp(20))
             
             content.add_widget(Label(text=f'Рівень: {level_info["level"]}', font_size=dp(20), bold=True, size_hint_y=None, height=dp(40), color=PRIMARY_PINK))
@@ -0,0 +1,221 @@
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+
+from utils.categorizer import OTHER_CATEGORY
+
+# --- АНАЛІТИЧНИЙ РУШІЙ (NumPy) ---
+# Журнал користувача за вікно часу завантажується одним запитом у типізовані
+# масиви, відсортовані за created_ts: час (epoch), сума в центах (за модулем),
+# код типу, код картки та код категорії. Період — це зріз масивів за
+# searchsorted, а суми за картками, категоріями, днями чи місяцями — один
+# np.bincount з вагами замість циклу по рядках.
+# Рушій не знає про групи типів (доходи/витрати) — їх передає db_manager.
+
+# Скільки днів історії завантажувати щонайменше: вистачає для 'year'
+# і порівняння за 12 місяців, тож усі вкладки ділять одне завантаження.
+LEDGER_WINDOW_DAYS = 400
+# Скільки журналів користувачів тримати в пам'яті
+LEDGER_CACHE_SIZE = 4
+
+_ledgers = OrderedDict()
+_ledgers_lock = threading.Lock()
+
+class Ledger:
+    """Журнал транзакцій користувача з since_ts у вигляді масивів NumPy.
+
+    Масиви не змінюються після завантаження, тож журнал можна читати з кількох потоків.
+    Усі суми повертаються в центах (int).
+    """
+
+    def __init__(self, user_id, since_ts, ts, amount, type_code, types,
+                 card_code, cards, category_code, categories, version=None):
+        self.user_id = user_id
+        self.since_ts = since_ts
+        self.version = version
+        self.ts = ts
+        self.amount = amount
+        # Коди — індекси у словниках {значення: код}, упорядкованих за кодом
+        self.type_code = type_code
+        self.types = types
+        self.card_code = card_code
+        self.cards = cards
+        self.category_code = category_code
+        self.categories = categories
+
+    @classmethod
+    def load(cls, cursor, user_id, since_ts, version=None):
+        cursor.execute('''
+            SELECT created_ts, ABS(amount), COALESCE(card_id, 0), type, COALESCE(category, ?)
+            FROM transactions
+            WHERE user_id=? AND created_ts >= ?
+            ORDER BY created_ts
+        ''', (OTHER_CATEGORY, user_id, since_ts))
+        rows = cursor.fetchall()
+
+        columns = tuple(zip(*rows)) or ((), (), (), (), ())
+        ts, amount, card_ids, types, categories = columns
+        type_code, types = _encode(types, np.int16)
+        card_code, cards = _encode(card_ids, np.int32)
+        category_code, categories = _encode(categories, np.int32)
+
+        return cls(
+            user_id, since_ts,
+            np.array(ts, dtype=np.int64),
+            np.array(amount, dtype=np.int64),
+            type_code, types,
+            card_code, cards,
+            category_code, categories,
+            version
+        )
+
+    def __len__(self):
+        return len(self.ts)
+
+    def _slice(self, start_ts, end_ts):
+        """Зріз рядків з created_ts у [start_ts, end_ts)."""
+        start, end = np.searchsorted(self.ts, [start_ts, end_ts], side='left')
+        return slice(start, end)
+
+    def _mask(self, rows, types=None, card_id=None, category=None):
+        """Булева маска для зрізу rows або None, якщо фільтрів немає."""
+        mask = None
+
+        def combine(current, condition):
+            return condition if current is None else current & condition
+
+        if types is not None:
+            # Таблиця "код типу -> входить у групу", далі — одна вибірка за кодами
+            selected = np.array([name in types for name in self.types], dtype=bool)
+            mask = combine(mask, selected[self.type_code[rows]])
+        if card_id is not None:
+            mask = combine(mask, self.card_code[rows] == self.cards.get(card_id, -1))
+        if category is not None:
+            mask = combine(mask, self.category_code[rows] == self.categories.get(category, -1))
+        return mask
+
+    def total(self, start_ts, end_ts, types=None, card_id=None, category=None):
+        """Сума за період для типів types (None — усі типи)."""
+        rows = self._slice(start_ts, end_ts)
+        amount = self.amount[rows]
+        mask = self._mask(rows, types, card_id, category)
+        return int(amount.sum() if mask is None else amount[mask].sum())
+
+    def count(self, start_ts, end_ts, card_id=None, category=None):
+        rows = self._slice(start_ts, end_ts)
+        mask = self._mask(rows, None, card_id, category)
+        return int(rows.stop - rows.start if mask is None else np.count_nonzero(mask))
+
+    def _grouped(self, start_ts, end_ts, codes, size, types):
+        rows = self._slice(start_ts, end_ts)
+        amount = self.amount[rows]
+        codes = codes[rows]
+        mask = self._mask(rows, types)
+        if mask is not None:
+            amount, codes = amount[mask], codes[mask]
+        # Ваги float64 точні для сум у центах до 2**53
+        return np.rint(np.bincount(codes, weights=amount, minlength=size)).astype(np.int64)
+
+    def sum_by_card(self, start_ts, end_ts, types=None):
+        """{card_id: сума} за період; card_id 0 — транзакції без картки."""
+        sums = self._grouped(start_ts, end_ts, self.card_code, len(self.cards), types)
+        return {card_id: int(total) for card_id, total in zip(self.cards, sums) if total}
+
+    def sum_by_category(self, start_ts, end_ts, types=None):
+        """{категорія: сума} за період, лише ненульові суми."""
+        sums = self._grouped(start_ts, end_ts, self.category_code, len(self.categories), types)
+        return {name: int(total) for name, total in zip(self.categories, sums) if total}
+
+    def bucket_totals(self, edges, types=None):
+        """Суми за послідовними інтервалами [edges[i], edges[i + 1]) — дні, місяці тощо."""
+        return self._bucketed(edges, None, 1, types)[0]
+
+    def card_buckets(self, edges, types=None):
+        """(card_ids, матриця [картка, інтервал]) — суми кожної картки за інтервалами edges."""
+        return list(self.cards), self._bucketed(edges, self.card_code, len(self.cards), types)
+
+    def _bucketed(self, edges, codes, size, types):
+        edges = np.asarray(edges, dtype=np.int64)
+        buckets = max(0, len(edges) - 1)
+        if not buckets:
+            return np.zeros((size, 0), dtype=np.int64)
+
+        rows = self._slice(edges[0], edges[-1])
+        amount = self.amount[rows]
+        # Код групи та інтервал зводяться в один індекс: група * buckets + інтервал
+        index = np.searchsorted(edges, self.ts[rows], side='right') - 1
+        if codes is not None:
+            index = index + codes[rows].astype(np.int64) * buckets
+        mask = self._mask(rows, types)
+        if mask is not None:
+            amount, index = amount[mask], index[mask]
+        sums = np.bincount(index, weights=amount, minlength=size * buckets)
+        return np.rint(sums).astype(np.int64).reshape(size, buckets)
+
+    def daily_series(self, start, days, types=None):
+        """(дні, суми) за days локальних днів, починаючи з дня start (datetime)."""
+        dates, edges = day_edges(start, days)
+        return dates, self.bucket_totals(edges, types)
+
+def _encode(values, dtype):
+    """Коди значень у порядку першої появи та словник {значення: код}."""
+    index = {}
+    codes = np.fromiter((index.setdefault(value, len(index)) for value in values), dtype=dtype, count=len(values))
+    return codes, index
+
+def day_edges(start, days):
+    """Локальні дати та межі днів (epoch) від півночі дня start: days дат і days + 1 меж."""
+    first = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    # Через datetime, а не +86400: дні переходу на літній час мають 23 або 25 годин
+    dates = [first + timedelta(days=offset) for offset in range(days + 1)]
+    return [day.date() for day in dates[:-1]], [int(day.timestamp()) for day in dates]
+
+def rolling_mean(values, window):
+    """Ковзне середнє за window значень через cumsum; на початку — середнє наявних."""
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return values
+    window = max(1, int(window))
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    end = np.arange(1, len(values) + 1)
+    start = np.maximum(0, end - window)
+    return (cumulative[end] - cumulative[start]) / (end - start)
+
+def get_ledger(cursor, user_id, since_ts, version=None):
+    """Журнал користувача щонайменше з since_ts для версії даних version.
+
+    Завантажений журнал повторно використовується, доки версія не зміниться,
+    а запитаний період вкладається в уже завантажене вікно.
+    """
+    with _ledgers_lock:
+        ledger = _ledgers.get(user_id)
+        if ledger is not None and ledger.version == version and ledger.since_ts <= since_ts:
+            _ledgers.move_to_end(user_id)
+            return ledger
+
+    ledger = Ledger.load(cursor, user_id, since_ts, version)
+
+    with _ledgers_lock:
+        _ledgers[user_id] = ledger
+        _ledgers.move_to_end(user_id)
+        while len(_ledgers) > LEDGER_CACHE_SIZE:
+            _ledgers.popitem(last=False)
+    return ledger
+
+def clear_ledgers(user_id=None):
+    with _ledgers_lock:
+        if user_id is None:
+            _ledgers.clear()
+        else:
+            _ledgers.pop(user_id, None)
+
+__all__ = [
+    'LEDGER_WINDOW_DAYS',
+    'Ledger',
+    'day_edges',
+    'rolling_mean',
+    'get_ledger',
+    'clear_ledgers',
+]
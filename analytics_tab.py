@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 from kivy.uix.screenmanager import Screen
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.gridlayout import GridLayout
@@ -26,9 +26,11 @@ from utils.db_manager import (
     get_user_cards, get_envelope_transactions, get_envelope_stats,
     get_analytics_data, get_category_breakdown, get_top_categories,
     get_cards_analytics, get_budget_progress, get_insights_and_forecasts,
-    get_monthly_comparison, update_envelope, safe_color_conversion
+    get_monthly_comparison, update_envelope, safe_color_conversion, new_idempotency_key,
+    bump_data_version, from_cents, get_daily_series, get_spending_forecasts
 )
 from utils.widgets import WhitePopup, WhiteButton, WhiteTextInput
+from utils.db_executor import run_read_query, cancel_pending
 
 # --- КОНСТАНТИ КОЛЬОРУ ---
 PRIMARY_PINK = (0.95, 0.3, 0.5, 1)
@@ -167,6 +169,11 @@ class CompactEnvelopeCard(BoxLayout):
             percent_label = Label(text=f"{percentage:.0f}%", font_size=dp(10), color=WHITE, size_hint_y=None, height=dp(16))
             self.add_widget(percent_label)
         
+        if envelope_data.get('forecast'):
+            self.height += dp(16)
+            forecast_label = Label(text=f"Прогноз: {envelope_data['forecast']:.0f} $", font_size=dp(10), color=WHITE, size_hint_y=None, height=dp(16))
+            self.add_widget(forecast_label)
+        
         buttons_layout = BoxLayout(size_hint_y=None, height=dp(28), spacing=dp(5))
         add_btn = Button(text='+', size_hint_x=0.5, background_color=(1, 1, 1, 0.3), color=WHITE, font_size=dp(14), bold=True)
         add_btn.bind(on_press=self.on_add_money)
@@ -487,36 +494,69 @@ class AnalyticsTab(Screen):
         self.current_popup = None
         self.analytics_data = {}
         self.daily_expenses = []
+        self.forecasts = {}
         self.use_budget = False
-        
-        Clock.schedule_once(self.create_ui, 0.1)
     
     def get_app(self): return App.get_running_app()
     
-    def create_ui(self, dt=None): self.load_data()
-    
     def on_enter(self): Clock.schedule_once(lambda dt: self.load_data(), 0.1)
     
+    def on_leave(self): cancel_pending(self)
+    
     def load_data(self):
+        """Показує заглушки та завантажує дані у фоновому потоці."""
         try:
             app = self.get_app()
             if not hasattr(app, 'current_user_id') or not app.current_user_id: return
             
             user_id = app.current_user_id
-            self.user_cards = get_user_cards(cursor, user_id) 
-            self.envelopes_data = get_user_envelopes(cursor, user_id)
+            cancel_pending(self)
+            self.show_loading_placeholders()
+            run_read_query(self.fetch_data, user_id, owner=self, on_result=self.on_data_loaded)
+            
+        except Exception as e:
+            print(f"Помилка завантаження даних аналітики: {traceback.format_exc()}")
+    
+    def fetch_data(self, c, user_id):
+        """Виконується в робочому потоці: лише запити, без доступу до віджетів."""
+        envelopes = get_user_envelopes(c, user_id)
+        return {
+            'user_id': user_id,
+            'cards': get_user_cards(c, user_id),
+            'envelopes': envelopes,
+            'analytics': get_analytics_data(c, user_id, 'month') if envelopes else {},
+            'savings': self.get_savings_data(c, user_id) if envelopes else None,
+            'daily_expenses': self.load_daily_expenses(c, user_id) if envelopes else [],
+            'forecasts': get_spending_forecasts(c, user_id) if envelopes else {},
+        }
+    
+    def on_data_loaded(self, data):
+        """Виконується в головному потоці, коли дані готові."""
+        try:
+            self.user_cards = data['cards']
+            self.envelopes_data = data['envelopes']
             
             if not self.envelopes_data:
                 self.create_default_envelopes()
-            else:
-                self.load_analytics_data(user_id)
-                self.load_daily_expenses(user_id)
-                self.update_envelopes_display()
-                self.update_stats_display()
-                self.update_charts_display()
+                return
+            
+            self.load_analytics_data(data['analytics'], data['savings'])
+            self.daily_expenses = data['daily_expenses']
+            self.forecasts = data['forecasts']
+            envelope_forecasts = {item['id']: item['forecast'] for item in self.forecasts.get('envelopes', [])}
+            for envelope in self.envelopes_data:
+                envelope['forecast'] = envelope_forecasts.get(envelope['id'])
+            self.update_envelopes_display()
+            self.update_stats_display()
+            self.update_charts_display()
             
         except Exception as e:
-            print(f"Помилка завантаження даних аналітики: {traceback.format_exc()}")
+            print(f"Помилка відображення даних аналітики: {traceback.format_exc()}")
+    
+    def show_loading_placeholders(self):
+        for container_id in ('stats_container', 'charts_container'):
+            if container_id in self.ids and not self.ids[container_id].children:
+                self.ids[container_id].add_widget(Label(text="Завантаження...", font_size=dp(12), color=DARK_GRAY, size_hint_y=None, height=dp(50)))
     
     def create_default_envelopes(self):
         try:
@@ -531,20 +571,14 @@ class AnalyticsTab(Screen):
             for i, envelope in enumerate(default_envelopes):
                 create_envelope(cursor, conn, user_id, envelope["name"], get_unique_color(i), 0.0)
             
-            self.envelopes_data = get_user_envelopes(cursor, user_id)
-            self.load_analytics_data(user_id)
-            self.load_daily_expenses(user_id)
-            self.update_envelopes_display()
-            self.update_stats_display()
-            self.update_charts_display()
+            self.load_data()
             
         except Exception as e:
             print(f"Помилка створення стандартних конвертів: {e}")
     
-    def load_analytics_data(self, user_id):
+    def load_analytics_data(self, analytics_data, savings_data):
         try:
-            self.analytics_data = get_analytics_data(cursor, user_id, 'month')
-            savings_data = self.get_savings_data(user_id) 
+            self.analytics_data = analytics_data
             
             if savings_data:
                 self.analytics_data['total_savings'] = savings_data['total_savings']
@@ -568,47 +602,27 @@ class AnalyticsTab(Screen):
             self.analytics_data = {}
             self.envelopes_for_chart = []
 
-    def load_daily_expenses(self, user_id):
-        """Завантажує витрати за кожен день поточного місяця з envelope_transactions."""
+    def load_daily_expenses(self, c, user_id):
+        """Повертає поповнення конвертів за кожен день поточного місяця (денний ряд аналітики)."""
         try:
-            now = datetime.now()
-            start_of_month = now.replace(day=1).strftime('%Y-%m-%d')
-            
-            if now.month == 12:
-                next_month = now.replace(year=now.year + 1, month=1, day=1)
-            else:
-                next_month = now.replace(month=now.month + 1, day=1)
-            end_of_month = (next_month - timedelta(days=1)).strftime('%Y-%m-%d')
-
-            cursor.execute('''
-                SELECT 
-                    DATE(created_at), 
-                    SUM(amount) 
-                FROM envelope_transactions 
-                WHERE user_id = ? 
-                  AND DATE(created_at) BETWEEN ? AND ?
-                GROUP BY 1 
-                ORDER BY 1 ASC
-            ''', (user_id, start_of_month, end_of_month))
-            
-            results = cursor.fetchall()
-            
-            self.daily_expenses = [{'date': date_str, 'amount': float(amount)} for date_str, amount in results if amount is not None and amount > 0]
+            # Кожне поповнення конверта записується і як транзакція 'envelope_deposit'
+            series = get_daily_series(c, user_id, 'current_month', ('envelope_deposit',))
+            return [{'date': day['date'], 'amount': day['amount']} for day in series if day['amount'] > 0]
 
         except Exception as e:
             print(f"Помилка завантаження щоденних витрат: {traceback.format_exc()}")
-            self.daily_expenses = []
+            return []
 
-    def get_savings_data(self, user_id):
+    def get_savings_data(self, c, user_id):
         try:
-            cursor.execute('''
+            c.execute('''
                 SELECT SUM(current_amount) as total_savings, SUM(target_amount) as total_target, COUNT(*) as active_plans_count
                 FROM savings_plans WHERE user_id=? AND status='active'
             ''', (user_id,))
             
-            result = cursor.fetchone()
-            total_savings = result[0] or 0
-            total_target = result[1] or 0
+            result = c.fetchone()
+            total_savings = from_cents(result[0])
+            total_target = from_cents(result[1])
             active_plans = result[2] or 0
             
             savings_progress = (total_savings / total_target * 100) if total_target > 0 else 0
@@ -650,6 +664,12 @@ class AnalyticsTab(Screen):
             {'title': 'Транзакції', 'value': self.analytics_data.get('transactions_count', 0), 'subtitle': 'За місяць', 'color': WARNING_ORANGE}
         ]
         
+        if self.forecasts:
+            total = self.forecasts['total']
+            stats_cards.append({'title': 'Прогноз витрат', 'value': f"${total['forecast']:.0f}", 'subtitle': f"Витрачено ${total['spent']:.0f}", 'color': PRIMARY_BLUE})
+            for card in self.forecasts['cards']:
+                stats_cards.append({'title': card['name'], 'value': f"${card['forecast']:.0f}", 'subtitle': 'Прогноз на місяць', 'color': PRIMARY_BLUE})
+        
         for stat in stats_cards:
             container.add_widget(StatCard(stat['title'], stat['value'], stat['subtitle'], stat['color']))
     
@@ -782,6 +802,7 @@ class AnalyticsTab(Screen):
             def confirm_delete(instance):
                 try:
                     cursor.execute("DELETE FROM envelopes WHERE id=?", (envelope_data['id'],)); cursor.execute("DELETE FROM envelope_transactions WHERE envelope_id=?", (envelope_data['id'],)); conn.commit()
+                    bump_data_version(App.get_running_app().current_user_id)
                     confirm_popup.dismiss(); popup.dismiss(); self.load_data(); self.show_success_message(f"Конверт '{envelope_data['name']}' успішно видалено!")
                 except Exception as e: print(f"Помилка видалення конверту: {e}"); error_label.text = "Помилка при видаленні конверту"
             
@@ -837,6 +858,9 @@ class AnalyticsTab(Screen):
         cancel_btn = WhiteButton(text="Скасувати", background_color=LIGHT_GRAY, color=DARK_TEXT)
         add_btn = WhiteButton(text="Поповнити", background_color=SUCCESS_GREEN)
         
+        # Один ключ на відкрите вікно: повторне натискання не створить дубль
+        action_key = new_idempotency_key()
+        
         def add_money(instance):
             amount_text = amount_input.text.strip(); description = desc_input.text.strip(); card_name = card_spinner.text
             
@@ -854,7 +878,7 @@ class AnalyticsTab(Screen):
                 if selected_card and selected_card['balance'] < amount:
                     error_label.text = f"Недостатньо коштів. Доступно: {selected_card['balance']:.2f} $"; return
                 
-                success = self.add_money_to_envelope(envelope_data['id'], amount, description, card_id)
+                success = self.add_money_to_envelope(envelope_data['id'], amount, description, card_id, action_key)
                 if success: popup.dismiss(); self.load_data(); self.show_success_message(f"Конверт '{envelope_data['name']}' поповнено!")
                 else: error_label.text = "Помилка при поповненні"
                     
@@ -870,20 +894,14 @@ class AnalyticsTab(Screen):
         self.current_popup = popup
         popup.open()
     
-    def add_money_to_envelope(self, envelope_id, amount, description, card_id):
+    def add_money_to_envelope(self, envelope_id, amount, description, card_id, idempotency_key=None):
         """Додати гроші до конверту та оновити баланс картки."""
         try:
             app = self.get_app()
             
-            # 1. Зняття з картки
-            cursor.execute("UPDATE user_cards SET balance = balance - ? WHERE id = ?", (amount, card_id))
-            
-            # 2. Додавання в конверт
-            success = add_to_envelope(cursor, conn, app.current_user_id, envelope_id, amount, description, card_id)
-            
-            conn.commit()
-            
-            return success
+            # Списання з картки та поповнення конверту — одна транзакція
+            return add_to_envelope(cursor, conn, app.current_user_id, envelope_id, amount, description, card_id,
+                                   idempotency_key=idempotency_key, debit_card=True)
         except Exception as e:
             print(f"Помилка поповнення конверту: {e}")
             return False
@@ -0,0 +1,135 @@
+import math
+
+from utils.categorizer import OTHER_CATEGORY
+
+# --- ВИЯВЛЕННЯ НЕЗВИЧНИХ ВИТРАТ ---
+# Для кожної пари (користувач, категорія) зберігається ковзна статистика
+# логарифма суми витрати (алгоритм Велфорда: кількість, середнє, M2).
+# Логарифм робить розподіл сум близьким до нормального, тож «у 3 стандартних
+# відхилення» означає «у рази більше звичного», а не просто «більше за середнє».
+# Кожна нова витрата спершу оцінюється за наявною статистикою, потім оновлює
+# її — O(1) на транзакцію, без перегляду історії.
+
+STATS_TABLE = "category_stats"
+ANOMALIES_TABLE = "spending_anomalies"
+
+# Скільки витрат у категорії потрібно, перш ніж оцінювати нові
+MIN_SAMPLES = 10
+# Поріг z-оцінки логарифма суми
+ANOMALY_SCORE = 3.0
+# Мінімальне стандартне відхилення логарифма: однакові суми не роблять
+# будь-яке невелике відхилення аномалією
+MIN_STD = 0.25
+# Дрібні суми (у центах) не позначаються, навіть якщо незвичні
+MIN_ANOMALY_AMOUNT = 1000
+
+def welford_update(count, mean, m2, value):
+    """Додає value до статистики (count, mean, m2). Повертає нову трійку."""
+    count += 1
+    delta = value - mean
+    mean += delta / count
+    m2 += delta * (value - mean)
+    return count, mean, m2
+
+def anomaly_score(count, mean, m2, value):
+    """z-оцінка value відносно статистики або None, якщо даних ще замало."""
+    if count < MIN_SAMPLES:
+        return None
+    std = max(math.sqrt(m2 / (count - 1)), MIN_STD)
+    return (value - mean) / std
+
+def _load_stats(cursor, user_id, category):
+    cursor.execute(
+        f"SELECT count, mean, m2 FROM {STATS_TABLE} WHERE user_id=? AND category=?",
+        (user_id, category)
+    )
+    return cursor.fetchone() or (0, 0.0, 0.0)
+
+def _save_stats(cursor, rows):
+    cursor.executemany(f'''
+        INSERT INTO {STATS_TABLE} (user_id, category, count, mean, m2)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, category) DO UPDATE SET
+            count = excluded.count, mean = excluded.mean, m2 = excluded.m2
+    ''', rows)
+
+def observe_transaction(cursor, user_id, transaction_id, category, amount_cents):
+    """Оцінює нову витрату й оновлює статистику категорії.
+
+    Викликається в тій самій транзакції, що й вставка запису. Якщо витрата
+    незвична, записує її в spending_anomalies і повертає z-оцінку, інакше None.
+    """
+    amount_cents = abs(amount_cents or 0)
+    if amount_cents <= 0:
+        return None
+
+    category = category or OTHER_CATEGORY
+    value = math.log(amount_cents)
+    count, mean, m2 = _load_stats(cursor, user_id, category)
+
+    score = anomaly_score(count, mean, m2, value)
+    flagged = score is not None and score >= ANOMALY_SCORE and amount_cents >= MIN_ANOMALY_AMOUNT
+    if flagged:
+        cursor.execute(f'''
+            INSERT INTO {ANOMALIES_TABLE} (user_id, transaction_id, category, amount, typical, score)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (user_id, transaction_id, category, amount_cents, int(round(math.exp(mean))), round(score, 2)))
+
+    if score is not None and score > ANOMALY_SCORE:
+        # Викид враховується лише до порогу, щоб одна велика покупка не розмила статистику
+        value = mean + ANOMALY_SCORE * (value - mean) / score
+    _save_stats(cursor, [(user_id, category) + welford_update(count, mean, m2, value)])
+    return score if flagged else None
+
+def accumulate_stats(cursor, rows):
+    """Додає до статистики витрати rows [(user_id, category, amount_cents)] без оцінювання.
+
+    Для масового імпорту та початкового заповнення: кожна зачеплена категорія
+    читається й записується один раз.
+    """
+    stats = {}
+    for user_id, category, amount_cents in rows:
+        amount_cents = abs(amount_cents or 0)
+        if amount_cents <= 0:
+            continue
+        key = (user_id, category or OTHER_CATEGORY)
+        if key not in stats:
+            stats[key] = _load_stats(cursor, *key)
+        stats[key] = welford_update(*stats[key], math.log(amount_cents))
+
+    _save_stats(cursor, [key + values for key, values in stats.items()])
+    return len(stats)
+
+def get_recent_anomalies(cursor, user_id, since_ts, limit=5):
+    """Непереглянуті аномалії користувача з since_ts, найновіші першими (суми в центах)."""
+    cursor.execute(f'''
+        SELECT id, transaction_id, category, amount, typical, score, created_ts
+        FROM {ANOMALIES_TABLE}
+        WHERE user_id=? AND dismissed=0 AND created_ts >= ?
+        ORDER BY created_ts DESC, id DESC
+        LIMIT ?
+    ''', (user_id, since_ts, limit))
+    return [{
+        'id': anomaly_id,
+        'transaction_id': transaction_id,
+        'category': category,
+        'amount': amount,
+        'typical': typical,
+        'score': score,
+        'created_ts': created_ts
+    } for anomaly_id, transaction_id, category, amount, typical, score, created_ts in cursor.fetchall()]
+
+def dismiss_anomaly(cursor, user_id, anomaly_id):
+    cursor.execute(f"UPDATE {ANOMALIES_TABLE} SET dismissed=1 WHERE id=? AND user_id=?", (anomaly_id, user_id))
+    return cursor.rowcount == 1
+
+__all__ = [
+    'STATS_TABLE',
+    'ANOMALIES_TABLE',
+    'welford_update',
+    'anomaly_score',
+    'observe_transaction',
+    'accumulate_stats',
+    'get_recent_anomalies',
+    'dismiss_anomaly',
+]
@@ -0,0 +1,125 @@
+import hashlib
+import hmac
+import os
+import time
+
+# --- ХЕШУВАННЯ ПАРОЛІВ ---
+# Хеш зберігається як "pbkdf2_sha256$<ітерації>$<сіль hex>$<хеш hex>": у кожного
+# користувача власна сіль, а параметри записані в самому рядку. Тож кількість
+# ітерацій можна змінювати без міграції — старі хеші перевіряються зі своїми
+# параметрами й перераховуються при наступному вході.
+# Хеші старого формату (64 hex-символи, спільна сіль) перевіряються як раніше.
+# PBKDF2 виконується в окремому потоці get_auth_executor(): hashlib відпускає GIL на
+# час обчислення, тож інтерфейс не зависає.
+
+HASH_SCHEME = "pbkdf2_sha256"
+SALT_BYTES = 16
+
+LEGACY_SALT = "flamingo_secure_salt_2024"
+LEGACY_ITERATIONS = 100000
+
+# Межі калібрування: не слабше за старий формат і не довше секунди-двох на слабких пристроях
+MIN_ITERATIONS = LEGACY_ITERATIONS
+MAX_ITERATIONS = 1000000
+# Крок округлення: шум вимірювання не спричиняє перерахунок хешів при кожному вході
+ITERATION_STEP = 50000
+# Бажаний час одного хешування на цьому пристрої
+HASH_TARGET_SECONDS = 0.25
+PROBE_ITERATIONS = 20000
+
+# Поточна кількість ітерацій для нових хешів (до калібрування — мінімальна)
+_iterations = MIN_ITERATIONS
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+
+def calibrate_iterations(target_seconds=HASH_TARGET_SECONDS, probe_iterations=PROBE_ITERATIONS):
+    """Підбирає кількість ітерацій, за яку хеш рахується приблизно target_seconds на цьому пристрої."""
+    global _iterations
+    start = time.perf_counter()
+    _pbkdf2("calibration", os.urandom(SALT_BYTES), probe_iterations)
+    elapsed = max(time.perf_counter() - start, 1e-6)
+
+    iterations = int(probe_iterations * target_seconds / elapsed) // ITERATION_STEP * ITERATION_STEP
+    _iterations = min(MAX_ITERATIONS, max(MIN_ITERATIONS, iterations))
+    return _iterations
+
+def current_iterations():
+    return _iterations
+
+def hash_password(password, iterations=None):
+    """Новий хеш пароля з випадковою сіллю та поточною кількістю ітерацій."""
+    iterations = iterations or _iterations
+    salt = os.urandom(SALT_BYTES)
+    return f"{HASH_SCHEME}${iterations}${salt.hex()}${_pbkdf2(password, salt, iterations).hex()}"
+
+def _parse_hash(stored):
+    """(ітерації, сіль, хеш) зі збереженого рядка або None, якщо формат невідомий."""
+    try:
+        parts = stored.split('$')
+        if len(parts) == 4 and parts[0] == HASH_SCHEME:
+            return int(parts[1]), bytes.fromhex(parts[2]), bytes.fromhex(parts[3])
+        if len(parts) == 1 and len(stored) == 64:
+            return LEGACY_ITERATIONS, LEGACY_SALT.encode('utf-8'), bytes.fromhex(stored)
+    except (AttributeError, ValueError):
+        pass
+    return None
+
+def verify_password(password, stored):
+    parsed = _parse_hash(stored)
+    if parsed is None or password is None:
+        return False
+    iterations, salt, expected = parsed
+    return hmac.compare_digest(_pbkdf2(password, salt, iterations), expected)
+
+def needs_rehash(stored):
+    """Чи слід перерахувати хеш: старий формат або менше ітерацій, ніж зараз."""
+    parsed = _parse_hash(stored)
+    return parsed is None or not stored.startswith(HASH_SCHEME + '$') or parsed[0] < _iterations
+
+def check_and_upgrade(password, stored):
+    """(пароль вірний, новий хеш або None, якщо оновлювати не треба)."""
+    if not verify_password(password, stored):
+        return False, None
+    return True, hash_password(password) if needs_rehash(stored) else None
+
+_auth_executor = None
+
+def get_auth_executor():
+    """Окремий потік для хешування, щоб вхід не чекав на чергу запитів вкладок.
+
+    Створюється при першому використанні: db_executor залежить від Kivy Clock, а
+    db_manager (зокрема його CLI) імпортує цей модуль лише заради синхронних функцій.
+    """
+    global _auth_executor
+    if _auth_executor is None:
+        from utils.db_executor import DBExecutor
+        _auth_executor = DBExecutor(name="auth")
+    return _auth_executor
+
+def calibrate_async():
+    """Калібрує кількість ітерацій у фоні; хеші, поставлені в чергу пізніше, її вже використовують."""
+    return get_auth_executor().submit(calibrate_iterations)
+
+def hash_password_async(password, on_result, on_error=None):
+    """Рахує hash_password(password) у фоні; on_result(хеш) — у головному потоці."""
+    return get_auth_executor().submit(hash_password, password, on_result=on_result, on_error=on_error)
+
+def check_password_async(password, stored, on_result, on_error=None):
+    """Перевіряє пароль у фоні; on_result((вірний, новий хеш або None)) — у головному потоці."""
+    return get_auth_executor().submit(check_and_upgrade, password, stored, on_result=on_result, on_error=on_error)
+
+__all__ = [
+    'HASH_SCHEME',
+    'LEGACY_ITERATIONS',
+    'calibrate_iterations',
+    'current_iterations',
+    'hash_password',
+    'verify_password',
+    'needs_rehash',
+    'check_and_upgrade',
+    'get_auth_executor',
+    'calibrate_async',
+    'hash_password_async',
+    'check_password_async',
+]
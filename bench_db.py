@@ -0,0 +1,318 @@
+"""Бенчмарк роботи з базою даних.
+
+Запуск: python bench_db.py [--suite commit|analytics|search|cache|import|all] [--rows N]
+
+commit    — затримка commit для профілю SQLite за замовчуванням
+            (rollback journal, synchronous=FULL) і налаштованого профілю з WAL.
+analytics — запити аналітики db_manager на синтетичному журналі за кілька років:
+            порівняння за місяцями та весь набір вкладки аналітики з журналом
+            analytics_engine (потребує Kivy та NumPy, як і сам застосунок).
+search    — пошук в описах транзакцій: FTS5 проти LIKE '%...%' (потребує Kivy).
+cache     — перевірка кешу аналітики: аргументи-списки (позиційні та іменовані)
+            дають той самий ключ і повторний виклик береться з кешу (потребує Kivy).
+import    — перевірка імпорту виписки: баланс картки не змінюється, а журнал
+            після контрольних точок сходиться з ним (потребує Kivy).
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Імпорт utils ініціалізує users.db у поточній теці — працюємо в тимчасовій
+WORK_DIR = tempfile.mkdtemp(prefix="finance_bench_")
+os.chdir(WORK_DIR)
+
+from utils.db_connection import connect, DEFAULT_PROFILE, LEGACY_PROFILE
+import utils.db_manager as dm
+
+TRANSACTIONS_DDL = '''
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        type TEXT NOT NULL,
+        amount REAL NOT NULL,
+        description TEXT,
+        card_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+def _report(name, latencies):
+    ms = [value * 1000 for value in latencies]
+    print(f"  {name:<10} mean={statistics.mean(ms):8.3f} ms  "
+          f"p50={_percentile(ms, 50):8.3f} ms  p95={_percentile(ms, 95):8.3f} ms  "
+          f"total={sum(ms):9.1f} ms")
+
+def bench_commit_latency(db_path, profile, rows):
+    """Одна транзакція = один INSERT + commit, як у log_transaction."""
+    conn = connect(db_path, profile)
+    conn.execute(TRANSACTIONS_DDL)
+    conn.commit()
+
+    latencies = []
+    for i in range(rows):
+        start = time.perf_counter()
+        conn.execute(
+            "INSERT INTO transactions (user_id, type, amount, description, card_id, created_at) "
+            "VALUES (?, ?, ?, ?, ?, datetime('now'))",
+            (1, 'expense', 10.0 + i, f"bench {i}", 1)
+        )
+        conn.commit()
+        latencies.append(time.perf_counter() - start)
+
+    conn.close()
+    return latencies
+
+def bench_read_during_write(db_path, profile):
+    """Перевіряє, чи може читач виконати SELECT, поки інше з'єднання тримає запис."""
+    # Малий кеш змушує записувача скидати сторінки на диск до commit
+    writer = connect(db_path, dict(profile, cache_size=10))
+    reader = connect(db_path, dict(profile, busy_timeout=0))
+    writer.execute(TRANSACTIONS_DDL)
+    writer.commit()
+
+    writer.execute("BEGIN IMMEDIATE")
+    writer.executemany(
+        "INSERT INTO transactions (user_id, type, amount, description) VALUES (1, 'income', ?, ?)",
+        ((float(i), "x" * 200) for i in range(5000))
+    )
+    try:
+        reader.execute("SELECT COUNT(*) FROM transactions").fetchone()
+        blocked = False
+    except sqlite3.OperationalError:
+        blocked = True
+    writer.rollback()
+
+    writer.close()
+    reader.close()
+    return blocked
+
+def _time_call(fn, repeat=20):
+    """Медіанний час виклику fn у мілісекундах."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def _seed_ledger(user_id, rows, years=3):
+    """Заповнює журнал транзакціями, рівномірно розподіленими за years років."""
+    cards = dm.get_user_cards(dm.cursor, user_id)
+    card_ids = [card['id'] for card in cards] or [None]
+    now = datetime.now()
+    rng = random.Random(42)
+    types = ('expense', 'income', 'withdrawal', 'deposit', 'envelope_deposit', 'transfer_out')
+    descriptions = ('Сільпо продукти', 'Uber таксі', 'Кіно', 'Аптека', 'Зарплата', 'Кава')
+
+    batch = []
+    for i in range(rows):
+        created = now - timedelta(seconds=rng.randint(0, years * 365 * 86400))
+        batch.append((
+            user_id, rng.choice(types), dm.to_cents(round(rng.uniform(1, 500), 2)), rng.choice(descriptions),
+            rng.choice(card_ids), created.strftime('%Y-%m-%d %H:%M:%S'), f"bench-{i}"
+        ))
+
+    with dm.transaction() as c:
+        c.executemany(
+            "INSERT INTO transactions (user_id, type, amount, description, card_id, created_at, idempotency_key) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            batch
+        )
+
+def _legacy_monthly_comparison(cursor, user_id, months):
+    """Попередня реалізація: окремий запит з strftime() на кожен місяць."""
+    result = []
+    for i in range(months):
+        month_str = (datetime.now() - timedelta(days=30 * i)).strftime('%Y-%m')
+        cursor.execute('''
+            SELECT
+                SUM(CASE WHEN type IN ('deposit', 'transfer_in', 'income') THEN amount ELSE 0 END),
+                SUM(CASE WHEN type IN ('withdrawal', 'transfer_out', 'expense') THEN amount ELSE 0 END)
+            FROM transactions
+            WHERE user_id=? AND strftime('%Y-%m', created_at) = ?
+        ''', (user_id, month_str))
+        result.append(cursor.fetchone())
+    return result
+
+def run_analytics(rows):
+    user_id = dm.cursor.execute("SELECT id FROM users ORDER BY id LIMIT 1").fetchone()[0]
+    _seed_ledger(user_id, rows)
+
+    print(f"get_monthly_comparison ({rows} транзакцій за 3 роки):")
+    for months in (6, 12, 36):
+        legacy = _time_call(lambda: _legacy_monthly_comparison(dm.cursor, user_id, months), repeat=3)
+        current = _time_call(lambda: dm.get_monthly_comparison(dm.cursor, user_id, months))
+        print(f"  months={months:<3} legacy={legacy:9.3f} ms  grouped={current:8.3f} ms")
+
+    def analytics_views():
+        for period in ("week", "month", "year"):
+            dm.get_analytics_data(dm.cursor, user_id, period)
+            dm.get_category_breakdown(dm.cursor, user_id, period)
+        dm.get_cards_analytics(dm.cursor, user_id, ["week", "month", "year"])
+        dm.get_daily_series(dm.cursor, user_id, "current_month")
+        dm.get_monthly_comparison(dm.cursor, user_id, 12)
+
+    def with_ledger_load():
+        dm.clear_analytics_cache()
+        analytics_views()
+
+    def ledger_loaded():
+        # Скидаємо лише кеш результатів: журнал NumPy лишається завантаженим
+        dm._analytics_cache.clear()
+        analytics_views()
+
+    print("Вкладка аналітики (журнал NumPy):")
+    print(f"  із завантаженням журналу={_time_call(with_ledger_load, repeat=5):9.3f} ms  "
+          f"журнал у пам'яті={_time_call(ledger_loaded):8.3f} ms")
+
+def run_cache(rows):
+    """Кожна кешована функція з аргументом-списком: без помилки, однаковий результат, влучання в кеш."""
+    user_id = dm.cursor.execute("SELECT id FROM users ORDER BY id LIMIT 1").fetchone()[0]
+    _seed_ledger(user_id, rows)
+    card_id = dm.get_user_cards(dm.cursor, user_id)[0]['id']
+    periods = ["today", "week", "month"]
+
+    calls = (
+        ("get_cards_analytics", (periods,), {}),
+        ("get_cards_analytics", (), {'period': periods}),
+        ("get_daily_series", (), {'period': "current_month", 'types': ['expense', 'withdrawal']}),
+        ("get_analytics_data", (), {'period': "month", 'category': None, 'card_id': card_id}),
+        ("get_category_breakdown", (), {'period': "month"}),
+        ("get_top_categories", (), {'period': "month", 'limit': 3}),
+        ("get_card_balance_series", (card_id,), {'period': "month"}),
+        ("get_monthly_comparison", (), {'months': 6}),
+        ("get_spending_anomalies", (), {'days': 30, 'limit': 5}),
+        ("get_budget_progress", (), {}),
+        ("get_spending_forecasts", (), {}),
+        ("get_insights_and_forecasts", (), {}),
+    )
+
+    print("Ключі кешу аналітики:")
+    dm.clear_analytics_cache()
+    failures = 0
+    for name, args, kwargs in calls:
+        fn = getattr(dm, name)
+        try:
+            first = fn(dm.cursor, user_id, *args, **kwargs)
+            hits = dm.get_analytics_cache_stats()['hits']
+            second = fn(dm.cursor, user_id, *args, **kwargs)
+            ok = first == second and dm.get_analytics_cache_stats()['hits'] == hits + 1
+        except Exception as e:
+            print(f"  {name:<28} ПОМИЛКА: {e!r}")
+            failures += 1
+            continue
+        failures += not ok
+        print(f"  {name:<28} {'ok' if ok else 'ПРОМАХ КЕШУ'}  {sorted(kwargs)}")
+
+    if failures:
+        raise SystemExit(f"Перевірка кешу: {failures} помилок")
+
+def run_import(rows):
+    """Імпорт виписки до й після опорної точки картки, потім звірка балансів з журналом."""
+    from utils.statement_import import import_statement
+
+    user_id = dm.cursor.execute("SELECT id FROM users ORDER BY id LIMIT 1").fetchone()[0]
+    card = dm.get_user_cards(dm.cursor, user_id)[0]
+    now = datetime.now()
+
+    # Картка «створена» місяць тому: частина виписки — до опорної точки, частина — після
+    with dm.transaction() as c:
+        c.execute(f"DELETE FROM {dm.CHECKPOINTS_TABLE} WHERE card_id=?", (card['id'],))
+        dm.record_balance_checkpoint(c, card['id'], dm.to_cents(card['balance']),
+                                     ts=int((now - timedelta(days=30)).timestamp()))
+
+    rng = random.Random(7)
+    path = os.path.join(WORK_DIR, "statement.csv")
+    with open(path, "w", encoding="utf-8") as statement:
+        statement.write("Дата;Сума;Опис;Картка\n")
+        for i in range(rows):
+            created = now - timedelta(seconds=rng.randint(60, 60 * 86400))
+            amount = round(rng.uniform(-300, 200), 2) or 1.0
+            statement.write(f"{created:%Y-%m-%d %H:%M:%S};{amount};Операція {i};{card['number']}\n")
+
+    print(f"Імпорт виписки ({rows} рядків) і звірка балансів:")
+    failures = 0
+    for attempt in ("перший", "повторний"):
+        stats = import_statement(path, user_id)
+        balance = dm.get_user_card_by_id(dm.cursor, card['id'])['balance']
+        mismatches = dm.reconcile_card_balances(dm.cursor, user_id)
+        series = dm.get_card_balance_series(dm.cursor, user_id, card['id'], 'month')
+        ok = (not stats['error'] and balance == card['balance'] and not mismatches
+              and series and series[-1]['balance'] == balance)
+        failures += not ok
+        print(f"  {attempt:<10} {'ok' if ok else 'РОЗБІЖНІСТЬ'}  вставлено={stats['inserted']} "
+              f"баланс={balance:.2f} розбіжностей={len(mismatches)}")
+
+    if failures:
+        raise SystemExit(f"Перевірка імпорту: {failures} помилок")
+
+def _legacy_search(cursor, user_id, term, limit=20):
+    """Пошук без індексу: LIKE з провідним % переглядає всі транзакції користувача."""
+    cursor.execute('''
+        SELECT id, description FROM transactions
+        WHERE user_id=? AND lower(description) LIKE ?
+        ORDER BY created_ts DESC, id DESC LIMIT ?
+    ''', (user_id, f"%{term}%", limit))
+    return cursor.fetchall()
+
+def run_search(rows):
+    user_id = dm.cursor.execute("SELECT id FROM users ORDER BY id LIMIT 1").fetchone()[0]
+    _seed_ledger(user_id, rows)
+
+    print(f"search_transactions ({rows} транзакцій):")
+    for term in ("сіл", "таксі", "кава", "немає"):
+        legacy = _time_call(lambda: _legacy_search(dm.cursor, user_id, term), repeat=5)
+        current = _time_call(lambda: dm.search_transactions(dm.cursor, user_id, term))
+        print(f"  {term!r:<10} like={legacy:9.3f} ms  fts5={current:8.3f} ms")
+
+def run_commit(rows):
+    print(f"Затримка commit ({rows} транзакцій):")
+    results = {}
+    for name, profile in (("default", LEGACY_PROFILE), ("tuned", DEFAULT_PROFILE)):
+        db_path = os.path.join(WORK_DIR, f"{name}.db")
+        results[name] = bench_commit_latency(db_path, profile, rows)
+        _report(name, results[name])
+
+    speedup = statistics.mean(results["default"]) / statistics.mean(results["tuned"])
+    print(f"  Прискорення: x{speedup:.1f}")
+
+    print("Читання під час відкритої транзакції запису:")
+    for name, profile in (("default", LEGACY_PROFILE), ("tuned", DEFAULT_PROFILE)):
+        db_path = os.path.join(WORK_DIR, f"rw_{name}.db")
+        blocked = bench_read_during_write(db_path, profile)
+        print(f"  {name:<10} {'заблоковано' if blocked else 'не блокується'}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк SQLite для finance_app_mobile")
+    parser.add_argument("--suite", choices=("commit", "analytics", "search", "cache", "import", "all"), default="all")
+    parser.add_argument("--rows", type=int, default=None, help="кількість транзакцій")
+    args = parser.parse_args()
+
+    try:
+        if args.suite in ("commit", "all"):
+            run_commit(args.rows or 500)
+        if args.suite in ("analytics", "all"):
+            run_analytics(args.rows or 50000)
+        if args.suite in ("search", "all"):
+            run_search(args.rows or 100000)
+        if args.suite in ("cache", "all"):
+            run_cache(args.rows or 5000)
+        if args.suite in ("import", "all"):
+            run_import(args.rows or 2000)
+    finally:
+        dm.conn.close()
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
@@ -0,0 +1,96 @@
+import re
+
+# --- КАТЕГОРИЗАЦІЯ ТРАНЗАКЦІЙ ---
+# Усі ключові слова компілюються в один регулярний вираз-альтернацію, тому
+# опис транзакції переглядається один раз незалежно від кількості правил.
+# Якщо збігається кілька слів, перемагає правило з меншим priority.
+
+OTHER_CATEGORY = 'Other'
+
+DEFAULT_CATEGORIES = {
+    'Food': [0.95, 0.3, 0.5, 1],
+    'Transport': [0.2, 0.7, 0.9, 1],
+    'Entertainment': [0.2, 0.8, 0.3, 1],
+    'Bills': [1, 0.6, 0.2, 1],
+    'Shopping': [0.7, 0.4, 0.9, 1],
+    OTHER_CATEGORY: [0.7, 0.7, 0.7, 1],
+}
+
+# Кольори для категорій, створених користувачем
+EXTRA_COLORS = [
+    [0.4, 0.2, 0.9, 1], [1.0, 0.8, 0.2, 1], [0.3, 0.8, 0.6, 1],
+    [0.9, 0.5, 0.7, 1], [0.5, 0.5, 0.9, 1], [0.9, 0.7, 0.3, 1],
+]
+
+# Стандартні ключові слова; порядок категорій задає пріоритет
+DEFAULT_KEYWORDS = {
+    'Food': ['food', 'restaurant', 'grocery', 'cafe', 'meal', 'supermarket',
+             'їжа', 'продукти', 'ресторан', 'кафе', 'кава', 'супермаркет', 'сільпо', 'атб'],
+    'Transport': ['transport', 'bus', 'taxi', 'fuel', 'gas', 'metro', 'train',
+                  'транспорт', 'автобус', 'таксі', 'uber', 'bolt', 'пальне', 'метро', 'потяг'],
+    'Entertainment': ['movie', 'cinema', 'concert', 'game', 'entertainment', 'netflix',
+                      'кіно', 'концерт', 'гра', 'розваги'],
+    'Bills': ['bill', 'rent', 'electricity', 'water', 'internet', 'phone',
+              'рахунок', 'оренда', 'комуналка', 'світло', 'вода', 'інтернет', 'телефон'],
+    'Shopping': ['shop', 'store', 'mall', 'clothes', 'electronics', 'purchase',
+                 'магазин', 'покупка', 'одяг', 'техніка'],
+}
+
+# Пріоритет стандартних правил; правила користувача за замовчуванням мають 0
+DEFAULT_RULE_PRIORITY = 100
+
+def default_rules():
+    """Стандартні правила у форматі (category, keyword, priority)."""
+    rules = []
+    for index, (category, keywords) in enumerate(DEFAULT_KEYWORDS.items()):
+        for keyword in keywords:
+            rules.append((category, keyword, DEFAULT_RULE_PRIORITY + index))
+    return rules
+
+def category_color(category):
+    """Колір категорії: стандартний або стабільний колір з палітри."""
+    if category in DEFAULT_CATEGORIES:
+        return DEFAULT_CATEGORIES[category]
+    return EXTRA_COLORS[sum(ord(ch) for ch in category) % len(EXTRA_COLORS)]
+
+class Categorizer:
+    """Зіставляє опис транзакції з категорією за набором правил."""
+
+    def __init__(self, rules):
+        # keyword -> (priority, category); для повторів лишаємо пріоритетніше правило
+        self._rules = {}
+        for category, keyword, priority in rules:
+            keyword = (keyword or '').strip().lower()
+            if not keyword:
+                continue
+            current = self._rules.get(keyword)
+            if current is None or priority < current[0]:
+                self._rules[keyword] = (priority, category)
+
+        if self._rules:
+            # Довші слова першими, щоб альтернація не обривалась на префіксі
+            alternatives = sorted(self._rules, key=len, reverse=True)
+            self._pattern = re.compile("|".join(re.escape(word) for word in alternatives))
+        else:
+            self._pattern = None
+
+    def categorize(self, description):
+        if not description or self._pattern is None:
+            return OTHER_CATEGORY
+
+        best = None
+        for match in self._pattern.finditer(description.lower()):
+            rule = self._rules[match.group(0)]
+            if best is None or rule[0] < best[0]:
+                best = rule
+        return best[1] if best else OTHER_CATEGORY
+
+__all__ = [
+    'OTHER_CATEGORY',
+    'DEFAULT_CATEGORIES',
+    'DEFAULT_KEYWORDS',
+    'DEFAULT_RULE_PRIORITY',
+    'default_rules',
+    'category_color',
+    'Categorizer',
+]
@@ -1,48 +1,140 @@
 # screens/dashboard.py
 
+import importlib
+import sys
+import threading
+
 from kivy.uix.screenmanager import Screen
 from kivy.app import App
 from kivy.clock import Clock
+from kivy.lang import Builder
+
+from utils.startup_timing import mark, measure
+
+# --- РЕЄСТР ВКЛАДОК ---
+# Вкладка: (модуль, клас, kv-файл). Модуль і kv-правила вкладки завантажуються
+# при першому переході на неї (switch_tab), а не під час запуску додатку.
+# Після показу головної вкладки решта створюється у фоні: модулі імпортуються
+# в окремому потоці, а віджети будуються в головному — по одній вкладці за кадр.
+TAB_REGISTRY = {
+    'home_tab': ('screens.home_tab', 'HomeTab', 'kv/home_tab.kv'),
+    'analytics_tab': ('screens.analytics_tab', 'AnalyticsTab', 'kv/analytics_tab.kv'),
+    'savings_tab': ('screens.savings_tab', 'SavingsTab', 'kv/savings_tab.kv'),
+    'account_tab': ('screens.account_tab', 'AccountTab', 'kv/account_tab.kv'),
+}
+
+# Затримка (с) перед фоновим створенням вкладок, щоб не конкурувати з першим оновленням головної
+PRELOAD_DELAY = 1.0
+
+_loaded_kv = set()
+
+def import_tab_module(tab_name):
+    """Імпортує модуль вкладки (можна з фонового потоку — лише Python-код, без віджетів)."""
+    module_name = TAB_REGISTRY[tab_name][0]
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    with measure(f"import {tab_name}"):
+        return importlib.import_module(module_name)
+
+def load_tab_class(tab_name):
+    """Клас вкладки з уже завантаженими kv-правилами. Лише з головного потоку."""
+    _, class_name, kv_file = TAB_REGISTRY[tab_name]
+    tab_class = getattr(import_tab_module(tab_name), class_name)
+    if kv_file not in _loaded_kv:
+        with measure(f"kv {tab_name}"):
+            Builder.load_file(kv_file)
+        _loaded_kv.add(kv_file)
+    return tab_class
 
 class DashboardScreen(Screen):
 
-    
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        Clock.schedule_once(self.initialize_content, 0.5)
-    
-    def initialize_content(self, dt):
-        print("Dashboard initializing...")
-        self.update_all_tabs()
-    
+        self._tabs = {}
+        self._preload_started = False
+        # Кілька запитів на оновлення за короткий час (вхід, on_enter) дають одне оновлення
+        self._refresh_trigger = Clock.create_trigger(self._refresh_home, 0.1)
+
+    def get_tab(self, tab_name):
+        """Вкладка за назвою; при першому зверненні створюється й додається в tab_manager."""
+        tab = self._tabs.get(tab_name)
+        if tab is None:
+            tab_class = load_tab_class(tab_name)
+            with measure(f"build {tab_name}"):
+                tab = tab_class()
+                # Деякі вкладки задають власне name у конструкторі — перевизначаємо на ключ реєстру
+                tab.name = tab_name
+                self.ids.tab_manager.add_widget(tab)
+            self._tabs[tab_name] = tab
+        return tab
+
     def on_enter(self):
         print("Dashboard screen entered")
-        Clock.schedule_once(lambda dt: self.update_all_tabs(), 0.1)
-    
+        if self.ids.tab_manager.current != 'home_tab':
+            # Перше додавання робить вкладку поточною, і її on_enter сам завантажує дані
+            self.switch_tab('home_tab')
+        else:
+            self.update_all_tabs()
+        self.schedule_preload()
+
     def update_all_tabs(self):
-        if hasattr(self.ids, 'tab_manager'):
-            print("Updating all tabs...")
-     
-            # ВИПРАВЛЕНО: Використовуємо 'home_tab'
-            home_tab = self.ids.tab_manager.get_screen('home_tab') 
-            if home_tab and hasattr(home_tab, 'update_content'):
-                print("Found home tab, updating content...")
-                home_tab.update_content()
-            else:
-                print("Home tab not found or no update_content method")
-    
+        self._refresh_trigger()
+
+    def _refresh_home(self, dt):
+        # Поки головну вкладку не створено, оновлювати нічого: вона завантажиться при першому показі
+        home_tab = self._tabs.get('home_tab')
+        if home_tab and hasattr(home_tab, 'update_content'):
+            print("Updating home tab...")
+            home_tab.update_content()
+
     def switch_tab(self, tab_name):
-        if hasattr(self.ids, 'tab_manager'):
-            # ВИПРАВЛЕНО: Використовуємо повні назви табів для коректної роботи
-            available_tabs = ['home_tab', 'analytics_tab', 'savings_tab', 'account_tab']
-            
-            if tab_name in available_tabs:
-                self.ids.tab_manager.current = tab_name
-
-                current_tab = self.ids.tab_manager.current_screen
-                if current_tab and hasattr(current_tab, 'update_content'):
-                    current_tab.update_content()
-    
+        if tab_name not in TAB_REGISTRY:
+            return
+
+        tab_manager = self.ids.tab_manager
+        was_current = tab_manager.current == tab_name
+        tab = self.get_tab(tab_name)
+        tab_manager.current = tab_name
+
+        # Перехід на іншу вкладку оновлює її через on_enter; повторне натискання — тут
+        if was_current and hasattr(tab, 'update_content'):
+            tab.update_content()
+
+    def schedule_preload(self):
+        """Після показу головної вкладки створює решту у фоні (один раз)."""
+        if self._preload_started:
+            return
+        self._preload_started = True
+        Clock.schedule_once(lambda dt: self._start_preload(), PRELOAD_DELAY)
+
+    def _start_preload(self):
+        pending = [name for name in TAB_REGISTRY if name not in self._tabs]
+
+        def worker():
+            for name in pending:
+                try:
+                    import_tab_module(name)
+                except Exception as e:
+                    print(f"Помилка попереднього імпорту вкладки {name}: {e}")
+            Clock.schedule_once(lambda dt: self._build_next(pending), 0)
+
+        threading.Thread(target=worker, name="tab-preload", daemon=True).start()
+
+    def _build_next(self, pending):
+        # Одна вкладка за кадр, щоб не блокувати інтерфейс на час побудови всіх
+        while pending and pending[0] in self._tabs:
+            pending.pop(0)
+        if not pending:
+            mark("tabs_preloaded")
+            return
+        name = pending.pop(0)
+        try:
+            self.get_tab(name)
+        except Exception as e:
+            print(f"Помилка створення вкладки {name}: {e}")
+        Clock.schedule_once(lambda dt: self._build_next(pending), 0)
+
     def logout(self):
         self.manager.transition.direction = 'right'
-        self.manager.current = "start_screen"
\ No newline at end of file
+        self.manager.current = "start_screen"
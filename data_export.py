@@ -0,0 +1,345 @@
+import base64
+import csv
+import gzip
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime
+
+from utils.db_manager import (
+    MONEY_COLUMNS, from_cents, get_total_balance, get_user_cards, get_user_envelopes,
+    get_user_savings_plans, get_analytics_data, get_top_categories, get_user_transactions,
+    analytics_snapshot
+)
+from utils.jobs import atomic_output
+
+# --- ПОТОКОВИЙ ЕКСПОРТ ДАНИХ КОРИСТУВАЧА ---
+# Рядки читаються курсором пакетами fetchmany і одразу пишуться у файл, тож
+# пам'ять не залежить від обсягу історії. Увесь експорт виконується в одній
+# транзакції читання — таблиці узгоджені між собою. Результат спершу пишеться
+# у "<шлях>.part" і перейменовується лише після успішного завершення (atomic_output).
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = ('jsonl', 'csv')
+
+# (таблиця, умова вибору рядків користувача); похідні таблиці (агрегати, пошук) не експортуються
+EXPORT_TABLES = (
+    ('users', 'id = ?'),
+    ('user_settings', 'user_id = ?'),
+    ('user_levels', 'user_id = ?'),
+    ('user_profile_photos', 'user_id = ?'),
+    ('wallets', 'user_id = ?'),
+    ('user_cards', 'user_id = ?'),
+    ('card_balance_checkpoints', 'card_id IN (SELECT id FROM user_cards WHERE user_id = ?)'),
+    ('transactions', 'user_id = ?'),
+    ('category_rules', 'user_id = ?'),
+    ('savings_plans', 'user_id = ?'),
+    ('savings_transactions', 'user_id = ?'),
+    ('envelopes', 'user_id = ?'),
+    ('envelope_transactions', 'user_id = ?'),
+    ('user_sessions', 'user_id = ?'),
+    ('security_logs', 'user_id = ?'),
+    ('spending_anomalies', 'user_id = ?'),
+    ('ai_chat_history', 'user_id = ?'),
+)
+
+# Таблиці WITHOUT ROWID не мають rowid — їх прохід іде в порядку первинного ключа
+EXPORT_ORDER = {
+    'card_balance_checkpoints': 'card_id, ts',
+}
+
+# Стовпці, які ніколи не потрапляють в експорт
+EXCLUDED_COLUMNS = {
+    'users': ('password',),
+}
+
+class ExportCancelled(Exception):
+    """Експорт скасовано користувачем."""
+
+def _export_columns(cursor, table):
+    """Стовпці таблиці для експорту: без виключених і без згенерованих (created_ts тощо)."""
+    cursor.execute(f"PRAGMA table_xinfo({table})")
+    excluded = EXCLUDED_COLUMNS.get(table, ())
+    # hidden: 2 — VIRTUAL, 3 — STORED згенерований стовпець
+    return [row[1] for row in cursor.fetchall() if row[5] not in (2, 3) and row[1] not in excluded]
+
+def _existing_tables(cursor):
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    return {row[0] for row in cursor.fetchall()}
+
+def _open_text(path, compress):
+    if compress:
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+def _export_value(value):
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('ascii')
+    return value
+
+class _JsonLinesWriter:
+    """Один файл: рядок export_info, далі по рядку {"table": ..., "row": {...}} на запис."""
+
+    def __init__(self, path, compress):
+        self._file = _open_text(path, compress)
+
+    def write_info(self, info):
+        self._file.write(json.dumps({'table': 'export_info', 'row': info}, ensure_ascii=False) + "\n")
+
+    def begin_table(self, table, columns):
+        self._columns = columns
+        self._table = table
+
+    def write_rows(self, rows):
+        write = self._file.write
+        for row in rows:
+            record = dict(zip(self._columns, row))
+            write(json.dumps({'table': self._table, 'row': record}, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self._file.close()
+
+class _CsvWriter:
+    """Тека з файлом <таблиця>.csv[.gz] на кожну таблицю та export_info.json."""
+
+    def __init__(self, path, compress):
+        self._path = path
+        self._compress = compress
+        self._file = None
+        os.makedirs(path)
+
+    def write_info(self, info):
+        with open(os.path.join(self._path, 'export_info.json'), 'w', encoding='utf-8') as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+
+    def begin_table(self, table, columns):
+        self._close_table()
+        name = f"{table}.csv.gz" if self._compress else f"{table}.csv"
+        self._file = _open_text(os.path.join(self._path, name), self._compress)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write_rows(self, rows):
+        self._writer.writerows(rows)
+
+    def _close_table(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        self._close_table()
+
+def export_path(directory, username, fmt='jsonl', compress=False):
+    """Шлях нового експорту: файл .txt, .jsonl[.gz] або тека для CSV."""
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    name = f"financial_data_{username}_{stamp}"
+    if fmt == 'jsonl':
+        name += ".jsonl.gz" if compress else ".jsonl"
+    elif fmt == 'txt':
+        name += ".txt"
+    return os.path.join(directory, name)
+
+def _check_cancel(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise ExportCancelled()
+
+@contextmanager
+def _read_snapshot(cursor):
+    """Одна транзакція читання на весь експорт, щоб таблиці були узгоджені між собою.
+
+    Аналітика звіту рахується в цьому ж знімку: analytics_snapshot не дає покласти
+    її в кеш, якщо після початку знімка дані вже змінилися.
+    """
+    connection = cursor.connection
+    own_transaction = not connection.in_transaction
+    with analytics_snapshot():
+        if own_transaction:
+            cursor.execute("BEGIN")
+        try:
+            yield cursor
+        finally:
+            if own_transaction and connection.in_transaction:
+                connection.rollback()
+
+def _run_export(write, path, stats, cursor, label):
+    """Виконує write(part_path) в одному знімку БД з атомарним перейменуванням результату."""
+    try:
+        with _read_snapshot(cursor), atomic_output(path) as part_path:
+            write(part_path)
+    except ExportCancelled:
+        stats['cancelled'] = True
+    except Exception as e:
+        print(f"Error exporting {label}: {e}")
+        stats['error'] = str(e)
+    return stats
+
+def export_user_data_stream(cursor, user_id, path, fmt='jsonl', compress=False, progress=None,
+                            cancel_event=None, batch_size=EXPORT_BATCH_SIZE):
+    """Експортує всі дані користувача у path без обмежень на кількість рядків.
+
+    fmt: 'jsonl' (один файл) або 'csv' (тека з файлом на таблицю); compress — gzip.
+    progress(fraction, table) викликається після кожного пакета; cancel_event
+    (threading.Event) перевіряється між пакетами. Повертає stats:
+    path, rows (кількість за таблицями), total, cancelled, error.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Невідомий формат експорту: {fmt}")
+
+    stats = {'path': path, 'rows': {}, 'total': 0, 'cancelled': False, 'error': None}
+
+    def write(part_path):
+        tables = _existing_tables(cursor)
+        plan = []
+        for table, condition in EXPORT_TABLES:
+            if table not in tables:
+                continue
+            columns = _export_columns(cursor, table)
+            cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {condition}", (user_id,))
+            plan.append((table, condition, columns, cursor.fetchone()[0]))
+        expected = sum(count for *_, count in plan) or 1
+
+        writer = _JsonLinesWriter(part_path, compress) if fmt == 'jsonl' else _CsvWriter(part_path, compress)
+        try:
+            writer.write_info({
+                'export_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'user_id': user_id,
+                'format': fmt,
+                'tables': {table: count for table, _, _, count in plan},
+            })
+
+            for table, condition, columns, _ in plan:
+                money = [columns.index(column) for column in MONEY_COLUMNS.get(table, ()) if column in columns]
+                writer.begin_table(table, columns)
+                # NOT INDEXED: прохід таблиці в порядку rowid без тимчасового B-дерева для сортування
+                order = EXPORT_ORDER.get(table, 'rowid')
+                cursor.execute(
+                    f"SELECT {', '.join(columns)} FROM {table} NOT INDEXED WHERE {condition} ORDER BY {order}",
+                    (user_id,)
+                )
+                written = 0
+                while True:
+                    _check_cancel(cancel_event)
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    if money or table == 'user_profile_photos':
+                        rows = [_convert_row(row, money) for row in rows]
+                    writer.write_rows(rows)
+                    written += len(rows)
+                    stats['total'] += len(rows)
+                    if progress:
+                        progress(min(1.0, stats['total'] / expected), table)
+                stats['rows'][table] = written
+        finally:
+            writer.close()
+
+    _run_export(write, path, stats, cursor, "user data")
+    if progress and not (stats['cancelled'] or stats['error']):
+        progress(1.0, None)
+    return stats
+
+def _report_sections(cursor, user_id, username):
+    """Розділи текстового звіту: (назва, функція, що повертає рядки розділу)."""
+    def header():
+        lines = ["=" * 60, f"ФІНАНСОВИЙ ЗВІТ - {username}", "=" * 60,
+                 f"Дата експорту: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", "",
+                 "ОСНОВНА ІНФОРМАЦІЯ:", "-" * 40]
+        cursor.execute("SELECT username, email, created_at FROM users WHERE id=?", (user_id,))
+        user_data = cursor.fetchone()
+        if user_data:
+            lines += [f"Ім'я: {user_data[0]}", f"Email: {user_data[1]}", f"Дата реєстрації: {user_data[2]}"]
+        lines += [f"Загальний баланс: ${get_total_balance(cursor, user_id):.2f}", ""]
+        return lines
+
+    def cards():
+        lines = ["КАРТКИ:", "-" * 40]
+        items = get_user_cards(cursor, user_id)
+        lines += [f"• {card['name']} ({card['bank']}): ${card['balance']:.2f}" for card in items] or ["Картки відсутні"]
+        return lines + [""]
+
+    def envelopes():
+        lines = ["КОНВЕРТИ:", "-" * 40]
+        items = get_user_envelopes(cursor, user_id)
+        lines += [f"• {env['name']}: ${env['current_amount']:.2f}/${env['budget_limit']:.2f} ({env['usage_percentage']:.1f}%)"
+                  for env in items] or ["Конверти відсутні"]
+        return lines + [""]
+
+    def savings():
+        lines = ["ПЛАНИ ЗАОЩАДЖЕНЬ:", "-" * 40]
+        items = get_user_savings_plans(cursor, user_id)
+        lines += [f"• {plan['name']}: ${plan['current_amount']:.2f}/${plan['target_amount']:.2f} ({plan['progress_percentage']:.1f}%)"
+                  for plan in items] or ["Плани заощаджень відсутні"]
+        return lines + [""]
+
+    def analytics():
+        lines = ["АНАЛІТИКА ЗА МІСЯЦЬ:", "-" * 40]
+        data = get_analytics_data(cursor, user_id, 'month')
+        if data:
+            lines += [
+                f"Доходи: ${data['total_income']:.2f}",
+                f"Витрати: ${data['total_expenses']:.2f}",
+                f"Чистий баланс: ${data['net_balance']:.2f}",
+                f"Середні витрати/день: ${data['average_daily']:.2f}",
+                f"Транзакції: {data['transactions_count']}",
+                f"Рівень заощаджень: {data['savings_rate']:.1f}%",
+                "",
+            ]
+        return lines
+
+    def categories():
+        lines = ["ТОП КАТЕГОРІЇ ВИТРАТ:", "-" * 40]
+        items = get_top_categories(cursor, user_id, 'month', 5)
+        lines += [f"• {cat['name']}: ${cat['amount']:.2f} ({cat['value']:.1f}%)" for cat in items] or ["Дані про категорії відсутні"]
+        return lines + [""]
+
+    def transactions():
+        lines = ["ОСТАННІ ТРАНЗАКЦІЇ:", "-" * 40]
+        for trans in get_user_transactions(cursor, user_id, 10):
+            amount_str = f"${trans['amount']:.2f}" if trans['amount'] >= 0 else f"-${abs(trans['amount']):.2f}"
+            lines.append(f"• {trans['date'][:10]} | {trans['type']} | {amount_str} | {trans['description']}")
+        if len(lines) == 2:
+            lines.append("Транзакції відсутні")
+        return lines + [""]
+
+    def footer():
+        return ["=" * 60, "Звіт створено автоматично системою Financial Assistant",
+                "Усі дані захищено та конфіденційно", "=" * 60]
+
+    return [
+        ('profile', header), ('cards', cards), ('envelopes', envelopes), ('savings', savings),
+        ('analytics', analytics), ('categories', categories), ('transactions', transactions), ('footer', footer),
+    ]
+
+def export_text_report(cursor, user_id, username, path, progress=None, cancel_event=None):
+    """Текстовий фінансовий звіт. Кожен розділ — окремий крок прогресу й точка скасування.
+
+    Повертає stats: path, cancelled, error.
+    """
+    stats = {'path': path, 'cancelled': False, 'error': None}
+    sections = _report_sections(cursor, user_id, username)
+
+    def write(part_path):
+        with open(part_path, 'w', encoding='utf-8') as f:
+            for index, (name, build) in enumerate(sections, 1):
+                _check_cancel(cancel_event)
+                f.write("\n".join(build()) + "\n")
+                if progress:
+                    progress(index / len(sections), name)
+
+    return _run_export(write, path, stats, cursor, "text report")
+
+def _convert_row(row, money):
+    row = [_export_value(value) for value in row]
+    for index in money:
+        row[index] = from_cents(row[index])
+    return row
+
+__all__ = [
+    'EXPORT_FORMATS',
+    'EXPORT_TABLES',
+    'ExportCancelled',
+    'export_path',
+    'export_user_data_stream',
+    'export_text_report',
+]
@@ -0,0 +1,324 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# --- ПРОФІЛЬ З'ЄДНАННЯ SQLITE ---
+# Значення застосовуються через PRAGMA одразу після відкриття з'єднання.
+# WAL дозволяє читачам працювати паралельно з записом, а synchronous=NORMAL
+# у режимі WAL робить fsync лише під час checkpoint, а не на кожен commit.
+
+DEFAULT_PROFILE = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -8192,              # від'ємне значення = KiB (≈8 МБ)
+    "mmap_size": 64 * 1024 * 1024,    # 64 МБ
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,             # мс
+    "wal_autocheckpoint": 1000,       # сторінок
+}
+
+# Профіль за замовчуванням SQLite (rollback journal, synchronous=FULL) — для порівняння
+LEGACY_PROFILE = {
+    "journal_mode": "DELETE",
+    "synchronous": "FULL",
+}
+
+# Інтервал періодичного checkpoint WAL у секундах
+CHECKPOINT_INTERVAL = 60
+
+# Порядок важливий: journal_mode має бути встановлено до synchronous
+_PRAGMA_ORDER = (
+    "journal_mode",
+    "synchronous",
+    "cache_size",
+    "mmap_size",
+    "temp_store",
+    "busy_timeout",
+    "wal_autocheckpoint",
+)
+
+def apply_profile(conn, profile=None):
+    """Застосовує PRAGMA профілю до з'єднання. Повертає фактичні значення."""
+    profile = DEFAULT_PROFILE if profile is None else profile
+    applied = {}
+
+    for name in _PRAGMA_ORDER:
+        if name not in profile:
+            continue
+        value = profile[name]
+        try:
+            row = conn.execute(f"PRAGMA {name} = {value}").fetchone()
+            if row is None:
+                row = conn.execute(f"PRAGMA {name}").fetchone()
+            applied[name] = row[0] if row else value
+        except sqlite3.Error as e:
+            print(f"Не вдалося застосувати PRAGMA {name}: {e}")
+
+    return applied
+
+def connect(db_path, profile=None):
+    """Відкриває з'єднання SQLite з налаштованим профілем."""
+    profile = DEFAULT_PROFILE if profile is None else profile
+    timeout = profile.get("busy_timeout", 5000) / 1000.0
+
+    # Використовуємо check_same_thread=False для Kivy/Android
+    conn = sqlite3.connect(db_path, timeout=timeout, check_same_thread=False)
+    apply_profile(conn, profile)
+    return conn
+
+def checkpoint(conn, mode="PASSIVE"):
+    """Виконує checkpoint WAL. Повертає (busy, log_frames, checkpointed_frames)."""
+    mode = mode.upper()
+    if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+        raise ValueError(f"Невідомий режим checkpoint: {mode}")
+
+    try:
+        row = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        return tuple(row) if row else (0, 0, 0)
+    except sqlite3.Error as e:
+        print(f"Помилка checkpoint WAL: {e}")
+        return (1, 0, 0)
+
+# --- ПУЛ З'ЄДНАНЬ ---
+
+class ConnectionPool:
+    """Окреме з'єднання для кожного потоку та один серіалізований записувач.
+
+    Використання:
+        with db.read() as c:
+            c.execute("SELECT ...")
+        with db.write() as c:
+            c.execute("INSERT ...")   # commit при виході, rollback при помилці
+
+    initializer(pool) — підготовка БД (схема, міграції), що виконується один
+    раз перед першим з'єднанням: у фоні через start(background=True) або
+    в потоці, який першим звернувся до БД. Решта потоків чекають на ready.
+    """
+
+    def __init__(self, db_path, profile=None, initializer=None):
+        self.db_path = db_path
+        self.profile = DEFAULT_PROFILE if profile is None else profile
+        self._local = threading.local()
+        # Один записувач на процес: WAL дозволяє лише одну транзакцію запису
+        self._write_lock = threading.RLock()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+        self._initializer = initializer
+        self._init_lock = threading.Lock()
+        self._init_started = initializer is None
+        self._ready = threading.Event()
+        if initializer is None:
+            self._ready.set()
+
+    @property
+    def ready(self):
+        """Чи завершено ініціалізацію БД."""
+        return self._ready.is_set()
+
+    def start(self, background=True):
+        """Запускає ініціалізацію (лише перший виклик): у фоновому потоці або в поточному."""
+        with self._init_lock:
+            if self._init_started:
+                return
+            self._init_started = True
+        if background:
+            threading.Thread(target=self._initialize, args=(True,), name="db-init", daemon=True).start()
+        else:
+            self._initialize(False)
+
+    def wait_ready(self, timeout=None):
+        """Чекає на готовність БД; якщо ініціалізацію ще не запущено — виконує її в цьому потоці."""
+        if not self._ready.is_set():
+            self.start(background=False)
+            self._ready.wait(timeout)
+        return self._ready.is_set()
+
+    def _initialize(self, own_thread):
+        self._local.initializing = True
+        try:
+            self._initializer(self)
+        finally:
+            self._local.initializing = False
+            if own_thread:
+                # Потік ініціалізації завершується — його з'єднання більше не потрібне
+                self._release_local()
+            self._ready.set()
+
+    def _release_local(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._connections_lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def connection(self):
+        """Повертає з'єднання поточного потоку, відкриваючи його за потреби.
+
+        До завершення ініціалізації чекає на неї (крім самого потоку ініціалізації).
+        """
+        if not self._ready.is_set() and not getattr(self._local, "initializing", False):
+            self.wait_ready()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.db_path, self.profile)
+            # Неявні транзакції Python одразу беруть блокування запису
+            conn.isolation_level = "IMMEDIATE"
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def read(self):
+        """Курсор для читання на з'єднанні поточного потоку."""
+        cur = self.connection().cursor()
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+    def in_write(self):
+        """Чи відкрита одиниця роботи (write) у поточному потоці."""
+        return getattr(self._local, "write_depth", 0) > 0
+
+    def set_rollback_only(self):
+        """Позначає поточну одиницю роботи для відкату замість commit."""
+        self._local.rollback_only = True
+
+    def on_write_end(self, callback):
+        """Викликає callback після завершення зовнішньої одиниці роботи (commit або rollback).
+
+        Поза одиницею роботи callback викликається одразу.
+        """
+        if not self.in_write():
+            callback()
+            return
+        callbacks = getattr(self._local, "on_end", None)
+        if callbacks is None:
+            callbacks = self._local.on_end = []
+        callbacks.append(callback)
+
+    @contextmanager
+    def write(self):
+        """Одиниця роботи: курсор у транзакції запису, один commit на зовнішньому рівні.
+
+        Вкладені виклики в тому ж потоці використовують SAVEPOINT: виняток
+        усередині вкладеного блоку відкочує лише його зміни. Записувачі
+        серіалізуються між потоками.
+        """
+        with self._write_lock:
+            conn = self.connection()
+            depth = getattr(self._local, "write_depth", 0)
+            savepoint = f"uow_{depth}"
+
+            if depth == 0:
+                self._local.rollback_only = False
+                if not conn.in_transaction:
+                    conn.execute("BEGIN IMMEDIATE")
+            else:
+                conn.execute(f"SAVEPOINT {savepoint}")
+
+            self._local.write_depth = depth + 1
+            cur = conn.cursor()
+            try:
+                yield cur
+            except BaseException:
+                self._local.write_depth = depth
+                if depth == 0:
+                    conn.rollback()
+                else:
+                    conn.execute(f"ROLLBACK TO {savepoint}")
+                    conn.execute(f"RELEASE {savepoint}")
+                raise
+            else:
+                self._local.write_depth = depth
+                if depth > 0:
+                    conn.execute(f"RELEASE {savepoint}")
+                elif getattr(self._local, "rollback_only", False):
+                    conn.rollback()
+                    raise sqlite3.OperationalError("Одиницю роботи відкочено через помилку вкладеної операції")
+                else:
+                    conn.commit()
+            finally:
+                cur.close()
+                if depth == 0:
+                    callbacks, self._local.on_end = getattr(self._local, "on_end", None) or [], []
+                    for callback in callbacks:
+                        callback()
+
+    def close_all(self):
+        """Закриває всі відкриті з'єднання пулу."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+class ConnectionProxy:
+    """Замінник глобального conn: делегує з'єднанню поточного потоку."""
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def cursor(self):
+        return self._pool.connection().cursor()
+
+    def commit(self):
+        # Усередині одиниці роботи commit виконує лише зовнішній write()
+        if not self._pool.in_write():
+            self._pool.connection().commit()
+
+    def rollback(self):
+        if self._pool.in_write():
+            self._pool.set_rollback_only()
+        else:
+            self._pool.connection().rollback()
+
+    def close(self):
+        self._pool.close_all()
+
+    def __getattr__(self, name):
+        return getattr(self._pool.connection(), name)
+
+class CursorProxy:
+    """Замінник глобального cursor: окремий курсор для кожного потоку."""
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._local = threading.local()
+
+    def _cursor(self):
+        conn = self._pool.connection()
+        cur = getattr(self._local, "cursor", None)
+        if cur is None or cur.connection is not conn:
+            cur = conn.cursor()
+            self._local.cursor = cur
+        return cur
+
+    def __getattr__(self, name):
+        return getattr(self._cursor(), name)
+
+    def __iter__(self):
+        return iter(self._cursor())
+
+__all__ = [
+    'DEFAULT_PROFILE',
+    'LEGACY_PROFILE',
+    'CHECKPOINT_INTERVAL',
+    'apply_profile',
+    'connect',
+    'checkpoint',
+    'ConnectionPool',
+    'ConnectionProxy',
+    'CursorProxy',
+]
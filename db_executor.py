@@ -0,0 +1,132 @@
+import queue
+import threading
+import traceback
+from concurrent.futures import Future
+
+from kivy.clock import Clock
+
+import utils.db_manager as db_manager
+
+# --- ФОНОВЕ ВИКОНАННЯ ЗАПИТІВ ДО БД ---
+# Запити виконуються в окремому робочому потоці на його власному з'єднанні
+# з пулу, а результати повертаються в головний потік Kivy через Clock.
+# Кожен запит належить "власнику" (зазвичай вкладці); cancel(owner)
+# скасовує ще не виконані запити та відкидає результати, які вже в дорозі.
+
+class DBExecutor:
+    """Робочий потік для запитів db_manager, що повертає Future."""
+
+    def __init__(self, name="db-executor"):
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._generations = {}
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _generation(self, owner):
+        if owner is None:
+            return 0
+        with self._lock:
+            return self._generations.get(id(owner), 0)
+
+    def is_stale(self, owner, generation):
+        return owner is not None and self._generation(owner) != generation
+
+    def submit(self, fn, *args, owner=None, on_result=None, on_error=None, **kwargs):
+        """Ставить fn(*args, **kwargs) у чергу. on_result/on_error викликаються в головному потоці."""
+        future = Future()
+        generation = self._generation(owner)
+        self._queue.put((future, fn, args, kwargs, owner, generation, on_result, on_error))
+        self._ensure_worker()
+        return future
+
+    def submit_read(self, fn, *args, owner=None, on_result=None, on_error=None, **kwargs):
+        """Як submit, але передає у fn курсор читання з пулу першим аргументом."""
+        def run_with_cursor():
+            if db_manager.db is None:
+                return fn(db_manager.cursor, *args, **kwargs)
+            with db_manager.db.read() as c:
+                return fn(c, *args, **kwargs)
+        return self.submit(run_with_cursor, owner=owner, on_result=on_result, on_error=on_error)
+
+    def cancel(self, owner):
+        """Скасовує всі запити власника, що ще не доставлені."""
+        with self._lock:
+            self._generations[id(owner)] = self._generations.get(id(owner), 0) + 1
+
+    def shutdown(self):
+        """Зупиняє робочий потік після виконання поточної черги."""
+        self._queue.put(None)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            future, fn, args, kwargs, owner, generation, on_result, on_error = item
+
+            if self.is_stale(owner, generation):
+                future.cancel()
+                continue
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+
+            Clock.schedule_once(
+                lambda dt, item=item: self._deliver(*item), 0
+            )
+
+    def _deliver(self, future, fn, args, kwargs, owner, generation, on_result, on_error):
+        if self.is_stale(owner, generation):
+            return
+
+        error = future.exception()
+        try:
+            if error is None:
+                if on_result:
+                    on_result(future.result())
+            elif on_error:
+                on_error(error)
+            else:
+                print(f"Помилка фонового запиту до БД: "
+                      f"{''.join(traceback.format_exception(type(error), error, error.__traceback__))}")
+        except Exception:
+            print(f"Помилка обробки результату запиту: {traceback.format_exc()}")
+
+# Спільний виконавець для всіх екранів
+executor = DBExecutor()
+# Окремий потік для довгих операцій (експорт), щоб вони не затримували запити вкладок
+export_executor = DBExecutor(name="db-export")
+
+def run_in_background(fn, *args, **kwargs):
+    return executor.submit(fn, *args, **kwargs)
+
+def run_read_query(fn, *args, **kwargs):
+    return executor.submit_read(fn, *args, **kwargs)
+
+def run_export_query(fn, *args, **kwargs):
+    return export_executor.submit_read(fn, *args, **kwargs)
+
+def cancel_pending(owner):
+    executor.cancel(owner)
+
+__all__ = [
+    'DBExecutor',
+    'executor',
+    'export_executor',
+    'run_in_background',
+    'run_read_query',
+    'run_export_query',
+    'cancel_pending',
+]
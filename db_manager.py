@@ -1,19 +1,51 @@
 import sqlite3
-import hashlib
 from datetime import datetime, timedelta
 import re
 import os
 import json
 import shutil 
 import traceback
+import uuid
+import copy
+from decimal import Decimal, ROUND_HALF_UP
+import functools
+import numpy as np
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 from kivy.utils import platform
 from kivy.resources import resource_find 
+from utils.db_connection import (
+    checkpoint, DEFAULT_PROFILE, ConnectionPool, ConnectionProxy, CursorProxy
+)
+from utils.startup_timing import mark
+from utils.categorizer import Categorizer, category_color, default_rules
+from utils.auth_service import hash_password, verify_password
+from utils.analytics_engine import LEDGER_WINDOW_DAYS, Ledger, get_ledger, clear_ledgers, rolling_mean, day_edges
+from utils.forecasting import SEASON_DAYS, history_start, get_forecaster, clear_forecasters
+from utils.anomaly import (
+    STATS_TABLE, ANOMALIES_TABLE, observe_transaction, accumulate_stats, get_recent_anomalies, dismiss_anomaly
+)
 
 # --- КОНСТАНТИ ---
 DB_NAME = "users.db"
-SALT = "flamingo_secure_salt_2024"
+# Профіль з'єднання SQLite (WAL, synchronous=NORMAL, mmap, кеш, busy_timeout)
+DB_PROFILE = dict(DEFAULT_PROFILE)
+
+# Канонічні типи транзакцій для аналітики. Суми витрат враховуються за модулем
+# (transfer_out зберігається з від'ємною сумою).
+INCOME_TYPES = ('deposit', 'card_deposit', 'transfer_in', 'income', 'savings_return', 'savings_completed')
+EXPENSE_TYPES = ('withdrawal', 'transfer', 'transfer_out', 'expense', 'savings_deposit', 'envelope_deposit')
+# Витрати, що розподіляються за категоріями (без переказів у конверти та заощадження)
+SPENDING_TYPES = ('withdrawal', 'transfer_out', 'expense')
+# Витрати, для яких ведеться статистика категорій і шукаються незвичні суми
+ANOMALY_TYPES = SPENDING_TYPES + ('envelope_deposit',)
 
 # Глобальні змінні
+# db — пул з'єднань (with db.read() / with db.write()); conn та cursor —
+# сумісні з попереднім API проксі, що працюють зі з'єднанням поточного потоку.
+# Створюються під час імпорту без відкриття БД (див. "СТАРТОВІ ФУНКЦІЇ").
+db = None
 conn = None
 cursor = None
 
@@ -42,20 +74,25 @@ def get_db_path():
 
 # --- ФУНКЦІЇ БЕЗПЕКИ ТА ВАЛІДАЦІЇ ---
 
-def hash_password(password):
-    return hashlib.pbkdf2_hmac(
-        'sha256', 
-        password.encode('utf-8'), 
-        SALT.encode('utf-8'), 
-        100000
-    ).hex()
+# Хешування паролів — utils/auth_service.py; тут синхронні обгортки для сумісності
 
 def check_password(password, hashed):
     try:
-        return hash_password(password) == hashed
+        return verify_password(password, hashed)
     except:
         return False
 
+def update_password_hash(cursor, conn, user_id, password_hash):
+    """Зберігає перерахований хеш пароля (оновлення формату при вході)."""
+    try:
+        with transaction():
+            cursor.execute("UPDATE users SET password=? WHERE id=?", (password_hash, user_id))
+        return True
+    except Exception as e:
+        print(f"Error updating password hash: {e}")
+        conn.rollback()
+        return False
+
 def is_valid_email(email):
     pattern = r'^[\w\.-]+@[\w\.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None
@@ -77,10 +114,27 @@ def safe_color_conversion(color):
                 return [0.2, 0.4, 0.8, 1]
     return [0.2, 0.4, 0.8, 1]
 
+# --- ГРОШОВІ СУМИ ---
+# Усі грошові стовпці зберігаються як INTEGER у центах (мінімальних одиницях
+# валюти), тож SUM у SQLite точні. Функції db_manager приймають і повертають
+# звичайні суми (float); перетворення виконується лише на межі API.
+
+MONEY_SCALE = 100
+
+def to_cents(amount):
+    """Сума -> ціле число центів (округлення half-up без похибок float)."""
+    if amount is None:
+        return 0
+    return int((Decimal(str(amount)) * MONEY_SCALE).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def from_cents(cents):
+    """Ціле число центів -> сума."""
+    return (cents or 0) / MONEY_SCALE
+
 # --- СТРУКТУРА ТА СХЕМА БД ---
 
 def create_db_schema(cursor):
-    """Створює всі таблиці, якщо вони не існують."""
+    """Створює всі таблиці, якщо вони не існують. Грошові стовпці — INTEGER у центах."""
     
     # 1. Users table
     cursor.execute('''
@@ -99,7 +153,7 @@ def create_db_schema(cursor):
         CREATE TABLE IF NOT EXISTS wallets(
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
-            balance REAL DEFAULT 0.0,
+            balance INTEGER DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users (id)
@@ -114,7 +168,7 @@ def create_db_schema(cursor):
             name TEXT NOT NULL,
             number TEXT NOT NULL,
             bank TEXT NOT NULL,
-            balance REAL DEFAULT 0.0,
+            balance INTEGER DEFAULT 0,
             color TEXT DEFAULT '[0.2, 0.4, 0.8, 1]',
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users (id)
@@ -127,7 +181,7 @@ def create_db_schema(cursor):
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
             type TEXT NOT NULL,
-            amount REAL NOT NULL,
+            amount INTEGER NOT NULL,
             description TEXT,
             card_id INTEGER,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -142,8 +196,8 @@ def create_db_schema(cursor):
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
             name TEXT NOT NULL,
-            target_amount REAL NOT NULL,
-            current_amount REAL DEFAULT 0.0,
+            target_amount INTEGER NOT NULL,
+            current_amount INTEGER DEFAULT 0,
             deadline DATE,
             status TEXT DEFAULT 'active',
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -158,7 +212,7 @@ def create_db_schema(cursor):
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
             plan_id INTEGER NOT NULL,
-            amount REAL NOT NULL,
+            amount INTEGER NOT NULL,
             type TEXT NOT NULL,
             description TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -174,8 +228,8 @@ def create_db_schema(cursor):
             user_id INTEGER NOT NULL,
             name TEXT NOT NULL,
             color TEXT DEFAULT '[0.2, 0.4, 0.8, 1]',
-            budget_limit REAL DEFAULT 0.0,
-            current_amount REAL DEFAULT 0.0,
+            budget_limit INTEGER DEFAULT 0,
+            current_amount INTEGER DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users (id)
         )
@@ -187,7 +241,7 @@ def create_db_schema(cursor):
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
             envelope_id INTEGER NOT NULL,
-            amount REAL NOT NULL,
+            amount INTEGER NOT NULL,
             description TEXT,
             card_id INTEGER,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -277,18 +331,608 @@ def create_db_schema(cursor):
         )
     ''')
 
-def fix_database_schema(conn, cursor):
-    """Перевіряє та виправляє застарілу схему (наприклад, додає відсутні стовпці)."""
-    try:
-        cursor.execute("PRAGMA table_info(transactions)")
+# --- МІГРАЦІЇ СХЕМИ ---
+# Версія схеми зберігається в PRAGMA user_version. Кожна міграція ідемпотентна
+# і виконується в окремій транзакції разом з оновленням версії.
+
+def _migration_add_transactions_card_id(cursor):
+    """Додає стовпець card_id до transactions у старих базах."""
+    cursor.execute("PRAGMA table_info(transactions)")
+    columns = [column[1] for column in cursor.fetchall()]
+
+    if 'card_id' not in columns:
+        cursor.execute("ALTER TABLE transactions ADD COLUMN card_id INTEGER")
+
+def _migration_create_indexes(cursor):
+    """Створює вторинні індекси для запитів за user_id та періодом."""
+    indexes = [
+        "CREATE INDEX IF NOT EXISTS idx_transactions_user_created ON transactions(user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_user_card_type_created ON transactions(user_id, card_id, type, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_envelope_transactions_user_envelope_created ON envelope_transactions(user_id, envelope_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_envelope_transactions_envelope ON envelope_transactions(envelope_id)",
+        "CREATE INDEX IF NOT EXISTS idx_user_sessions_user_login ON user_sessions(user_id, login_time)",
+        "CREATE INDEX IF NOT EXISTS idx_user_cards_user ON user_cards(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_envelopes_user ON envelopes(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_savings_plans_user_created ON savings_plans(user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_savings_transactions_user_plan_created ON savings_transactions(user_id, plan_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_security_logs_user_created ON security_logs(user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_user_profile_photos_user_created ON user_profile_photos(user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_user_settings_user ON user_settings(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_user_levels_user ON user_levels(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_wallets_user ON wallets(user_id)",
+    ]
+    for statement in indexes:
+        cursor.execute(statement)
+
+def _migration_add_idempotency_keys(cursor):
+    """Додає transactions.idempotency_key з унікальним індексом; старі рядки отримують 'legacy-<id>'."""
+    cursor.execute("PRAGMA table_info(transactions)")
+    columns = [column[1] for column in cursor.fetchall()]
+
+    if 'idempotency_key' not in columns:
+        cursor.execute("ALTER TABLE transactions ADD COLUMN idempotency_key TEXT")
+
+    cursor.execute("UPDATE transactions SET idempotency_key = 'legacy-' || id WHERE idempotency_key IS NULL")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_idempotency_key ON transactions(idempotency_key)")
+
+def _sql_in_list(values):
+    return ", ".join(f"'{value}'" for value in values)
+
+# Денні агрегати daily_totals та envelope_daily_totals (міграція 4) замінено
+# журналом analytics_engine; міграція 13 видаляє їх разом з тригерами.
+ROLLUP_TABLES = ('daily_totals', 'envelope_daily_totals')
+ROLLUP_TRIGGERS = (
+    'trg_transactions_daily_insert', 'trg_transactions_daily_delete', 'trg_transactions_daily_update',
+    'trg_envelope_transactions_daily_insert', 'trg_envelope_transactions_daily_delete',
+    'trg_envelope_transactions_daily_update',
+)
+
+def _migration_create_daily_totals(cursor):
+    """Колишні денні агрегати. Лишається для нумерації: таблиці видаляє міграція 13."""
+
+def _migration_drop_daily_totals(cursor):
+    """Видаляє денні агрегати та їхні тригери: аналітика рахується з журналу транзакцій."""
+    for name in ROLLUP_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for table in ROLLUP_TABLES:
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+def _migration_add_categories(cursor):
+    """Додає transactions.category та таблицю правил категорій зі стандартними правилами."""
+    cursor.execute("PRAGMA table_info(transactions)")
+    columns = [column[1] for column in cursor.fetchall()]
+
+    if 'category' not in columns:
+        cursor.execute("ALTER TABLE transactions ADD COLUMN category TEXT")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS category_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            category TEXT NOT NULL,
+            keyword TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_category_rules_user ON category_rules(user_id)")
+    # Покриває пошук рядків з category IS NULL (NULL сортується першим) та GROUP BY category
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_user_category ON transactions(user_id, category)")
+
+    # Стандартні правила (user_id IS NULL) діють для всіх користувачів
+    cursor.execute("SELECT COUNT(*) FROM category_rules WHERE user_id IS NULL")
+    if cursor.fetchone()[0] == 0:
+        cursor.executemany(
+            "INSERT INTO category_rules (user_id, category, keyword, priority) VALUES (NULL, ?, ?, ?)",
+            default_rules()
+        )
+
+# Грошові стовпці, що переводяться з REAL у INTEGER (центи)
+MONEY_COLUMNS = {
+    'wallets': ('balance',),
+    'user_cards': ('balance',),
+    'transactions': ('amount',),
+    'savings_plans': ('target_amount', 'current_amount'),
+    'savings_transactions': ('amount',),
+    'envelopes': ('budget_limit', 'current_amount'),
+    'envelope_transactions': ('amount',),
+    'spending_anomalies': ('amount', 'typical'),
+    'card_balance_checkpoints': ('balance',),
+}
+
+def _convert_money_columns(cursor, table, columns):
+    """Перебудовує таблицю з INTEGER замість REAL для columns, множачи значення на MONEY_SCALE."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    table_info = cursor.fetchall()
+    declared = {column[1]: (column[2] or '').upper() for column in table_info}
+    to_convert = [column for column in columns if column in declared and declared[column] != 'INTEGER']
+    if not to_convert:
+        return
+
+    for column in to_convert:
+        cursor.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE ABS({column} * {MONEY_SCALE} - ROUND({column} * {MONEY_SCALE})) > 1e-6"
+        )
+        inexact = cursor.fetchone()[0]
+        if inexact:
+            print(f"Увага: {inexact} значень {table}.{column} мають частки цента й будуть округлені")
+
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,))
+    create_sql = cursor.fetchone()[0]
+    for column in to_convert:
+        create_sql = re.sub(rf'\b{column}(\s+)REAL\b', rf'{column}\1INTEGER', create_sql, flags=re.IGNORECASE)
+    create_sql = re.sub(r'^\s*CREATE TABLE\s+(IF NOT EXISTS\s+)?["\w]+', f'CREATE TABLE {table}__new', create_sql, flags=re.IGNORECASE)
+
+    # Індекси та тригери видаляються разом з таблицею — зберігаємо їх DDL
+    cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name=? AND sql IS NOT NULL",
+        (table,)
+    )
+    dependent_sql = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name=?", (table,))
+    sequence = cursor.fetchone()
+
+    column_names = [column[1] for column in table_info]
+    select_list = ", ".join(
+        f"CAST(ROUND({name} * {MONEY_SCALE}) AS INTEGER)" if name in to_convert else name
+        for name in column_names
+    )
+    cursor.execute(create_sql)
+    cursor.execute(f"INSERT INTO {table}__new ({', '.join(column_names)}) SELECT {select_list} FROM {table}")
+    cursor.execute(f"DROP TABLE {table}")
+    cursor.execute(f"ALTER TABLE {table}__new RENAME TO {table}")
+
+    if sequence:
+        cursor.execute("UPDATE sqlite_sequence SET seq=? WHERE name=?", (sequence[0], table))
+    for statement in dependent_sql:
+        cursor.execute(statement)
+
+def _migration_money_to_cents(cursor):
+    """Переводить грошові стовпці з REAL у INTEGER (центи) без втрат для сум з точністю до цента."""
+    for table, columns in MONEY_COLUMNS.items():
+        _convert_money_columns(cursor, table, columns)
+
+# Цілочисельні мітки часу (секунди Unix, UTC), обчислені з текстових стовпців
+EPOCH_COLUMNS = {
+    'transactions': ('created_ts', 'created_at'),
+    'envelope_transactions': ('created_ts', 'created_at'),
+    'savings_transactions': ('created_ts', 'created_at'),
+    'user_sessions': ('login_ts', 'login_time'),
+}
+
+def _migration_add_epoch_columns(cursor):
+    """Додає згенеровані стовпці з epoch-секундами та індекси для діапазонних запитів."""
+    for table, (epoch_column, text_column) in EPOCH_COLUMNS.items():
+        cursor.execute(f"PRAGMA table_xinfo({table})")
         columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'card_id' not in columns:
-            cursor.execute("ALTER TABLE transactions ADD COLUMN card_id INTEGER")
-        
+        if epoch_column not in columns:
+            # VIRTUAL: значення не зберігається в рядку, лише в індексі
+            cursor.execute(
+                f"ALTER TABLE {table} ADD COLUMN {epoch_column} INTEGER "
+                f"GENERATED ALWAYS AS (CAST(strftime('%s', {text_column}) AS INTEGER)) VIRTUAL"
+            )
+
+    # Індекси за текстовим часом замінюються індексами за epoch
+    for index in ("idx_transactions_user_created", "idx_envelope_transactions_user_envelope_created",
+                  "idx_savings_transactions_user_plan_created", "idx_user_sessions_user_login"):
+        cursor.execute(f"DROP INDEX IF EXISTS {index}")
+
+    indexes = [
+        "CREATE INDEX IF NOT EXISTS idx_transactions_user_created_ts ON transactions(user_id, created_ts)",
+        "CREATE INDEX IF NOT EXISTS idx_envelope_transactions_user_created_ts ON envelope_transactions(user_id, created_ts)",
+        "CREATE INDEX IF NOT EXISTS idx_envelope_transactions_user_envelope_created_ts ON envelope_transactions(user_id, envelope_id, created_ts)",
+        "CREATE INDEX IF NOT EXISTS idx_savings_transactions_user_plan_created_ts ON savings_transactions(user_id, plan_id, created_ts)",
+        "CREATE INDEX IF NOT EXISTS idx_user_sessions_user_login_ts ON user_sessions(user_id, login_ts)",
+    ]
+    for statement in indexes:
+        cursor.execute(statement)
+
+def _migration_create_history_indexes(cursor):
+    """Індекси для посторінкової історії за курсором (created_ts, id) з фільтром картки."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_user_card_created_ts ON transactions(user_id, card_id, created_ts)")
+    # Замінено індексом вище та idx_transactions_user_created_ts
+    cursor.execute("DROP INDEX IF EXISTS idx_transactions_user_card_type_created")
+
+# --- ПОВНОТЕКСТОВИЙ ПОШУК (FTS5) ---
+# transaction_search містить описи з transactions. Кожне поповнення конверта
+# має дзеркальний рядок 'envelope_deposit' у transactions (опис і назва конверта),
+# тож envelope_transactions окремо не індексується — інакше поповнення
+# знаходилось би двічі.
+# rowid = (user_id << 32) | id, тож фільтр за користувачем — це діапазон rowid,
+# який FTS5 обробляє без окремої фрази.
+
+SEARCH_TABLE = "transaction_search"
+SEARCH_USER_SHIFT = 32
+# Скільки найновіших збігів ранжується за релевантністю
+SEARCH_RANK_WINDOW = 2000
+
+SEARCH_ID_MASK = (1 << SEARCH_USER_SHIFT) - 1
+
+def _search_rowid_sql(row):
+    return f"(({row}.user_id << {SEARCH_USER_SHIFT}) | {row}.id)"
+
+def _search_user_range(user_id):
+    low = int(user_id) << SEARCH_USER_SHIFT
+    return low, low + (1 << SEARCH_USER_SHIFT) - 1
+
+def _fts5_available(cursor):
+    try:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+    except sqlite3.Error:
+        return False
+
+def _search_table_exists(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (SEARCH_TABLE,))
+    return cursor.fetchone() is not None
+
+def _create_search_triggers(cursor):
+    """(Пере)створює тригери синхронізації transaction_search. Безпечно викликати повторно."""
+    insert = (f"INSERT INTO {SEARCH_TABLE} (rowid, description) "
+              f"VALUES ({_search_rowid_sql('NEW')}, COALESCE(NEW.description, ''));")
+    delete = f"DELETE FROM {SEARCH_TABLE} WHERE rowid = {_search_rowid_sql('OLD')};"
+    triggers = {
+        "trg_transactions_search_insert": f"AFTER INSERT ON transactions BEGIN {insert} END",
+        "trg_transactions_search_delete": f"AFTER DELETE ON transactions BEGIN {delete} END",
+        "trg_transactions_search_update": f"AFTER UPDATE OF description, user_id ON transactions BEGIN {delete} {insert} END",
+    }
+    for name, body in triggers.items():
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"CREATE TRIGGER {name} {body}")
+
+def _rebuild_search_index(cursor):
+    """Заповнює transaction_search з журналу заново та (пере)створює тригери."""
+    cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    cursor.execute(f'''
+        INSERT INTO {SEARCH_TABLE} (rowid, description)
+        SELECT {_search_rowid_sql('transactions')}, COALESCE(description, '') FROM transactions
+    ''')
+    _create_search_triggers(cursor)
+
+def _migration_create_search_index(cursor):
+    """Створює FTS5-індекс описів транзакцій. Без FTS5 пошук працює через LIKE."""
+    if not _fts5_available(cursor):
+        print("FTS5 недоступний — пошук транзакцій використовуватиме LIKE")
+        return
+
+    cursor.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+            description,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    ''')
+
+    _rebuild_search_index(cursor)
+
+def _migration_search_ledger_only(cursor):
+    """Прибирає з пошукового індексу дублікати поповнень конвертів (рядки envelope_transactions)."""
+    if not _search_table_exists(cursor):
+        return
+    for suffix in ('insert', 'delete', 'update'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS trg_envelope_transactions_search_{suffix}")
+    # Змінився й формат rowid — індекс будується заново
+    _rebuild_search_index(cursor)
+
+def _migration_create_anomaly_stats(cursor):
+    """Статистика витрат за категоріями та таблиця незвичних витрат; заповнення з історії."""
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+            user_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            mean REAL NOT NULL DEFAULT 0,
+            m2 REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, category)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {ANOMALIES_TABLE} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            transaction_id INTEGER,
+            category TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            typical INTEGER NOT NULL,
+            score REAL NOT NULL,
+            created_ts INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+            dismissed INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{ANOMALIES_TABLE}_user_created_ts ON {ANOMALIES_TABLE}(user_id, created_ts)")
+
+    # Одноразове заповнення: далі статистика оновлюється на кожній транзакції
+    _rebuild_category_stats(cursor)
+
+def _rebuild_category_stats(cursor, user_id=None):
+    """Перераховує статистику категорій з журналу (після зміни категорій рядків)."""
+    user_filter = "AND user_id = ?" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+
+    cursor.execute(f"DELETE FROM {STATS_TABLE} WHERE 1 {user_filter}", params)
+    cursor.execute(f'''
+        SELECT user_id, category, amount FROM transactions
+        WHERE type IN ({_sql_in_list(ANOMALY_TYPES)}) {user_filter}
+        ORDER BY created_ts, id
+    ''', params)
+    accumulate_stats(cursor, cursor.fetchall())
+
+# --- КОНТРОЛЬНІ ТОЧКИ БАЛАНСУ КАРТОК ---
+# card_balance_checkpoints зберігає баланс картки на момент ts (усі транзакції
+# з created_ts < ts враховані). Опорні точки ('opening' при створенні картки,
+# 'adjustment' при ручній зміні балансу) — джерело істини; місячні точки
+# ('monthly', на початок кожного місяця) виводяться з опорних через журнал і
+# можуть бути перераховані. Баланс на будь-який момент — найближча точка плюс
+# сума транзакцій картки між нею та цим моментом (не довше місяця).
+
+CHECKPOINTS_TABLE = "card_balance_checkpoints"
+CHECKPOINT_OPENING = 'opening'
+CHECKPOINT_ADJUSTMENT = 'adjustment'
+CHECKPOINT_MONTHLY = 'monthly'
+
+def _balance_effect_sql(row="transactions"):
+    """Вплив рядка журналу на баланс картки в центах: доходи додають, витрати віднімають."""
+    return (f"CASE WHEN {row}.type IN ({_sql_in_list(INCOME_TYPES)}) THEN ABS({row}.amount) "
+            f"WHEN {row}.type IN ({_sql_in_list(EXPENSE_TYPES)}) THEN -ABS({row}.amount) ELSE 0 END")
+
+def _card_ledger_delta(cursor, user_id, card_id, start_ts, end_ts):
+    cursor.execute(f'''
+        SELECT COALESCE(SUM({_balance_effect_sql()}), 0) FROM transactions
+        WHERE user_id=? AND card_id=? AND created_ts >= ? AND created_ts < ?
+    ''', (user_id, card_id, start_ts, end_ts))
+    return cursor.fetchone()[0]
+
+def _card_balance_at(cursor, card_id, user_id, ts):
+    """Баланс картки в центах на момент ts або None, якщо для картки немає контрольних точок."""
+    cursor.execute(
+        f"SELECT ts, balance FROM {CHECKPOINTS_TABLE} WHERE card_id=? AND ts <= ? ORDER BY ts DESC LIMIT 1",
+        (card_id, ts)
+    )
+    checkpoint = cursor.fetchone()
+    if checkpoint:
+        return checkpoint[1] + _card_ledger_delta(cursor, user_id, card_id, checkpoint[0], ts)
+
+    # Раніше за першу точку — відмотуємо журнал назад від неї
+    cursor.execute(
+        f"SELECT ts, balance FROM {CHECKPOINTS_TABLE} WHERE card_id=? AND ts > ? ORDER BY ts ASC LIMIT 1",
+        (card_id, ts)
+    )
+    checkpoint = cursor.fetchone()
+    if checkpoint:
+        return checkpoint[1] - _card_ledger_delta(cursor, user_id, card_id, ts, checkpoint[0])
+    return None
+
+def _month_starts(first_ts, now):
+    """Початки локальних місяців від місяця first_ts до поточного включно (epoch)."""
+    first = datetime.fromtimestamp(first_ts)
+    year, month = first.year, first.month
+    starts = []
+    while (year, month) <= (now.year, now.month):
+        starts.append(int(datetime(year, month, 1).timestamp()))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return starts
+
+def _refresh_card_checkpoints(cursor, card_id, user_id, now=None):
+    """Додає відсутні місячні точки картки. Повертає кількість нових точок."""
+    now = now or datetime.now()
+    cursor.execute(f"SELECT ts FROM {CHECKPOINTS_TABLE} WHERE card_id=?", (card_id,))
+    existing = {row[0] for row in cursor.fetchall()}
+    if not existing:
+        return 0
+
+    cursor.execute("SELECT MIN(created_ts) FROM transactions WHERE user_id=? AND card_id=?", (user_id, card_id))
+    first_ts = cursor.fetchone()[0]
+    earliest = min(existing)
+    missing = [ts for ts in _month_starts(min(first_ts or earliest, earliest), now) if ts not in existing]
+
+    # До першої точки — у зворотному порядку, після — у прямому: кожна нова
+    # точка рахується від сусідньої, тож сканується не більше місяця журналу
+    before = sorted((ts for ts in missing if ts < earliest), reverse=True)
+    after = sorted(ts for ts in missing if ts > earliest)
+    for ts in before + after:
+        cursor.execute(
+            f"INSERT OR IGNORE INTO {CHECKPOINTS_TABLE} (card_id, ts, balance, kind) VALUES (?, ?, ?, ?)",
+            (card_id, ts, _card_balance_at(cursor, card_id, user_id, ts), CHECKPOINT_MONTHLY)
+        )
+    return len(missing)
+
+def _reset_card_checkpoints(cursor, card_ids):
+    """Перераховує місячні точки карток після вставки транзакцій заднім числом."""
+    for card_id in card_ids:
+        cursor.execute("SELECT user_id FROM user_cards WHERE id=?", (card_id,))
+        row = cursor.fetchone()
+        if not row:
+            continue
+        cursor.execute(f"DELETE FROM {CHECKPOINTS_TABLE} WHERE card_id=? AND kind=?", (card_id, CHECKPOINT_MONTHLY))
+        _refresh_card_checkpoints(cursor, card_id, row[0])
+
+def record_balance_checkpoint(cursor, card_id, balance_cents, kind=CHECKPOINT_OPENING, ts=None):
+    """Опорна точка: баланс картки на момент ts, за замовчуванням зараз
+    (при створенні картки або ручній зміні балансу)."""
+    cursor.execute(
+        f"INSERT OR REPLACE INTO {CHECKPOINTS_TABLE} (card_id, ts, balance, kind) VALUES (?, ?, ?, ?)",
+        (card_id, ts if ts is not None else int(datetime.now().timestamp()), balance_cents, kind)
+    )
+
+def _rebase_card_anchors(cursor, last_id):
+    """Узгоджує опорні точки карток з історією, вставленою без зміни балансу (id > last_id).
+
+    Поточний user_cards.balance уже містить імпортовані операції. Якщо частина з них
+    пізніша за останню опорну точку картки, баланс цієї точки перераховується назад
+    від поточного, тож журнал після неї знову сходиться з балансом картки.
+    """
+    cursor.execute('''
+        SELECT card_id, MIN(created_ts), MAX(created_ts) FROM transactions
+        WHERE id > ? AND card_id IS NOT NULL
+        GROUP BY card_id
+    ''', (last_id,))
+    for card_id, first_ts, last_ts in cursor.fetchall():
+        cursor.execute(
+            f"SELECT ts, kind FROM {CHECKPOINTS_TABLE} WHERE card_id=? AND kind != ? ORDER BY ts DESC LIMIT 1",
+            (card_id, CHECKPOINT_MONTHLY)
+        )
+        anchor = cursor.fetchone()
+        if anchor and last_ts < anchor[0]:
+            continue
+        ts, kind = anchor or (first_ts, CHECKPOINT_OPENING)
+        cursor.execute(f'''
+            SELECT c.balance - COALESCE(SUM({_balance_effect_sql('t')}), 0) FROM user_cards c
+            LEFT JOIN transactions t ON t.user_id = c.user_id AND t.card_id = c.id AND t.created_ts >= ?
+            WHERE c.id = ?
+        ''', (ts, card_id))
+        balance = cursor.fetchone()[0]
+        if balance is not None:
+            record_balance_checkpoint(cursor, card_id, balance, kind, ts=ts)
+
+def refresh_balance_checkpoints(cursor, conn, user_id=None):
+    """Додає місячні точки, що з'явилися з часом, для всіх карток (або карток користувача)."""
+    try:
+        query = "SELECT id, user_id FROM user_cards"
+        params = ()
+        if user_id is not None:
+            query += " WHERE user_id=?"
+            params = (user_id,)
+        created = 0
+        with transaction():
+            cursor.execute(query, params)
+            for card_id, card_user_id in cursor.fetchall():
+                created += _refresh_card_checkpoints(cursor, card_id, card_user_id)
         conn.commit()
+        return created
     except Exception as e:
-        print(f"Schema fix error: {e}")
+        print(f"Error refreshing balance checkpoints: {e}")
+        conn.rollback()
+        return 0
+
+def _migration_create_balance_checkpoints(cursor):
+    """Контрольні точки балансу карток: початкова точка з поточним балансом і місячні точки з історії."""
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {CHECKPOINTS_TABLE} (
+            card_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            balance INTEGER NOT NULL,
+            kind TEXT NOT NULL DEFAULT '{CHECKPOINT_MONTHLY}',
+            PRIMARY KEY (card_id, ts)
+        ) WITHOUT ROWID
+    ''')
+
+    # Поточний баланс — опорна точка; минулі місяці відновлюються з журналу назад від неї
+    cursor.execute("SELECT id, user_id, balance FROM user_cards")
+    for card_id, user_id, balance in cursor.fetchall():
+        record_balance_checkpoint(cursor, card_id, balance)
+        _refresh_card_checkpoints(cursor, card_id, user_id)
+
+# Впорядкований список міграцій: (версія, опис, функція). Нові міграції
+# додаються лише в кінець з наступним номером версії.
+MIGRATIONS = [
+    (1, "transactions.card_id", _migration_add_transactions_card_id),
+    (2, "композитні індекси", _migration_create_indexes),
+    (3, "transactions.idempotency_key", _migration_add_idempotency_keys),
+    (4, "денні агрегати daily_totals", _migration_create_daily_totals),
+    (5, "категорії транзакцій", _migration_add_categories),
+    (6, "грошові суми в центах", _migration_money_to_cents),
+    (7, "epoch-стовпці часу", _migration_add_epoch_columns),
+    (8, "індекси історії транзакцій", _migration_create_history_indexes),
+    (9, "повнотекстовий пошук FTS5", _migration_create_search_index),
+    (10, "статистика витрат для виявлення аномалій", _migration_create_anomaly_stats),
+    (11, "контрольні точки балансу карток", _migration_create_balance_checkpoints),
+    (12, "пошук без дублікатів поповнень конвертів", _migration_search_ledger_only),
+    (13, "видалення денних агрегатів daily_totals", _migration_drop_daily_totals),
+]
+
+def get_schema_version(cursor):
+    """Повертає поточну версію схеми з PRAGMA user_version."""
+    cursor.execute("PRAGMA user_version")
+    return cursor.fetchone()[0]
+
+def apply_migrations(conn, cursor):
+    """Застосовує всі міграції, новіші за поточну версію схеми. Повертає кінцеву версію."""
+    current_version = get_schema_version(cursor)
+    applied = False
+
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+        try:
+            cursor.execute("BEGIN")
+            migrate(cursor)
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+            current_version = version
+            applied = True
+            print(f"Міграцію {version} ({description}) застосовано")
+        except Exception:
+            conn.rollback()
+            print(f"Помилка міграції {version} ({description}): {traceback.format_exc()}")
+            break
+
+    if applied:
+        # Оновлюємо статистику планувальника для нових індексів
+        cursor.execute("PRAGMA optimize")
+
+    return current_version
+
+# --- КАТЕГОРІЇ ---
+# Категорія призначається один раз під час вставки (record_transaction) за
+# правилами з category_rules; скомпільований Categorizer кешується на користувача.
+
+_categorizers = {}
+
+def get_categorizer(cursor, user_id):
+    """Повертає скомпільований Categorizer для стандартних правил і правил користувача."""
+    categorizer = _categorizers.get(user_id)
+    if categorizer is None:
+        try:
+            cursor.execute(
+                "SELECT category, keyword, priority FROM category_rules WHERE user_id IS NULL OR user_id=?",
+                (user_id,)
+            )
+            rules = cursor.fetchall()
+        except sqlite3.Error:
+            rules = default_rules()
+        categorizer = Categorizer(rules)
+        _categorizers[user_id] = categorizer
+    return categorizer
+
+def invalidate_categorizer(user_id=None):
+    if user_id is None:
+        _categorizers.clear()
+    else:
+        _categorizers.pop(user_id, None)
+
+def backfill_categories(cursor, conn, batch_size=500, user_id=None):
+    """Призначає категорії рядкам з category IS NULL пакетами по batch_size. Повертає кількість."""
+    updated = 0
+    try:
+        while True:
+            query = "SELECT id, user_id, description FROM transactions WHERE category IS NULL"
+            params = []
+            if user_id is not None:
+                query += " AND user_id=?"
+                params.append(user_id)
+            cursor.execute(query + " LIMIT ?", params + [batch_size])
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            with transaction():
+                cursor.executemany(
+                    "UPDATE transactions SET category=? WHERE id=?",
+                    [(get_categorizer(cursor, row_user_id).categorize(description), row_id)
+                     for row_id, row_user_id, description in rows]
+                )
+            conn.commit()
+            updated += len(rows)
+
+        # Статистика аномалій ведеться за категоріями — перераховуємо з новими
+        if updated:
+            with transaction():
+                _rebuild_category_stats(cursor, user_id)
+            conn.commit()
+    except Exception as e:
+        print(f"Error backfilling categories: {e}")
+        conn.rollback()
+    return updated
 
 # --- ХАРДКОД ТА ІНІЦІАЛІЗАЦІЯ ---
 
@@ -301,7 +945,11 @@ def create_initial_test_user(cursor, conn):
 
         TEST_EMAIL = "test@app.com"
         TEST_PASSWORD = "testpass" 
-        TEST_HASHED_PASSWORD = hash_password(TEST_PASSWORD)
+        # Хеш TEST_PASSWORD обчислено заздалегідь, щоб не рахувати PBKDF2 під час імпорту модуля
+        TEST_HASHED_PASSWORD = (
+            "pbkdf2_sha256$100000$8a5ce2cad1df5fc63920ba5bfa94267c"
+            "$e3f5329bb834c279c0e443fed2cc1ab5b57d282b6c2bc0ba6f333b3cfde79f0b"
+        )
         
         # 1. Створення користувача
         cursor.execute(
@@ -323,15 +971,14 @@ def create_initial_test_user(cursor, conn):
         # 4. Створення початкової картки з балансом
         cursor.execute(
             "INSERT INTO user_cards (user_id, name, number, bank, balance, color) VALUES (?, ?, ?, ?, ?, ?)",
-            (user_id, "Test Card", "1111222233334444", "Test Bank", 1000.0, json.dumps([0.2, 0.7, 0.9, 1]))
+            (user_id, "Test Card", "1111222233334444", "Test Bank", to_cents(1000.0), json.dumps([0.2, 0.7, 0.9, 1]))
         )
         
-        # 5. Логування початкового балансу
+        # 5. Логування початкового балансу: картка відкривається з нулем, а баланс
+        # дає транзакція 'income' (з категорією), тож журнал картки збігається з балансом
         card_id = cursor.lastrowid
-        cursor.execute('''
-            INSERT INTO transactions (user_id, type, amount, description, card_id)
-            VALUES (?, 'income', ?, 'Початковий баланс тестування', ?)
-        ''', (user_id, 1000.0, card_id))
+        record_balance_checkpoint(cursor, card_id, 0)
+        record_transaction(cursor, user_id, 'income', 1000.0, 'Початковий баланс тестування', card_id)
         
         conn.commit()
         print(f"!!! АВТОМАТИЧНО СТВОРЕНО ТЕСТОВОГО КОРИСТУВАЧА !!! Email: {TEST_EMAIL}, Пароль: {TEST_PASSWORD}")
@@ -340,9 +987,9 @@ def create_initial_test_user(cursor, conn):
         print(f"Помилка створення тестового користувача/даних: {traceback.format_exc()}")
 
 
-def init_database():
-    """Initializes and returns database connection and cursor, з надійним копіюванням для Android."""
-    db_path = get_db_path()
+def init_database(pool):
+    """Готує БД для пулу pool: копіювання з активів на Android, схема, міграції, заповнення."""
+    db_path = pool.db_path
 
     # Перевіряємо, чи існує робоча БД до початку процесу
     db_existed = os.path.exists(db_path)
@@ -365,48 +1012,73 @@ def init_database():
             
     # --- END КЛЮЧОВИЙ КОПІЮВАЛЬНИЙ МЕХАНІЗМ ---
     
-    # Використовуємо check_same_thread=False для Kivy/Android
-    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn = pool.connection()
     cursor = conn.cursor()
 
     # 1. Створення/Перевірка Схеми
     create_db_schema(cursor)
     
-    # 2. Фікс Схеми (якщо потрібно)
-    fix_database_schema(conn, cursor) 
+    # 2. Міграції схеми (PRAGMA user_version)
+    apply_migrations(conn, cursor)
+    
+    # Категоризація рядків, що залишились без категорії (пакетами)
+    backfill_categories(cursor, conn)
+    
+    # Місячні контрольні точки балансу, що з'явилися з останнього запуску
+    refresh_balance_checkpoints(cursor, conn)
     
     # 3. Гарантоване Тестування (Спрацює лише при першому запуску, якщо БД була порожньою)
     if not db_existed:
         create_initial_test_user(cursor, conn)
 
-    return conn, cursor
+    cursor.close()
 
 # --- СТАРТОВІ ФУНКЦІЇ ---
 
-def setup_db():
-    global conn, cursor
-    if conn is None:
-        try:
-            conn, cursor = init_database()
-        except Exception as e:
-            print(f"КРИТИЧНА ПОМИЛКА: Не вдалося ініціалізувати базу даних: {traceback.format_exc()}")
-            # Надійна заглушка для запобігання крашу
-            class MockConnection:
-                def commit(self): pass
-                def close(self): pass 
-                def cursor(self): 
-                    # Повертає mock-курсор
-                    return MockCursor()
-            class MockCursor:
-                def execute(self, *args): pass
-                def fetchall(self): return []
-                def fetchone(self): return None
-                def fetchmany(self, *args): return []
-            cursor = MockCursor()
-            conn = MockConnection()
-
-# ІНІЦІАЛІЗУЄМО БАЗУ ДАНИХ ОДРАЗУ
-setup_db() 
+def _initialize_database(pool):
+    """Ініціалізатор пулу: init_database з обробкою помилок і позначками часу старту."""
+    mark("db_init_start")
+    try:
+        init_database(pool)
+    except Exception:
+        # Пул однаково стає готовим: функції БД повідомлять про помилки самі
+        print(f"КРИТИЧНА ПОМИЛКА: Не вдалося ініціалізувати базу даних: {traceback.format_exc()}")
+    mark("db_ready")
+
+def setup_db(background=False):
+    """Запускає ініціалізацію БД (лише перший виклик має ефект).
+
+    background=True — у фоновому потоці, щоб не затримувати перший кадр;
+    функції, що звернуться до БД раніше, дочекаються готовності. Без виклику
+    setup_db БД ініціалізується при першому зверненні.
+    """
+    db.start(background)
+
+def wait_db_ready(timeout=None):
+    """Чекає завершення ініціалізації БД (запускає її, якщо ще не запущено)."""
+    return db.wait_ready(timeout)
+
+def checkpoint_database(mode="PASSIVE"):
+    """Переносить накопичені сторінки WAL в основний файл БД (до готовності БД — нічого)."""
+    if db is None or not db.ready:
+        return None
+    return checkpoint(db.connection(), mode)
+
+def transaction():
+    """Одиниця роботи: усі записи в блоці фіксуються одним commit.
+
+    Вкладені виклики стають SAVEPOINT, а conn.commit() усередині блоку
+    нічого не робить — commit виконує лише зовнішній рівень.
+    """
+    if db is None:
+        return nullcontext(cursor)
+    return db.write()
+
+# Пул і проксі створюються одразу, але БД відкривається лише в setup_db()
+# або при першому зверненні — імпорт модуля не чекає на диск
+db = ConnectionPool(get_db_path(), DB_PROFILE, initializer=_initialize_database)
+conn = ConnectionProxy(db)
+cursor = CursorProxy(db)
 
 # --- ФУНКЦІОНАЛ (РОБОТА З ДАНИМИ) ---
 
@@ -612,7 +1284,7 @@ def get_login_history(cursor, user_id, limit=10):
             SELECT device_info, ip_address, login_time, logout_time 
             FROM user_sessions 
             WHERE user_id=? 
-            ORDER BY login_time DESC 
+            ORDER BY login_ts DESC 
             LIMIT ?
         ''', (user_id, limit))
         
@@ -821,6 +1493,10 @@ def log_security_action(cursor, conn, user_id, action_type, description="", ip_a
         return False
 
 def export_user_data(cursor, user_id):
+    """Короткий зріз профілю: до 1000 останніх транзакцій і 50 сесій.
+
+    Повний експорт без обмежень — utils.data_export.export_user_data_stream.
+    """
     try:
         cursor.execute("SELECT username, email, created_at FROM users WHERE id=?", (user_id,))
         user_info = cursor.fetchone()
@@ -873,8 +1549,8 @@ def get_user_savings_plans(cursor, user_id):
             result.append({
                 'id': plan_id,
                 'name': name,
-                'target_amount': target,
-                'current_amount': current,
+                'target_amount': from_cents(target),
+                'current_amount': from_cents(current),
                 'progress_percentage': (current / target * 100) if target > 0 else 0,
                 'deadline': deadline,
                 'status': status
@@ -885,60 +1561,228 @@ def get_user_savings_plans(cursor, user_id):
         print(f"Error getting savings plans: {e}")
         return []
 
-def get_analytics_data(cursor, user_id, period='month', category=None, card_id=None):
+# --- КЕШ АНАЛІТИКИ ---
+# Результати аналітичних функцій кешуються за ключем (user_id, функція, аргументи,
+# версія даних). Кожен запис у журнал підвищує версію даних користувача після
+# commit, тож кеш використовується, доки дані справді не зміняться.
+# Усередині довгого знімка читання (analytics_snapshot) версія фіксується на
+# початку знімка: результати зі старих даних не потрапляють у кеш під новою версією.
+
+ANALYTICS_CACHE_SIZE = 128
+
+_analytics_cache = OrderedDict()
+_data_versions = {}
+_cache_stats = {'hits': 0, 'misses': 0}
+_cache_lock = threading.Lock()
+_snapshot_local = threading.local()
+
+def _data_version(user_id):
+    # Версія None — спільна для всіх користувачів (перерахунок агрегатів тощо)
+    return (_data_versions.get(None, 0), _data_versions.get(user_id, 0))
+
+def _visible_version(user_id):
+    """Версія даних, яку бачить поточний потік: у знімку — версія на його початку."""
+    versions = getattr(_snapshot_local, 'versions', None)
+    if versions is None:
+        return _data_version(user_id)
+    return (versions.get(None, 0), versions.get(user_id, 0))
+
+@contextmanager
+def analytics_snapshot():
+    """Фіксує версії даних для аналітики, що читає в одній транзакції (знімку).
+
+    Входити слід до першого читання знімка: запис, зафіксований між цим моментом
+    і початком знімка, лише зробить результат некешованим.
+    """
+    outer = getattr(_snapshot_local, 'versions', None)
+    if outer is None:
+        with _cache_lock:
+            _snapshot_local.versions = dict(_data_versions)
     try:
-        end_date = datetime.now()
-        
-        if period == 'today':
-            start_date = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        elif period == 'week':
-            start_date = end_date - timedelta(days=7)
-        elif period == 'month':
-            start_date = end_date - timedelta(days=30)
-        elif period == 'year':
-            start_date = end_date - timedelta(days=365)
+        yield
+    finally:
+        if outer is None:
+            _snapshot_local.versions = None
+
+def _bump_version(user_id):
+    with _cache_lock:
+        _data_versions[user_id] = _data_versions.get(user_id, 0) + 1
+        if user_id is None:
+            _analytics_cache.clear()
         else:
-            start_date = end_date - timedelta(days=30)
+            for key in [key for key in _analytics_cache if key[0] == user_id]:
+                del _analytics_cache[key]
 
-        start_date_str = start_date.strftime('%Y-%m-%d %H:%M:%S')
-        end_date_str = end_date.strftime('%Y-%m-%d %H:%M:%S')
+def bump_data_version(user_id=None):
+    """Позначає дані користувача (None — усіх) зміненими. Усередині транзакції — після її завершення."""
+    if db is None:
+        _bump_version(user_id)
+    else:
+        db.on_write_end(lambda: _bump_version(user_id))
+
+def _bump_card_owner(cursor, card_id):
+    cursor.execute("SELECT user_id FROM user_cards WHERE id=?", (card_id,))
+    row = cursor.fetchone()
+    if row:
+        bump_data_version(row[0])
+
+def _cache_key_part(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_cache_key_part(item) for item in value)
+    return value
+
+def cached_analytics(func):
+    """Кешує результат func(cursor, user_id, ...) до наступної зміни даних користувача."""
+    @functools.wraps(func)
+    def wrapper(cursor, user_id, *args, **kwargs):
+        with _cache_lock:
+            version = _visible_version(user_id)
+            key = (user_id, func.__name__, _cache_key_part(args),
+                   tuple(sorted((k, _cache_key_part(v)) for k, v in kwargs.items())), version)
+            if key in _analytics_cache:
+                _analytics_cache.move_to_end(key)
+                _cache_stats['hits'] += 1
+                # Копія: екрани змінюють отримані словники
+                return copy.deepcopy(_analytics_cache[key])
+            _cache_stats['misses'] += 1
+
+        result = func(cursor, user_id, *args, **kwargs)
+
+        with _cache_lock:
+            # Дані змінились під час обчислення — результат не кешуємо
+            if _data_version(user_id) == version:
+                _analytics_cache[key] = copy.deepcopy(result)
+                while len(_analytics_cache) > ANALYTICS_CACHE_SIZE:
+                    _analytics_cache.popitem(last=False)
+        return result
+    return wrapper
 
-        cursor.execute('''
-            SELECT type, amount
-            FROM transactions 
-            WHERE user_id=? AND created_at BETWEEN ? AND ?
-        ''', (user_id, start_date_str, end_date_str))
-        
-        transactions = cursor.fetchall()
+def get_analytics_cache_stats():
+    with _cache_lock:
+        hits, misses = _cache_stats['hits'], _cache_stats['misses']
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'size': len(_analytics_cache),
+            'hit_rate': round(hits / total * 100, 1) if total else 0.0
+        }
 
-        total_income = 0
-        total_expenses = 0
-        transactions_count = len(transactions)
+def clear_analytics_cache():
+    with _cache_lock:
+        _analytics_cache.clear()
+        _cache_stats['hits'] = 0
+        _cache_stats['misses'] = 0
+    clear_ledgers()
+    clear_forecasters()
+
+# --- ПЕРІОДИ ---
+# Усі фільтри за часом використовують напіввідкритий діапазон [start_ts, end_ts)
+# у секундах Unix. Межі обчислюються за локальним календарем, а порівнюються
+# з epoch-стовпцями (created_ts, login_ts), тож UTC і локальний час не змішуються.
+
+PERIOD_DAYS = {'week': 7, 'month': 30, 'year': 365}
+
+def period_range(period, now=None):
+    """Повертає (start_ts, end_ts) для 'today', 'week', 'month', 'year' або 'current_month'."""
+    now = now or datetime.now()
+    end_ts = int(now.timestamp()) + 1
+
+    if period == 'today':
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif period == 'current_month':
+        start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        next_year, next_month = _shift_month(start.year, start.month, 1)
+        end_ts = int(start.replace(year=next_year, month=next_month).timestamp())
+    else:
+        start = now - timedelta(days=PERIOD_DAYS.get(period, 30))
+
+    return int(start.timestamp()), end_ts
+
+@contextmanager
+def bulk_insert_transactions(cursor):
+    """Масова вставка в transactions без порядкового тригера INSERT пошуку.
+
+    Тригер пошуку на кожен рядок займає більшу частину часу вставки.
+    На час блоку він вимикається, а після нього нові рядки (id > попереднього
+    максимуму) одним запитом додаються в transaction_search, а їхні суми — у
+    статистику категорій category_stats. Баланси карток не змінюються: опорні
+    точки, після яких з'явилася нова історія, перераховуються від поточного
+    балансу, а місячні контрольні точки зачеплених карток — від опорних.
+    Весь блок — одна одиниця роботи, тож помилка відкочує і вставку, і DDL.
+    """
+    with transaction():
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM transactions")
+        last_id = cursor.fetchone()[0]
+        has_search = _search_table_exists(cursor)
+
+        cursor.execute("DROP TRIGGER IF EXISTS trg_transactions_search_insert")
+
+        yield cursor
+
+        if has_search:
+            cursor.execute(f'''
+                INSERT INTO {SEARCH_TABLE} (rowid, description)
+                SELECT {_search_rowid_sql('transactions')}, COALESCE(description, '')
+                FROM transactions WHERE id > ?
+            ''', (last_id,))
+            _create_search_triggers(cursor)
+
+        # Статистика категорій для нових витрат; імпортовані суми не позначаються як аномалії
+        cursor.execute(f'''
+            SELECT user_id, category, amount FROM transactions
+            WHERE id > ? AND type IN ({_sql_in_list(ANOMALY_TYPES)})
+            ORDER BY created_ts, id
+        ''', (last_id,))
+        accumulate_stats(cursor, cursor.fetchall())
+
+        # Імпортовані рядки датовані минулим — місячні точки балансу цих карток перераховуються
+        _rebase_card_anchors(cursor, last_id)
+        cursor.execute("SELECT DISTINCT card_id FROM transactions WHERE id > ? AND card_id IS NOT NULL", (last_id,))
+        _reset_card_checkpoints(cursor, [row[0] for row in cursor.fetchall()])
+
+# --- АНАЛІТИКА ---
+# Публічні функції аналітики — тонкі обгортки над журналом analytics_engine:
+# журнал завантажується один раз на версію даних користувача, а кожна функція
+# лише вибирає з нього період і групування.
+
+def _ledger(cursor, user_id, since_ts):
+    """Журнал користувача, що покриває since_ts і щонайменше LEDGER_WINDOW_DAYS днів."""
+    window_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=LEDGER_WINDOW_DAYS)
+    since_ts = min(since_ts, int(window_start.timestamp()))
+    version = _visible_version(user_id)
+    if version != _data_version(user_id):
+        # Знімок старший за поточні дані: журнал не кешується, щоб не витіснити актуальний
+        return Ledger.load(cursor, user_id, since_ts, version)
+    return get_ledger(cursor, user_id, since_ts, version)
+
+@cached_analytics
+def get_analytics_data(cursor, user_id, period='month', category=None, card_id=None):
+    try:
+        start_ts, end_ts = period_range(period)
+        ledger = _ledger(cursor, user_id, start_ts)
 
-        for trans in transactions:
-            trans_type, amount = trans
-            
-            if trans_type in ['deposit', 'card_deposit', 'transfer_in', 'income', 'savings_return', 'savings_completed']:
-                total_income += amount
-            elif trans_type in ['withdrawal', 'transfer', 'transfer_out', 'expense', 'savings_deposit', 'envelope_deposit']:
-                total_expenses += amount
+        total_income = ledger.total(start_ts, end_ts, INCOME_TYPES, card_id=card_id, category=category)
+        total_expenses = ledger.total(start_ts, end_ts, EXPENSE_TYPES, card_id=card_id, category=category)
+        transactions_count = ledger.count(start_ts, end_ts, card_id=card_id, category=category)
 
+        # Суми в центах — точна цілочисельна арифметика
         net_balance = total_income - total_expenses
         
-        days_in_period = (end_date - start_date).days or 1
-        average_daily = total_expenses / days_in_period
+        days_in_period = (end_ts - start_ts) // 86400 or 1
+        average_daily = total_expenses // days_in_period
 
         total_balance = get_total_balance(cursor, user_id)
 
         savings_rate = (net_balance / total_income * 100) if total_income > 0 else 0
 
         return {
-            'total_income': round(total_income, 2),
-            'total_expenses': round(total_expenses, 2),
-            'net_balance': round(net_balance, 2),
-            'average_daily': round(average_daily, 2),
+            'total_income': from_cents(total_income),
+            'total_expenses': from_cents(total_expenses),
+            'net_balance': from_cents(net_balance),
+            'average_daily': from_cents(average_daily),
             'transactions_count': transactions_count,
-            'total_balance': round(total_balance, 2),
+            'total_balance': total_balance,
             'savings_rate': round(savings_rate, 1),
             'period_days': days_in_period
         }
@@ -956,75 +1800,206 @@ def get_analytics_data(cursor, user_id, period='month', category=None, card_id=N
             'period_days': 1
         }
 
-def get_category_breakdown(cursor, user_id, period='month'):
+@cached_analytics
+def get_daily_series(cursor, user_id, period='current_month', types=EXPENSE_TYPES, window=7):
+    """Суми за кожен локальний день періоду та ковзне середнє за window днів.
+
+    Повертає [{'date': 'YYYY-MM-DD', 'amount': ..., 'average': ...}], включно з днями без транзакцій.
+    """
     try:
-        end_date = datetime.now()
-        if period == 'today':
-            start_date = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        elif period == 'week':
-            start_date = end_date - timedelta(days=7)
-        elif period == 'month':
-            start_date = end_date - timedelta(days=30)
-        elif period == 'year':
-            start_date = end_date - timedelta(days=365)
-        else:
-            start_date = end_date - timedelta(days=30)
+        start_ts, end_ts = period_range(period)
+        start = datetime.fromtimestamp(start_ts).replace(hour=0, minute=0, second=0, microsecond=0)
+        days = (datetime.fromtimestamp(end_ts - 1).date() - start.date()).days + 1
 
-        start_date_str = start_date.strftime('%Y-%m-%d %H:%M:%S')
-        end_date_str = end_date.strftime('%Y-%m-%d %H:%M:%S')
+        ledger = _ledger(cursor, user_id, int(start.timestamp()))
+        dates, amounts = ledger.daily_series(start, days, types)
+        averages = rolling_mean(amounts, window)
 
-        cursor.execute('''
-            SELECT amount, description
-            FROM transactions 
-            WHERE user_id=? AND type IN ('withdrawal', 'transfer_out', 'expense') 
-            AND created_at BETWEEN ? AND ?
-        ''', (user_id, start_date_str, end_date_str))
+        return [
+            {'date': day.isoformat(), 'amount': from_cents(int(amount)), 'average': from_cents(int(round(average)))}
+            for day, amount, average in zip(dates, amounts, averages)
+        ]
         
-        transactions = cursor.fetchall()
+    except Exception as e:
+        print(f"Error getting daily series: {e}")
+        return []
 
-        # Стандартні категорії
-        categories = {
-            'Food': {'amount': 0, 'color': [0.95, 0.3, 0.5, 1]},
-            'Transport': {'amount': 0, 'color': [0.2, 0.7, 0.9, 1]},
-            'Entertainment': {'amount': 0, 'color': [0.2, 0.8, 0.3, 1]},
-            'Bills': {'amount': 0, 'color': [1, 0.6, 0.2, 1]},
-            'Shopping': {'amount': 0, 'color': [0.7, 0.4, 0.9, 1]},
-            'Other': {'amount': 0, 'color': [0.7, 0.7, 0.7, 1]}
-        }
+# --- ПРАВИЛА КАТЕГОРІЙ ---
+
+def recategorize_transactions(cursor, conn, user_id):
+    """Повторно категоризує всі транзакції користувача (після зміни правил)."""
+    try:
+        invalidate_categorizer(user_id)
+        with transaction():
+            cursor.execute("UPDATE transactions SET category=NULL WHERE user_id=?", (user_id,))
+            bump_data_version(user_id)
+        conn.commit()
+        return backfill_categories(cursor, conn, user_id=user_id)
+    except Exception as e:
+        print(f"Error recategorizing transactions: {e}")
+        conn.rollback()
+        return 0
+
+def get_category_rules(cursor, user_id):
+    """Правила користувача та стандартні правила (is_default=True)."""
+    try:
+        cursor.execute('''
+            SELECT id, category, keyword, priority, user_id IS NULL
+            FROM category_rules
+            WHERE user_id IS NULL OR user_id=?
+            ORDER BY priority, category, keyword
+        ''', (user_id,))
+        return [
+            {'id': rule_id, 'category': category, 'keyword': keyword, 'priority': priority, 'is_default': bool(is_default)}
+            for rule_id, category, keyword, priority, is_default in cursor.fetchall()
+        ]
+    except Exception as e:
+        print(f"Error getting category rules: {e}")
+        return []
+
+def add_category_rule(cursor, conn, user_id, category, keyword, priority=0, recategorize=True):
+    """Додає правило користувача. Менший priority перемагає стандартні правила."""
+    try:
+        category = (category or '').strip()
+        keyword = (keyword or '').strip().lower()
+        if not category or not keyword:
+            return None
+
+        with transaction():
+            cursor.execute(
+                "INSERT INTO category_rules (user_id, category, keyword, priority) VALUES (?, ?, ?, ?)",
+                (user_id, category, keyword, priority)
+            )
+            rule_id = cursor.lastrowid
+        conn.commit()
 
-        keywords = {
-            'Food': ['food', 'restaurant', 'grocery', 'cafe', 'meal', 'supermarket'],
-            'Transport': ['transport', 'bus', 'taxi', 'fuel', 'gas', 'metro', 'train'],
-            'Entertainment': ['movie', 'cinema', 'concert', 'game', 'entertainment', 'netflix'],
-            'Bills': ['bill', 'rent', 'electricity', 'water', 'internet', 'phone'],
-            'Shopping': ['shop', 'store', 'mall', 'clothes', 'electronics', 'purchase']
+        invalidate_categorizer(user_id)
+        if recategorize:
+            recategorize_transactions(cursor, conn, user_id)
+        return rule_id
+    except Exception as e:
+        print(f"Error adding category rule: {e}")
+        conn.rollback()
+        return None
+
+def delete_category_rule(cursor, conn, user_id, rule_id, recategorize=True):
+    """Видаляє правило користувача (стандартні правила не видаляються)."""
+    try:
+        with transaction():
+            cursor.execute("DELETE FROM category_rules WHERE id=? AND user_id=?", (rule_id, user_id))
+            deleted = cursor.rowcount > 0
+        conn.commit()
+
+        if deleted:
+            invalidate_categorizer(user_id)
+            if recategorize:
+                recategorize_transactions(cursor, conn, user_id)
+        return deleted
+    except Exception as e:
+        print(f"Error deleting category rule: {e}")
+        conn.rollback()
+        return False
+
+def _envelope_daily_matrix(cursor, user_id, edges):
+    """(конверти [(id, name)], матриця [конверт, день]) поповнень конвертів за днями edges."""
+    cursor.execute("SELECT id, name FROM envelopes WHERE user_id=? ORDER BY id", (user_id,))
+    envelopes = cursor.fetchall()
+    envelope_ids = np.array([env_id for env_id, _ in envelopes], dtype=np.int64)
+    days = len(edges) - 1
+
+    cursor.execute('''
+        SELECT created_ts, envelope_id, amount FROM envelope_transactions
+        WHERE user_id=? AND created_ts >= ? AND created_ts < ?
+    ''', (user_id, edges[0], edges[-1]))
+    rows = cursor.fetchall()
+    if not rows or not envelopes:
+        return envelopes, np.zeros((len(envelopes), days), dtype=np.int64)
+
+    ts, owners, amounts = (np.array(column, dtype=np.int64) for column in zip(*rows))
+    envelope_index = np.searchsorted(envelope_ids, owners)
+    known = (envelope_index < len(envelope_ids)) & (np.take(envelope_ids, envelope_index, mode='clip') == owners)
+    index = envelope_index * days + np.searchsorted(edges, ts, side='right') - 1
+    sums = np.bincount(index[known], weights=amounts[known], minlength=len(envelope_ids) * days)
+    return envelopes, np.rint(sums).astype(np.int64).reshape(len(envelopes), days)
+
+@cached_analytics
+def get_spending_forecasts(cursor, user_id):
+    """Прогноз витрат до кінця поточного місяця: загалом, по кожній картці та конверту.
+
+    Денні ряди будуються з журналу analytics_engine, прогноз — модель forecasting
+    (Holt-Winters з тижневою сезонністю), що кешується для користувача й
+    оновлюється лише новими днями. Для кожного ряду повертає spent (з початку
+    місяця), forecast (очікувана сума за місяць) і next_week (прогноз на 7 днів).
+    """
+    try:
+        now = datetime.now()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        start = datetime.combine(history_start(user_id, today.date()), datetime.min.time())
+        # Останній стовпець — неповний сьогоднішній день, у модель він не потрапляє
+        dates, edges = day_edges(start, (today - start).days + 1)
+
+        ledger = _ledger(cursor, user_id, edges[0])
+        cursor.execute("SELECT id, name FROM user_cards WHERE user_id=? ORDER BY id", (user_id,))
+        cards = cursor.fetchall()
+        card_ids, card_matrix = ledger.card_buckets(edges, EXPENSE_TYPES)
+        card_rows = {card_id: row for card_id, row in zip(card_ids, card_matrix)}
+        envelopes, envelope_matrix = _envelope_daily_matrix(cursor, user_id, edges)
+
+        empty = np.zeros(len(dates), dtype=np.int64)
+        keys = ['total'] + [('card', card_id) for card_id, _ in cards] + [('envelope', env_id) for env_id, _ in envelopes]
+        matrix = np.vstack([ledger.bucket_totals(edges, EXPENSE_TYPES)]
+                           + [card_rows.get(card_id, empty) for card_id, _ in cards]
+                           + list(envelope_matrix))
+
+        model = get_forecaster(user_id, keys, start.date(), matrix[:, :-1])
+
+        next_year, next_month = _shift_month(today.year, today.month, 1)
+        remaining = (datetime(next_year, next_month, 1) - today).days
+        predicted = model.forecast(max(remaining, SEASON_DAYS))
+        today_actual = matrix[:, -1]
+        month_start = dates.index(today.replace(day=1).date())
+        spent = matrix[:, month_start:].sum(axis=1)
+        # Сьогоднішній день: не менше, ніж уже витрачено
+        forecast = (spent - today_actual + np.maximum(today_actual, predicted[:, 0])
+                    + predicted[:, 1:remaining].sum(axis=1))
+        next_week = predicted[:, :SEASON_DAYS].sum(axis=1)
+
+        def summary(index):
+            return {
+                'spent': from_cents(int(spent[index])),
+                'forecast': from_cents(int(round(forecast[index]))),
+                'next_week': from_cents(int(round(next_week[index])))
+            }
+
+        return {
+            'total': summary(0),
+            'cards': [dict(summary(1 + i), id=card_id, name=name) for i, (card_id, name) in enumerate(cards)],
+            'envelopes': [dict(summary(1 + len(cards) + i), id=env_id, name=name)
+                          for i, (env_id, name) in enumerate(envelopes)]
         }
+        
+    except Exception as e:
+        print(f"Error getting spending forecasts: {e}")
+        return {'total': {'spent': 0, 'forecast': 0, 'next_week': 0}, 'cards': [], 'envelopes': []}
 
-        for amount, description in transactions:
-            description_lower = (description or '').lower()
-            categorized = False
-            
-            for category, words in keywords.items():
-                if any(word in description_lower for word in words):
-                    categories[category]['amount'] += amount
-                    categorized = True
-                    break
-            
-            if not categorized:
-                categories['Other']['amount'] += amount
+@cached_analytics
+def get_category_breakdown(cursor, user_id, period='month'):
+    try:
+        start_ts, end_ts = period_range(period)
 
-        total_expenses = sum(cat['amount'] for cat in categories.values())
+        # Категорії вже збережені в рядках — лише агрегуємо
+        totals = _ledger(cursor, user_id, start_ts).sum_by_category(start_ts, end_ts, SPENDING_TYPES)
+        total_expenses = sum(totals.values())
         
         result = []
-        for category, data in categories.items():
-            if data['amount'] > 0:
-                percentage = (data['amount'] / total_expenses * 100) if total_expenses > 0 else 0
-                result.append({
-                    'name': category,
-                    'value': round(percentage, 1),
-                    'amount': round(data['amount'], 2),
-                    'color': data['color']
-                })
+        for category, amount in totals.items():
+            percentage = (amount / total_expenses * 100) if total_expenses > 0 else 0
+            result.append({
+                'name': category,
+                'value': round(percentage, 1),
+                'amount': from_cents(amount),
+                'color': category_color(category)
+            })
 
         result.sort(key=lambda x: x['amount'], reverse=True)
         
@@ -1034,6 +2009,7 @@ def get_category_breakdown(cursor, user_id, period='month'):
         print(f"Error getting category breakdown: {e}")
         return []
 
+@cached_analytics
 def get_top_categories(cursor, user_id, period='month', limit=5):
     try:
         category_data = get_category_breakdown(cursor, user_id, period)
@@ -1042,78 +2018,58 @@ def get_top_categories(cursor, user_id, period='month', limit=5):
         print(f"Error getting top categories: {e}")
         return []
 
+@cached_analytics
 def get_cards_analytics(cursor, user_id, period='month'):
-    try:
-        end_date = datetime.now()
-        if period == 'today':
-            start_date = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        elif period == 'week':
-            start_date = end_date - timedelta(days=7)
-        elif period == 'month':
-            start_date = end_date - timedelta(days=30)
-        elif period == 'year':
-            start_date = end_date - timedelta(days=365)
-        else:
-            start_date = end_date - timedelta(days=30)
-
-        start_date_str = start_date.strftime('%Y-%m-%d %H:%M:%S')
-        end_date_str = end_date.strftime('%Y-%m-%d %H:%M:%S')
+    """Доходи/витрати по кожній картці.
 
-        user_cards = get_user_cards(cursor, user_id)
-        cards_analytics = []
+    period — рядок ('today', 'week', 'month', 'year') або список періодів.
+    Для рядка повертає список карток, для списку — {період: список карток},
+    обчислений з одного завантаженого журналу.
+    """
+    try:
+        periods = [period] if isinstance(period, str) else list(period)
+        ranges = [period_range(p) for p in periods]
+        ledger = _ledger(cursor, user_id, min(start_ts for start_ts, _ in ranges))
 
-        for card in user_cards:
-            card_id = card['id']
-            
-            cursor.execute('''
-                SELECT SUM(amount) 
-                FROM transactions 
-                WHERE user_id=? AND card_id=? AND type IN ('deposit', 'transfer_in', 'income')
-                AND created_at BETWEEN ? AND ?
-            ''', (user_id, card_id, start_date_str, end_date_str))
-            income_result = cursor.fetchone()
-            income = income_result[0] or 0
+        cursor.execute("SELECT id, name, balance, color FROM user_cards WHERE user_id=? ORDER BY id", (user_id,))
+        cards = cursor.fetchall()
 
-            cursor.execute('''
-                SELECT SUM(amount) 
-                FROM transactions 
-                WHERE user_id=? AND card_id=? AND type IN ('withdrawal', 'transfer_out', 'expense')
-                AND created_at BETWEEN ? AND ?
-            ''', (user_id, card_id, start_date_str, end_date_str))
-            expenses_result = cursor.fetchone()
-            expenses = expenses_result[0] or 0
-
-            cards_analytics.append({
+        result = {}
+        for name, (start_ts, end_ts) in zip(periods, ranges):
+            income = ledger.sum_by_card(start_ts, end_ts, INCOME_TYPES)
+            expenses = ledger.sum_by_card(start_ts, end_ts, EXPENSE_TYPES)
+            result[name] = [{
                 'id': card_id,
-                'name': card['name'],
-                'income': round(income, 2),
-                'expenses': round(expenses, 2),
-                'balance': card['balance'],
-                'color': card['color']
-            })
+                'name': card_name,
+                'income': from_cents(income.get(card_id, 0)),
+                'expenses': from_cents(expenses.get(card_id, 0)),
+                'balance': from_cents(balance),
+                'color': safe_color_conversion(color)
+            } for card_id, card_name, balance, color in cards]
 
-        return cards_analytics
+        return result[period] if isinstance(period, str) else result
         
     except Exception as e:
         print(f"Error getting cards analytics: {e}")
-        return []
+        return [] if isinstance(period, str) else {}
 
+@cached_analytics
 def get_budget_progress(cursor, user_id):
     try:
         envelopes = get_user_envelopes(cursor, user_id)
         budget_data = []
         
         for envelope in envelopes:
-            spent = envelope['current_amount']
-            limit = envelope['budget_limit']
+            spent = to_cents(envelope['current_amount'])
+            limit = to_cents(envelope['budget_limit'])
             percentage = (spent / limit * 100) if limit > 0 else 0
             
             budget_data.append({
                 'name': envelope['name'],
-                'spent': round(spent, 2),
-                'limit': round(limit, 2),
+                'spent': from_cents(spent),
+                'limit': from_cents(limit),
                 'percentage': round(percentage, 1),
-                'remaining': round(limit - spent, 2),
+                'remaining': from_cents(limit - spent),
                 'color': envelope['color'],
                 'is_overbudget': percentage > 100
             })
@@ -1124,18 +2080,43 @@ def get_budget_progress(cursor, user_id):
         print(f"Error getting budget progress: {e}")
         return []
 
+@cached_analytics
+def get_spending_anomalies(cursor, user_id, days=30, limit=5):
+    """Незвичні витрати за останні days днів, знайдені під час запису транзакцій."""
+    try:
+        since_ts = int((datetime.now() - timedelta(days=days)).timestamp())
+        anomalies = get_recent_anomalies(cursor, user_id, since_ts, limit)
+        for anomaly in anomalies:
+            anomaly['amount'] = from_cents(anomaly['amount'])
+            anomaly['typical'] = from_cents(anomaly['typical'])
+        return anomalies
+    except Exception as e:
+        print(f"Error getting spending anomalies: {e}")
+        return []
+
+def dismiss_spending_anomaly(cursor, conn, user_id, anomaly_id):
+    """Приховує незвичну витрату з підказок."""
+    try:
+        with transaction():
+            dismissed = dismiss_anomaly(cursor, user_id, anomaly_id)
+            bump_data_version(user_id)
+        return dismissed
+    except Exception as e:
+        print(f"Error dismissing spending anomaly: {e}")
+        conn.rollback()
+        return False
+
+@cached_analytics
 def get_insights_and_forecasts(cursor, user_id):
     try:
         insights = []
         
-        # Отримуємо дані за поточний і минулий місяць
+        # Отримуємо дані за поточний і попередній 30-денний період
         current_data = get_analytics_data(cursor, user_id, 'month')
         
-        # Для порівняння з минулим місяцем, робимо запит, зрушуючи період на 30 днів назад
-        end_date_prev = datetime.now() - timedelta(days=30)
-        start_date_prev = end_date_prev - timedelta(days=30)
-        
-        prev_data = get_analytics_data(cursor, user_id, period='month') # Використовуємо стандартний місяць
+        start_ts, end_ts = period_range('month')
+        prev_start_ts = start_ts - (end_ts - start_ts)
+        prev_expenses = from_cents(_ledger(cursor, user_id, prev_start_ts).total(prev_start_ts, start_ts, EXPENSE_TYPES))
         
         budgets = get_budget_progress(cursor, user_id)
         for budget in budgets:
@@ -1144,15 +2125,25 @@ def get_insights_and_forecasts(cursor, user_id):
             elif budget['percentage'] > 75:
                 insights.append(f" Конверт '{budget['name']}' майже заповнений - {budget['percentage']}%")
         
-        if prev_data['total_expenses'] > 0 and current_data['total_expenses'] > prev_data['total_expenses'] * 1.2:
-            increase_percent = ((current_data['total_expenses'] - prev_data['total_expenses']) / prev_data['total_expenses'] * 100)
+        if prev_expenses > 0 and current_data['total_expenses'] > prev_expenses * 1.2:
+            increase_percent = ((current_data['total_expenses'] - prev_expenses) / prev_expenses * 100)
             insights.append(f" Зростання витрат на {increase_percent:.1f}% порівняно з минулим місяцем")
         
-        daily_avg = current_data['average_daily']
-        days_in_month = 30
-        projected_expenses = daily_avg * days_in_month
+        for anomaly in get_spending_anomalies(cursor, user_id, limit=3):
+            insights.append(f" Незвична витрата: ${anomaly['amount']:.2f} у категорії '{anomaly['category']}' (зазвичай близько ${anomaly['typical']:.2f})")
         
-        insights.append(f" Прогноз витрат до кінця місяця: ${projected_expenses:.2f}")
+        forecasts = get_spending_forecasts(cursor, user_id)
+        insights.append(f" Прогноз витрат до кінця місяця: ${forecasts['total']['forecast']:.2f}")
+        
+        envelopes = {envelope['id']: envelope for envelope in get_user_envelopes(cursor, user_id)}
+        for forecast in forecasts['envelopes']:
+            envelope = envelopes.get(forecast['id'])
+            if not envelope or envelope['budget_limit'] <= 0 or envelope['current_amount'] >= envelope['budget_limit']:
+                continue
+            # Поточна сума конверта + очікувані поповнення до кінця місяця
+            projected = envelope['current_amount'] + forecast['forecast'] - forecast['spent']
+            if projected > envelope['budget_limit']:
+                insights.append(f" За прогнозом конверт '{envelope['name']}' перевищить ліміт до кінця місяця: ${projected:.2f} з ${envelope['budget_limit']:.2f}")
         
         savings_rate = (current_data['total_income'] - current_data['total_expenses']) / current_data['total_income'] * 100 if current_data['total_income'] > 0 else 0
 
@@ -1167,40 +2158,142 @@ def get_insights_and_forecasts(cursor, user_id):
         print(f"Error getting insights: {e}")
         return [" Аналіз даних тимчасово недоступний"]
 
+def _shift_month(year, month, delta):
+    """Зсуває календарний місяць на delta місяців. Повертає (year, month)."""
+    index = year * 12 + (month - 1) + delta
+    return index // 12, index % 12 + 1
+
+@cached_analytics
 def get_monthly_comparison(cursor, user_id, months=6):
+    """Доходи/витрати за останні months календарних місяців (включно з поточним).
+
+    Межі локальних місяців групують журнал одним bincount; місяці без транзакцій — нулі.
+    """
     try:
-        monthly_data = []
+        months = max(1, int(months))
+        now = datetime.now()
         
-        for i in range(months):
-            month_date = datetime.now() - timedelta(days=30*i)
-            month_str = month_date.strftime('%Y-%m')
-            
-            cursor.execute('''
-                SELECT 
-                    SUM(CASE WHEN type IN ('deposit', 'transfer_in', 'income') THEN amount ELSE 0 END) as income,
-                    SUM(CASE WHEN type IN ('withdrawal', 'transfer_out', 'expense') THEN amount ELSE 0 END) as expenses
-                FROM transactions 
-                WHERE user_id=? AND strftime('%Y-%m', created_at) = ?
-            ''', (user_id, month_str))
-            
-            result = cursor.fetchone()
-            income = result[0] or 0
-            expenses = result[1] or 0
-            
+        first_year, first_month = _shift_month(now.year, now.month, -(months - 1))
+        starts = [datetime(*_shift_month(first_year, first_month, i), 1) for i in range(months + 1)]
+        edges = [int(start.timestamp()) for start in starts]
+
+        ledger = _ledger(cursor, user_id, edges[0])
+        income = ledger.bucket_totals(edges, INCOME_TYPES)
+        expenses = ledger.bucket_totals(edges, EXPENSE_TYPES)
+        
+        monthly_data = []
+        for i, start in enumerate(starts[:-1]):
             monthly_data.append({
-                'month': month_date.strftime('%b %Y'),
-                'income': round(income, 2),
-                'expenses': round(expenses, 2),
-                'savings': round(income - expenses, 2)
+                'month': start.strftime('%b %Y'),
+                'month_key': start.strftime('%Y-%m'),
+                'income': from_cents(int(income[i])),
+                'expenses': from_cents(int(expenses[i])),
+                'savings': from_cents(int(income[i] - expenses[i]))
             })
         
-        monthly_data.reverse()
         return monthly_data
         
     except Exception as e:
         print(f"Error getting monthly comparison: {e}")
         return []
 
+# --- БАЛАНС КАРТОК У ЧАСІ ---
+
+def get_card_balance_at(cursor, card_id, ts):
+    """Баланс картки на момент ts (epoch) або None, якщо картка невідома."""
+    try:
+        cursor.execute("SELECT user_id FROM user_cards WHERE id=?", (card_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        balance = _card_balance_at(cursor, card_id, row[0], ts)
+        return from_cents(balance) if balance is not None else None
+    except Exception as e:
+        print(f"Error getting card balance at {ts}: {e}")
+        return None
+
+@cached_analytics
+def get_card_balance_series(cursor, user_id, card_id, period='month'):
+    """Баланс картки на кінець кожного локального дня періоду — для графіка.
+
+    Баланс на початок періоду береться з контрольних точок, далі — cumsum денних
+    змін з журналу analytics_engine. Повертає [{'date': 'YYYY-MM-DD', 'balance': ...}].
+    """
+    try:
+        start_ts, end_ts = period_range(period)
+        start = datetime.fromtimestamp(start_ts).replace(hour=0, minute=0, second=0, microsecond=0)
+        days = (datetime.fromtimestamp(end_ts - 1).date() - start.date()).days + 1
+        dates, edges = day_edges(start, days)
+
+        opening = _card_balance_at(cursor, card_id, user_id, edges[0])
+        if opening is None:
+            return []
+
+        ledger = _ledger(cursor, user_id, edges[0])
+        card_ids, income = ledger.card_buckets(edges, INCOME_TYPES)
+        _, expenses = ledger.card_buckets(edges, EXPENSE_TYPES)
+        if card_id in card_ids:
+            row = card_ids.index(card_id)
+            balances = opening + np.cumsum(income[row] - expenses[row])
+        else:
+            balances = np.full(days, opening)
+
+        return [{'date': day.isoformat(), 'balance': from_cents(int(balance))} for day, balance in zip(dates, balances)]
+    except Exception as e:
+        print(f"Error getting card balance series: {e}")
+        return []
+
+def reconcile_card_balances(cursor, user_id=None):
+    """Звіряє user_cards.balance з балансом, відтвореним з журналу, одним запитом.
+
+    Для кожної картки: остання контрольна точка плюс сума транзакцій після неї
+    (без точок — повне відтворення журналу від нуля). Повертає розбіжності:
+    [{'card_id', 'user_id', 'name', 'balance', 'ledger_balance', 'difference'}].
+    """
+    try:
+        cursor.execute(f'''
+            WITH latest AS (
+                SELECT card_id, MAX(ts) AS ts FROM {CHECKPOINTS_TABLE} GROUP BY card_id
+            )
+            SELECT c.id, c.user_id, c.name, c.balance,
+                   COALESCE(cp.balance, 0) + COALESCE((
+                       SELECT SUM({_balance_effect_sql('t')}) FROM transactions t
+                       WHERE t.user_id = c.user_id AND t.card_id = c.id AND t.created_ts >= COALESCE(cp.ts, 0)
+                   ), 0)
+            FROM user_cards c
+            LEFT JOIN latest ON latest.card_id = c.id
+            LEFT JOIN {CHECKPOINTS_TABLE} cp ON cp.card_id = latest.card_id AND cp.ts = latest.ts
+            WHERE ? IS NULL OR c.user_id = ?
+            ORDER BY c.id
+        ''', (user_id, user_id))
+
+        return [{
+            'card_id': card_id,
+            'user_id': card_user_id,
+            'name': name,
+            'balance': from_cents(balance),
+            'ledger_balance': from_cents(ledger_balance),
+            'difference': from_cents(balance - ledger_balance)
+        } for card_id, card_user_id, name, balance, ledger_balance in cursor.fetchall() if balance != ledger_balance]
+    except Exception as e:
+        print(f"Error reconciling card balances: {e}")
+        return []
+
+def accept_card_balances(cursor, conn, card_ids):
+    """Приймає поточні user_cards.balance як істину: опорна точка 'adjustment' для карток."""
+    try:
+        with transaction():
+            for card_id in card_ids:
+                cursor.execute("SELECT balance FROM user_cards WHERE id=?", (card_id,))
+                row = cursor.fetchone()
+                if row:
+                    record_balance_checkpoint(cursor, card_id, row[0], CHECKPOINT_ADJUSTMENT)
+        return True
+    except Exception as e:
+        print(f"Error accepting card balances: {e}")
+        conn.rollback()
+        return False
+
 def create_user_card(cursor, conn, user_id, name, number, bank, balance=0.0, color=None):
     try:
         if color is None:
@@ -1208,19 +2301,21 @@ def create_user_card(cursor, conn, user_id, name, number, bank, balance=0.0, col
         elif isinstance(color, list):
             color = json.dumps(color)
             
-        cursor.execute(
-            "INSERT INTO user_cards (user_id, name, number, bank, balance, color) VALUES (?, ?, ?, ?, ?, ?)",
-            (user_id, name, number, bank, balance, color)
-        )
-        conn.commit()
-        
-        card_id = cursor.lastrowid
-        
-        log_transaction(cursor, conn, user_id, 'card_creation', 0, f"Створено картку {name}", card_id)
+        with transaction():
+            cursor.execute(
+                "INSERT INTO user_cards (user_id, name, number, bank, balance, color) VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, name, number, bank, to_cents(balance), color)
+            )
+            card_id = cursor.lastrowid
+            record_balance_checkpoint(cursor, card_id, to_cents(balance))
+            
+            log_transaction(cursor, conn, user_id, 'card_creation', 0, f"Створено картку {name}", card_id)
+            bump_data_version(user_id)
         
         return card_id
     except Exception as e:
         print(f"Error creating user card: {e}")
+        conn.rollback()
         return None
 
 def get_user_cards(cursor, user_id):
@@ -1240,7 +2335,7 @@ def get_user_cards(cursor, user_id):
                 'name': name,
                 'number': number,
                 'bank': bank,
-                'balance': balance,
+                'balance': from_cents(balance),
                 'color': safe_color_conversion(color)
             })
         
@@ -1268,7 +2363,7 @@ def get_user_card_by_id(cursor, card_id):
                 'number': masked_number,
                 'full_number': number,
                 'bank': bank,
-                'balance': balance,
+                'balance': from_cents(balance),
                 'color': safe_color_conversion(color)
             }
         return None
@@ -1283,57 +2378,61 @@ def get_total_balance(cursor, user_id):
             (user_id,)
         )
         result = cursor.fetchone()
-        total = result[0] if result and result[0] is not None else 0.0
-        return total
+        return from_cents(result[0] if result else 0)
     except Exception as e:
         print(f"Error getting total balance: {e}")
         return 0.0
 
-def update_card_balance(cursor, conn, card_id, amount, description=""):
+def update_card_balance(cursor, conn, card_id, amount, description="", idempotency_key=None):
     try:
-        cursor.execute("SELECT user_id, name, balance FROM user_cards WHERE id=?", (card_id,))
-        card_info = cursor.fetchone()
-        
-        if not card_info:
-            return False
+        with transaction():
+            cursor.execute("SELECT user_id, name, balance FROM user_cards WHERE id=?", (card_id,))
+            card_info = cursor.fetchone()
             
-        user_id, card_name, current_balance = card_info
-        new_balance = current_balance + amount
-        
-        cursor.execute(
-            "UPDATE user_cards SET balance=? WHERE id=?",
-            (new_balance, card_id)
-        )
-        conn.commit()
-        
-        if not description.startswith("(") or "конверт" not in description.lower():
-            trans_type = 'deposit' if amount > 0 else 'withdrawal'
-            trans_description = f"Поповнення картки {card_name}" if amount > 0 else f"Зняття з картки {card_name}"
-            if description:
-                trans_description = description
+            if not card_info:
+                return False
                 
-            log_transaction(cursor, conn, user_id, trans_type, amount, trans_description, card_id)
+            user_id, card_name, current_balance = card_info
+            new_balance = current_balance + to_cents(amount)
+            
+            if not description.startswith("(") or "конверт" not in description.lower():
+                trans_type = 'deposit' if amount > 0 else 'withdrawal'
+                trans_description = f"Поповнення картки {card_name}" if amount > 0 else f"Зняття з картки {card_name}"
+                if description:
+                    trans_description = description
+                
+                # Повторна дія з тим самим ключем вже врахована — баланс не змінюємо
+                if not record_transaction(cursor, user_id, trans_type, amount, trans_description, card_id, idempotency_key):
+                    return True
+            
+            cursor.execute(
+                "UPDATE user_cards SET balance=? WHERE id=?",
+                (new_balance, card_id)
+            )
         
         return True
     except Exception as e:
         print(f"Error updating card balance: {e}")
+        conn.rollback()
         return False
 
 def delete_user_card(cursor, conn, card_id):
     try:
-        cursor.execute("SELECT user_id, name FROM user_cards WHERE id=?", (card_id,))
-        card_info = cursor.fetchone()
-        
-        cursor.execute("DELETE FROM user_cards WHERE id=?", (card_id,))
-        conn.commit()
-        
-        if card_info:
-            user_id, card_name = card_info
-            log_transaction(cursor, conn, user_id, 'card_deletion', 0, f"Видалено картку {card_name}", card_id)
+        with transaction():
+            cursor.execute("SELECT user_id, name FROM user_cards WHERE id=?", (card_id,))
+            card_info = cursor.fetchone()
+            
+            cursor.execute("DELETE FROM user_cards WHERE id=?", (card_id,))
+            cursor.execute(f"DELETE FROM {CHECKPOINTS_TABLE} WHERE card_id=?", (card_id,))
+            
+            if card_info:
+                user_id, card_name = card_info
+                log_transaction(cursor, conn, user_id, 'card_deletion', 0, f"Видалено картку {card_name}", card_id)
         
         return True
     except Exception as e:
         print(f"Error deleting user card: {e}")
+        conn.rollback()
         return False
 
 def update_user_card(cursor, conn, card_id, name=None, number=None, bank=None, balance=None, color=None):
@@ -1352,7 +2451,7 @@ def update_user_card(cursor, conn, card_id, name=None, number=None, bank=None, b
             params.append(bank)
         if balance is not None:
             update_fields.append("balance=?")
-            params.append(balance)
+            params.append(to_cents(balance))
         if color is not None:
             update_fields.append("color=?")
             if isinstance(color, list):
@@ -1365,77 +2464,101 @@ def update_user_card(cursor, conn, card_id, name=None, number=None, bank=None, b
         update_query = f"UPDATE user_cards SET {', '.join(update_fields)} WHERE id=?"
         params.append(card_id)
         
-        cursor.execute(update_query, params)
-        conn.commit()
+        with transaction():
+            cursor.execute(update_query, params)
+            if balance is not None:
+                # Ручна зміна балансу не проходить через журнал — нова опорна точка
+                record_balance_checkpoint(cursor, card_id, to_cents(balance), CHECKPOINT_ADJUSTMENT)
+        _bump_card_owner(cursor, card_id)
         return True
     except Exception as e:
         print(f"Error updating user card: {e}")
+        conn.rollback()
         return False
 
-def transfer_money_between_cards(cursor, conn, from_card_id, to_card_id, amount):
+def transfer_money_between_cards(cursor, conn, from_card_id, to_card_id, amount, idempotency_key=None):
     try:
-        cursor.execute("SELECT balance, user_id, name FROM user_cards WHERE id=?", (from_card_id,))
-        from_result = cursor.fetchone()
-        if not from_result:
-            return False, "Картку відправника не знайдено"
-        
-        from_balance, from_user_id, from_card_name = from_result
-        
-        cursor.execute("SELECT user_id, name FROM user_cards WHERE id=?", (to_card_id,))
-        to_result = cursor.fetchone()
-        if not to_result:
-            return False, "Картку отримувача не знайдено"
-        
-        to_user_id, to_card_name = to_result
-        
-        if from_balance < amount:
-            return False, "Недостатньо коштів на картці"
-        
-        new_from_balance = from_balance - amount
-        cursor.execute("UPDATE user_cards SET balance=? WHERE id=?", (new_from_balance, from_card_id))
-        
-        new_to_balance_result = cursor.execute("SELECT balance FROM user_cards WHERE id=?", (to_card_id,)).fetchone()
-        new_to_balance = (new_to_balance_result[0] if new_to_balance_result else 0) + amount
-        cursor.execute("UPDATE user_cards SET balance=? WHERE id=?", (new_to_balance, to_card_id))
-        
-        conn.commit()
-        
-        # Логуємо транзакції для обох карток
-        log_transaction(cursor, conn, from_user_id, 'transfer_out', -amount, f"Переказ на картку {to_card_name}", from_card_id)
-        log_transaction(cursor, conn, to_user_id, 'transfer_in', amount, f"Переказ з картки {from_card_name}", to_card_id)
+        with transaction():
+            cursor.execute("SELECT balance, user_id, name FROM user_cards WHERE id=?", (from_card_id,))
+            from_result = cursor.fetchone()
+            if not from_result:
+                return False, "Картку відправника не знайдено"
+            
+            from_balance, from_user_id, from_card_name = from_result
+            
+            cursor.execute("SELECT user_id, name FROM user_cards WHERE id=?", (to_card_id,))
+            to_result = cursor.fetchone()
+            if not to_result:
+                return False, "Картку отримувача не знайдено"
+            
+            to_user_id, to_card_name = to_result
+            
+            amount_cents = to_cents(amount)
+            if from_balance < amount_cents:
+                return False, "Недостатньо коштів на картці"
+            
+            # Обидва записи журналу спираються на один ключ дії
+            action_key = idempotency_key or new_idempotency_key()
+            if not record_transaction(cursor, from_user_id, 'transfer_out', -amount, f"Переказ на картку {to_card_name}", from_card_id, f"{action_key}:out"):
+                return True, "Переказ уже виконано"
+            record_transaction(cursor, to_user_id, 'transfer_in', amount, f"Переказ з картки {from_card_name}", to_card_id, f"{action_key}:in")
+            
+            new_from_balance = from_balance - amount_cents
+            cursor.execute("UPDATE user_cards SET balance=? WHERE id=?", (new_from_balance, from_card_id))
+            
+            new_to_balance_result = cursor.execute("SELECT balance FROM user_cards WHERE id=?", (to_card_id,)).fetchone()
+            new_to_balance = (new_to_balance_result[0] if new_to_balance_result else 0) + amount_cents
+            cursor.execute("UPDATE user_cards SET balance=? WHERE id=?", (new_to_balance, to_card_id))
         
         return True, "Переказ успішний"
     except Exception as e:
         print(f"Error transferring money: {e}")
+        conn.rollback()
         return False, "Помилка переказу"
 
-def log_transaction(cursor, conn, user_id, transaction_type, amount, description="", card_id=None):
+def new_idempotency_key():
+    """Новий ключ ідемпотентності для однієї дії користувача."""
+    return uuid.uuid4().hex
+
+def record_transaction(cursor, user_id, transaction_type, amount, description="", card_id=None, idempotency_key=None):
+    """Вставляє запис у журнал. Повертає False, якщо запис з таким ключем уже існує.
+
+    Повторна дія з тим самим idempotency_key відкидається унікальним індексом
+    (ON CONFLICT DO NOTHING). Без ключа кожен виклик — окремий запис.
+    """
+    if idempotency_key is None:
+        idempotency_key = new_idempotency_key()
+
+    category = get_categorizer(cursor, user_id).categorize(description)
+    amount_cents = to_cents(amount)
+
+    cursor.execute('''
+        INSERT INTO transactions (user_id, type, amount, description, card_id, created_at, idempotency_key, category)
+        VALUES (?, ?, ?, ?, ?, datetime('now'), ?, ?)
+        ON CONFLICT(idempotency_key) DO NOTHING
+    ''', (user_id, transaction_type, amount_cents, description, card_id, idempotency_key, category))
+
+    if cursor.rowcount != 1:
+        return False
+    if transaction_type in ANOMALY_TYPES:
+        observe_transaction(cursor, user_id, cursor.lastrowid, category, amount_cents)
+    bump_data_version(user_id)
+    return True
+
+def log_transaction(cursor, conn, user_id, transaction_type, amount, description="", card_id=None, idempotency_key=None):
     try:
         if transaction_type == 'card_creation':
             return True
-            
-        # Запобігання дублюванню транзакцій протягом 1 хвилини
-        cursor.execute('''
-            SELECT COUNT(*) FROM transactions 
-            WHERE user_id=? AND type=? AND amount=? AND description=? 
-            AND created_at > datetime('now', '-1 minute')
-        ''', (user_id, transaction_type, amount, description))
         
-        recent_count = cursor.fetchone()[0]
-        
-        if recent_count > 0:
-            return True
-            
-        cursor.execute('''
-            INSERT INTO transactions (user_id, type, amount, description, card_id, created_at)
-            VALUES (?, ?, ?, ?, ?, datetime('now'))
-        ''', (user_id, transaction_type, amount, description, card_id))
+        with transaction():
+            record_transaction(cursor, user_id, transaction_type, amount, description, card_id, idempotency_key)
         
-        conn.commit()
         return True
         
     except Exception as e:
         print(f"Error logging transaction: {e}")
+        # Усередині зовнішньої одиниці роботи — відкат усієї операції
+        conn.rollback()
         return False
 
 def update_envelope(cursor, conn, envelope_id, name=None, budget_limit=None):
@@ -1448,7 +2571,7 @@ def update_envelope(cursor, conn, envelope_id, name=None, budget_limit=None):
             params.append(name)
         if budget_limit is not None:
             update_fields.append("budget_limit=?")
-            params.append(budget_limit)
+            params.append(to_cents(budget_limit))
             
         if not update_fields:
             return False
@@ -1458,6 +2581,11 @@ def update_envelope(cursor, conn, envelope_id, name=None, budget_limit=None):
         
         cursor.execute(update_query, params)
         conn.commit()
+        
+        cursor.execute("SELECT user_id FROM envelopes WHERE id=?", (envelope_id,))
+        row = cursor.fetchone()
+        if row:
+            bump_data_version(row[0])
         return True
     except Exception as e:
         print(f"Error updating envelope: {e}")
@@ -1470,7 +2598,7 @@ def get_user_transactions(cursor, user_id, limit=50):
             FROM transactions t
             LEFT JOIN user_cards c ON t.card_id = c.id
             WHERE t.user_id=?
-            ORDER BY t.created_at DESC
+            ORDER BY t.created_ts DESC
             LIMIT ?
         ''', (user_id, limit))
         
@@ -1481,7 +2609,7 @@ def get_user_transactions(cursor, user_id, limit=50):
             trans_type, amount, description, created_at, card_name = trans
             result.append({
                 'type': trans_type,
-                'amount': amount,
+                'amount': from_cents(amount),
                 'description': description,
                 'date': created_at,
                 'card_name': card_name
@@ -1492,15 +2620,213 @@ def get_user_transactions(cursor, user_id, limit=50):
         print(f"Error getting user transactions: {e}")
         return []
 
-def log_savings_transaction(cursor, conn, user_id, plan_id, amount, trans_type, description=""):
+# Розмір сторінки історії транзакцій
+HISTORY_PAGE_SIZE = 20
+
+def get_transactions_page(cursor, user_id, limit=HISTORY_PAGE_SIZE, after=None, card_id=None, types=None, envelope_id=None):
+    """Сторінка історії від найновіших до старіших за курсором (created_ts, id).
+
+    after — next_cursor попередньої сторінки (None для першої). На відміну від
+    OFFSET, кожна сторінка читає лише свої рядки з індексу, незалежно від глибини.
+    З envelope_id повертаються операції конверта (envelope_transactions).
+    Повертає {'transactions': [...], 'next_cursor': (created_ts, id) або None}.
+    """
     try:
-        cursor.execute(
-            "INSERT INTO savings_transactions(user_id, plan_id, amount, type, description) VALUES(?, ?, ?, ?, ?)",
-            (user_id, plan_id, amount, trans_type, description)
+        if envelope_id is not None:
+            query = '''
+                SELECT t.id, 'envelope_deposit', t.amount, t.description, t.created_at, t.created_ts, c.name
+                FROM envelope_transactions t
+                LEFT JOIN user_cards c ON t.card_id = c.id
+                WHERE t.user_id=? AND t.envelope_id=?
+            '''
+            params = [user_id, envelope_id]
+        else:
+            query = '''
+                SELECT t.id, t.type, t.amount, t.description, t.created_at, t.created_ts, c.name
+                FROM transactions t
+                LEFT JOIN user_cards c ON t.card_id = c.id
+                WHERE t.user_id=?
+            '''
+            params = [user_id]
+            if types:
+                query += f" AND t.type IN ({', '.join('?' for _ in types)})"
+                params.extend(types)
+
+        if card_id is not None:
+            query += " AND t.card_id=?"
+            params.append(card_id)
+        if after is not None:
+            query += " AND (t.created_ts, t.id) < (?, ?)"
+            params.extend(after)
+
+        # Зайвий рядок показує, чи є наступна сторінка
+        query += " ORDER BY t.created_ts DESC, t.id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+
+        result = []
+        for trans_id, trans_type, amount, description, created_at, created_ts, card_name in rows[:limit]:
+            result.append({
+                'id': trans_id,
+                'type': trans_type,
+                'amount': from_cents(amount),
+                'description': description or "",
+                'date': created_at,
+                'timestamp': created_ts,
+                'card_name': card_name
+            })
+
+        next_cursor = None
+        if len(rows) > limit and result:
+            next_cursor = (result[-1]['timestamp'], result[-1]['id'])
+
+        return {'transactions': result, 'next_cursor': next_cursor}
+    except Exception as e:
+        print(f"Error getting transactions page: {e}")
+        return {'transactions': [], 'next_cursor': None}
+
+def _search_match_expression(query):
+    """Текст користувача -> вираз FTS5: кожне слово як префікс, усі слова обов'язкові."""
+    terms = re.findall(r"\w+", query.lower())
+    return " AND ".join(f'"{term}"*' for term in terms)
+
+def search_transactions(cursor, user_id, query, filters=None, after=None, limit=HISTORY_PAGE_SIZE):
+    """Пошук в описах транзакцій (зокрема поповнень конвертів) з префіксним збігом.
+
+    Збіги ранжуються за bm25 один раз — для першої сторінки; next_cursor містить
+    упорядковані id решти збігів, тож наступні сторінки не перераховують релевантність
+    і не зсуваються, коли з'являються нові транзакції. Ранжуються лише SEARCH_RANK_WINDOW
+    найновіших збігів: bm25 для всіх збігів частого слова не вкладається в кадр.
+    filters: {'card_id': ..., 'types': [...], 'source': 'transactions' | 'envelopes'}.
+    after — next_cursor попередньої сторінки. Формат результату як у get_transactions_page.
+    """
+    filters = filters or {}
+    try:
+        match = _search_match_expression(query or "")
+        if not match:
+            return {'transactions': [], 'next_cursor': None}
+
+        if not _search_table_exists(cursor):
+            return _search_transactions_like(cursor, user_id, query, filters, after, limit)
+
+        ranked_ids = list(after) if after is not None else _rank_search_matches(cursor, user_id, match, filters)
+        page_ids = ranked_ids[:limit]
+
+        rows = {}
+        if page_ids:
+            # "+t.user_id": вибірка за первинним ключем, а не переглядом індексу користувача
+            cursor.execute(f'''
+                SELECT t.id, t.type, t.amount, t.description, t.created_at, t.created_ts, c.name
+                FROM transactions t
+                LEFT JOIN user_cards c ON t.card_id = c.id
+                WHERE t.id IN ({', '.join('?' for _ in page_ids)}) AND +t.user_id = ?
+            ''', page_ids + [user_id])
+            rows = {row[0]: row for row in cursor.fetchall()}
+
+        # Порядок знімка; рядки, видалені після першої сторінки, пропускаються
+        result = [{
+            'id': trans_id, 'type': trans_type, 'amount': from_cents(amount),
+            'description': description or "", 'date': created_at, 'timestamp': created_ts, 'card_name': card_name
+        } for trans_id, trans_type, amount, description, created_at, created_ts, card_name
+            in (rows[trans_id] for trans_id in page_ids if trans_id in rows)]
+
+        next_cursor = tuple(ranked_ids[limit:]) or None
+        return {'transactions': result, 'next_cursor': next_cursor}
+    except Exception as e:
+        print(f"Error searching transactions: {e}")
+        return {'transactions': [], 'next_cursor': None}
+
+def _rank_search_matches(cursor, user_id, match, filters):
+    """id збігів (з урахуванням фільтрів) у порядку релевантності, найрелевантніші першими."""
+    low, high = _search_user_range(user_id)
+    # Найстаріший rowid серед вікна найновіших збігів; None — збігів менше за вікно
+    cursor.execute(f'''
+        SELECT rowid FROM {SEARCH_TABLE}
+        WHERE {SEARCH_TABLE} MATCH ? AND rowid BETWEEN ? AND ?
+        ORDER BY rowid DESC LIMIT 1 OFFSET ?
+    ''', (match, low, high, SEARCH_RANK_WINDOW - 1))
+    row = cursor.fetchone()
+    if row:
+        low = row[0]
+
+    where = []
+    params = [match, low, high]
+    source = filters.get('source')
+    if source == 'transactions':
+        where.append("t.type != 'envelope_deposit'")
+    elif source == 'envelopes':
+        where.append("t.type = 'envelope_deposit'")
+    if filters.get('card_id') is not None:
+        where.append("t.card_id = ?")
+        params.append(filters['card_id'])
+    if filters.get('types'):
+        where.append(f"t.type IN ({', '.join('?' for _ in filters['types'])})")
+        params.extend(filters['types'])
+
+    cursor.execute(f'''
+        WITH m AS (
+            SELECT rowid, rank FROM {SEARCH_TABLE}
+            WHERE {SEARCH_TABLE} MATCH ? AND rowid BETWEEN ? AND ?
         )
-        conn.commit()
+        SELECT t.id FROM m
+        CROSS JOIN transactions t ON t.id = (m.rowid & {SEARCH_ID_MASK})
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY m.rank, m.rowid DESC
+    ''', params)
+    return [row[0] for row in cursor.fetchall()]
+
+def _search_transactions_like(cursor, user_id, query, filters, after, limit):
+    """Запасний пошук без FTS5: LIKE по кожному слову, від новіших до старіших."""
+    page_filters = {'card_id': filters.get('card_id'), 'types': filters.get('types')}
+
+    terms = re.findall(r"\w+", query.lower())
+    query_sql = '''
+        SELECT t.id, t.type, t.amount, t.description, t.created_at, t.created_ts, c.name
+        FROM transactions t
+        LEFT JOIN user_cards c ON t.card_id = c.id
+        WHERE t.user_id=?
+    '''
+    params = [user_id]
+    for term in terms:
+        query_sql += " AND lower(t.description) LIKE ?"
+        params.append(f"%{term}%")
+    if page_filters['card_id'] is not None:
+        query_sql += " AND t.card_id=?"
+        params.append(page_filters['card_id'])
+    if page_filters['types']:
+        query_sql += f" AND t.type IN ({', '.join('?' for _ in page_filters['types'])})"
+        params.extend(page_filters['types'])
+    if filters.get('source') == 'transactions':
+        query_sql += " AND t.type != 'envelope_deposit'"
+    elif filters.get('source') == 'envelopes':
+        query_sql += " AND t.type = 'envelope_deposit'"
+    if after is not None:
+        query_sql += " AND (t.created_ts, t.id) < (?, ?)"
+        params.extend(after)
+    query_sql += " ORDER BY t.created_ts DESC, t.id DESC LIMIT ?"
+    params.append(limit + 1)
+
+    cursor.execute(query_sql, params)
+    rows = cursor.fetchall()
+    result = [{
+        'id': trans_id, 'type': trans_type, 'amount': from_cents(amount),
+        'description': description or "", 'date': created_at, 'timestamp': created_ts, 'card_name': card_name
+    } for trans_id, trans_type, amount, description, created_at, created_ts, card_name in rows[:limit]]
+    next_cursor = (result[-1]['timestamp'], result[-1]['id']) if len(rows) > limit and result else None
+    return {'transactions': result, 'next_cursor': next_cursor}
+
+def log_savings_transaction(cursor, conn, user_id, plan_id, amount, trans_type, description=""):
+    try:
+        with transaction():
+            cursor.execute(
+                "INSERT INTO savings_transactions(user_id, plan_id, amount, type, description) VALUES(?, ?, ?, ?, ?)",
+                (user_id, plan_id, to_cents(amount), trans_type, description)
+            )
     except Exception as e:
         print(f"Error logging savings transaction: {e}")
+        conn.rollback()
 
 def create_envelope(cursor, conn, user_id, name, color=None, budget_limit=0.0):
     try:
@@ -1511,10 +2837,12 @@ def create_envelope(cursor, conn, user_id, name, color=None, budget_limit=0.0):
             
         cursor.execute(
             "INSERT INTO envelopes (user_id, name, color, budget_limit) VALUES (?, ?, ?, ?)",
-            (user_id, name, color, budget_limit)
+            (user_id, name, color, to_cents(budget_limit))
         )
+        envelope_id = cursor.lastrowid
         conn.commit()
-        return cursor.lastrowid
+        bump_data_version(user_id)
+        return envelope_id
     except Exception as e:
         print(f"Error creating envelope: {e}")
         return None
@@ -1534,8 +2862,8 @@ def get_user_envelopes(cursor, user_id):
                 'id': env_id,
                 'name': name,
                 'color': safe_color_conversion(color),
-                'budget_limit': budget_limit,
-                'current_amount': current_amount,
+                'budget_limit': from_cents(budget_limit),
+                'current_amount': from_cents(current_amount),
                 'usage_percentage': (current_amount / budget_limit * 100) if budget_limit > 0 else 0
             })
         
@@ -1544,26 +2872,40 @@ def get_user_envelopes(cursor, user_id):
         print(f"Error getting user envelopes: {e}")
         return []
 
-def add_to_envelope(cursor, conn, user_id, envelope_id, amount, description="", card_id=None):
+def add_to_envelope(cursor, conn, user_id, envelope_id, amount, description="", card_id=None, idempotency_key=None, debit_card=True):
+    """Поповнює конверт, списуючи суму з картки card_id.
+
+    З debit_card=False баланс картки не змінюється, тож і запис у журналі
+    не прив'язується до неї — інакше журнал картки розійдеться з її балансом.
+    """
     try:
-        cursor.execute(
-            "UPDATE envelopes SET current_amount = current_amount + ? WHERE id=?",
-            (amount, envelope_id)
-        )
-        
-        cursor.execute(
-            "INSERT INTO envelope_transactions (user_id, envelope_id, amount, description, card_id) VALUES (?, ?, ?, ?, ?)",
-            (user_id, envelope_id, amount, description, card_id)
-        )
-        
-        envelope_name = get_envelope_name(cursor, envelope_id)
-        log_transaction(cursor, conn, user_id, 'envelope_deposit', amount, 
-                       f"{description} ({envelope_name})", card_id)
+        with transaction():
+            envelope_name = get_envelope_name(cursor, envelope_id)
+            ledger_card_id = card_id if debit_card else None
+            
+            # Повторна дія з тим самим ключем вже врахована
+            if not record_transaction(cursor, user_id, 'envelope_deposit', amount,
+                                      f"{description} ({envelope_name})", ledger_card_id, idempotency_key):
+                return True
+            
+            amount_cents = to_cents(amount)
+            if ledger_card_id:
+                cursor.execute("UPDATE user_cards SET balance = balance - ? WHERE id = ?", (amount_cents, card_id))
+            
+            cursor.execute(
+                "UPDATE envelopes SET current_amount = current_amount + ? WHERE id=?",
+                (amount_cents, envelope_id)
+            )
+            
+            cursor.execute(
+                "INSERT INTO envelope_transactions (user_id, envelope_id, amount, description, card_id) VALUES (?, ?, ?, ?, ?)",
+                (user_id, envelope_id, amount_cents, description, card_id)
+            )
         
-        conn.commit()
         return True
     except Exception as e:
         print(f"Error adding to envelope: {e}")
+        conn.rollback()
         return False
 
 def get_envelope_name(cursor, envelope_id):
@@ -1590,7 +2932,7 @@ def get_envelope_transactions(cursor, user_id, envelope_id=None, limit=50):
             query += " AND et.envelope_id=?"
             params.append(envelope_id)
             
-        query += " ORDER BY et.created_at DESC LIMIT ?"
+        query += " ORDER BY et.created_ts DESC LIMIT ?"
         params.append(limit)
         
         cursor.execute(query, params)
@@ -1600,7 +2942,7 @@ def get_envelope_transactions(cursor, user_id, envelope_id=None, limit=50):
         for trans in transactions:
             amount, description, created_at, envelope_name, card_name = trans
             result.append({
-                'amount': amount,
+                'amount': from_cents(amount),
                 'description': description,
                 'date': created_at,
                 'envelope_name': envelope_name,
@@ -1634,10 +2976,10 @@ def get_envelope_stats(cursor, user_id):
             name, budget_limit, current_amount, transaction_count, total_deposits = stat
             result.append({
                 'name': name,
-                'budget_limit': budget_limit,
-                'current_amount': current_amount,
+                'budget_limit': from_cents(budget_limit),
+                'current_amount': from_cents(current_amount),
                 'transaction_count': transaction_count,
-                'total_deposits': total_deposits or 0,
+                'total_deposits': from_cents(total_deposits),
                 'usage_percentage': (current_amount / budget_limit * 100) if budget_limit > 0 else 0
             })
         
@@ -1649,28 +2991,38 @@ def get_envelope_stats(cursor, user_id):
 def debug_transactions(cursor, user_id):
     try:
         cursor.execute(
-            "SELECT type, amount, description, created_at FROM transactions WHERE user_id=? ORDER BY created_at DESC LIMIT 10",
+            "SELECT type, amount, description, created_at FROM transactions WHERE user_id=? ORDER BY created_ts DESC LIMIT 10",
             (user_id,)
         )
-        transactions = cursor.fetchall()
-        return transactions
+        return [
+            (trans_type, from_cents(amount), description, created_at)
+            for trans_type, amount, description, created_at in cursor.fetchall()
+        ]
     except Exception as e:
         print(f"Error debugging transactions: {e}")
         return []
 
 
 __all__ = [
-    'conn', 'cursor', 
-    'is_valid_email', 'is_valid_password', 'hash_password', 'check_password',
-    'log_transaction', 'log_savings_transaction', 'get_user_transactions',
+    'db', 'conn', 'cursor', 'DB_PROFILE', 'checkpoint_database', 'transaction', 'bulk_insert_transactions',
+    'MONEY_SCALE', 'to_cents', 'from_cents', 'period_range',
+    'is_valid_email', 'is_valid_password', 'hash_password', 'check_password', 'update_password_hash',
+    'log_transaction', 'record_transaction', 'new_idempotency_key', 'log_savings_transaction', 'get_user_transactions',
+    'get_transactions_page', 'HISTORY_PAGE_SIZE', 'search_transactions',
     'create_user_card', 'get_user_cards', 'get_user_card_by_id', 'get_total_balance', 
     'update_card_balance', 'delete_user_card', 'update_user_card', 'transfer_money_between_cards',
+    'CHECKPOINTS_TABLE', 'record_balance_checkpoint', 'refresh_balance_checkpoints', 'get_card_balance_at',
+    'get_card_balance_series', 'reconcile_card_balances', 'accept_card_balances',
     'safe_color_conversion',
     'create_envelope', 'get_user_envelopes', 'add_to_envelope', 'get_envelope_transactions', 'get_envelope_stats',
     'update_envelope',
     'create_user', 'get_user_by_email',
-    'get_analytics_data', 'get_category_breakdown', 'get_top_categories', 
+    'get_analytics_data', 'get_daily_series', 'get_spending_forecasts', 'get_spending_anomalies', 'dismiss_spending_anomaly', 'get_category_breakdown', 'get_top_categories', 
+    'get_category_rules', 'add_category_rule', 'delete_category_rule',
+    'recategorize_transactions', 'backfill_categories',
+    'bump_data_version', 'analytics_snapshot', 'get_analytics_cache_stats', 'clear_analytics_cache',
     'get_cards_analytics', 'get_budget_progress', 'get_insights_and_forecasts', 'get_monthly_comparison',
+    'INCOME_TYPES', 'EXPENSE_TYPES',
     'debug_transactions',
     'save_profile_photo', 'get_profile_photo',
     'log_user_session', 'log_user_logout', 'get_login_history',
@@ -1678,5 +3030,30 @@ __all__ = [
     'get_user_level', 'update_user_experience',
     'log_security_action', 'export_user_data',
     'get_user_savings_plans',
-    'setup_db'
-]
\ No newline at end of file
+    'setup_db', 'wait_db_ready'
+]
+if __name__ == "__main__":
+    # Обслуговування БД: python -m utils.db_manager --checkpoints | --reconcile [--fix]
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Обслуговування бази даних finance_app_mobile")
+    parser.add_argument("--checkpoints", action="store_true", help="додати відсутні місячні контрольні точки балансу карток")
+    parser.add_argument("--reconcile", action="store_true", help="звірити баланси карток з журналом транзакцій")
+    parser.add_argument("--fix", action="store_true", help="з --reconcile: прийняти поточні баланси карток як опорні точки")
+    parser.add_argument("--user-id", type=int, default=None, help="обмежити дію одним користувачем")
+    args = parser.parse_args()
+
+    if args.checkpoints:
+        created = refresh_balance_checkpoints(cursor, conn, args.user_id)
+        print(f"Додано контрольних точок балансу: {created}")
+    elif args.reconcile:
+        mismatches = reconcile_card_balances(cursor, args.user_id)
+        for item in mismatches:
+            print(f"Картка {item['card_id']} ({item['name']}, користувач {item['user_id']}): "
+                  f"баланс {item['balance']:.2f}, за журналом {item['ledger_balance']:.2f}, різниця {item['difference']:+.2f}")
+        print(f"Розбіжностей: {len(mismatches)}" if mismatches else "Баланси всіх карток збігаються з журналом")
+        if mismatches and args.fix:
+            ok = accept_card_balances(cursor, conn, [item['card_id'] for item in mismatches])
+            print("Поточні баланси прийнято як опорні точки" if ok else "Не вдалося записати опорні точки")
+    else:
+        parser.print_help()
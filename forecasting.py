@@ -0,0 +1,178 @@
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+
+# --- ПРОГНОЗ ВИТРАТ (Holt-Winters) ---
+# Адитивне експоненційне згладжування з трендом і тижневою сезонністю для
+# денних рядів витрат. Усі ряди користувача (загальні витрати, кожна картка,
+# кожен конверт) — рядки однієї матриці, тож крок рекурсії за днем — кілька
+# векторних операцій для всіх рядів і всіх кандидатів параметрів одночасно.
+#
+# Модель зберігає стан (рівень, тренд, сезонність) після кожного дня. Коли
+# з'являються нові дні або змінюються дані за останні дні, рекурсія
+# продовжується з першого зміненого дня, а не з початку історії.
+
+SEASON_DAYS = 7
+# Історія для початкового навчання моделі
+FORECAST_HISTORY_DAYS = 12 * SEASON_DAYS
+# Коли історія моделі виростає до цієї довжини, модель навчається заново
+MAX_HISTORY_DAYS = 2 * FORECAST_HISTORY_DAYS
+# Сітка параметрів (alpha — рівень, beta — тренд, gamma — сезонність)
+ALPHAS = (0.05, 0.15, 0.3, 0.5)
+BETAS = (0.0, 0.02)
+GAMMAS = (0.05, 0.15, 0.3)
+MODEL_CACHE_SIZE = 4
+
+_models = OrderedDict()
+_models_lock = threading.Lock()
+
+def _smooth(y, alpha, beta, gamma, level, trend, season, first):
+    """Рекурсія Holt-Winters для днів first..len(y)-1 з заповненням історії стану.
+
+    y — (дні, ...ряди); level і trend — (дні + 1, ...), стан перед кожним днем;
+    season — (дні + SEASON_DAYS, ...), сезонна складова для кожного дня.
+    Повертає суму квадратів помилок прогнозу на день уперед (після першого тижня).
+    """
+    sse = np.zeros(np.broadcast(level[0], alpha).shape)
+    for t in range(first, len(y)):
+        expected = level[t] + trend[t]
+        error = y[t] - expected - season[t]
+        if t >= SEASON_DAYS:
+            sse += error ** 2
+        new_level = alpha * (y[t] - season[t]) + (1 - alpha) * expected
+        trend[t + 1] = beta * (new_level - level[t]) + (1 - beta) * trend[t]
+        level[t + 1] = new_level
+        season[t + SEASON_DAYS] = gamma * (y[t] - new_level) + (1 - gamma) * season[t]
+    return sse
+
+def _initial_state(y, shape):
+    """Порожні масиви стану з початковими значеннями за перші два тижні."""
+    days = len(y)
+    level = np.zeros((days + 1,) + shape)
+    trend = np.zeros((days + 1,) + shape)
+    season = np.zeros((days + SEASON_DAYS,) + shape)
+
+    first_week = y[:SEASON_DAYS].mean(axis=0)
+    level[0] = first_week
+    if days >= 2 * SEASON_DAYS:
+        trend[0] = (y[SEASON_DAYS:2 * SEASON_DAYS].mean(axis=0) - first_week) / SEASON_DAYS
+    season[:SEASON_DAYS] = y[:SEASON_DAYS] - first_week
+    return level, trend, season
+
+class SeasonalForecaster:
+    """Модель Holt-Winters для набору денних рядів keys, що починаються з дати start."""
+
+    def __init__(self, keys, start, values, alpha, beta, gamma):
+        self.keys = list(keys)
+        self.start = start
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.values = np.zeros((len(self.keys), 0))
+        self.level = self.trend = self.season = None
+        self._extend(values, 0)
+
+    @classmethod
+    def fit(cls, keys, start, values):
+        """Підбирає параметри для кожного ряду за сіткою та повертає навчену модель.
+
+        values — матриця (ряди, дні) з сумами за завершені дні, починаючи з start.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        grid = np.array([(a, b, g) for a in ALPHAS for b in BETAS for g in GAMMAS])
+        # Усі кандидати параметрів — окрема вісь: (кандидати, ряди)
+        alpha, beta, gamma = (grid[:, i][:, None] for i in range(3))
+        y = np.broadcast_to(values.T[:, None, :], (values.shape[1], len(grid), values.shape[0]))
+
+        level, trend, season = _initial_state(y, y.shape[1:])
+        sse = _smooth(y, alpha, beta, gamma, level, trend, season, 0)
+        best = np.argmin(sse, axis=0)
+        return cls(keys, start, values, grid[best, 0], grid[best, 1], grid[best, 2])
+
+    @property
+    def days(self):
+        return self.values.shape[1]
+
+    def _extend(self, values, first):
+        """Оновлює історію до values і переобчислює стан з дня first."""
+        y = values.T
+        if self.level is None:
+            self.level, self.trend, self.season = _initial_state(y, (len(self.keys),))
+        else:
+            grow = len(y) - self.days
+            if grow > 0:
+                self.level, self.trend, self.season = (
+                    np.concatenate((state, np.zeros((grow,) + state.shape[1:])))
+                    for state in (self.level, self.trend, self.season)
+                )
+        self.values = values
+        _smooth(y, self.alpha, self.beta, self.gamma, self.level, self.trend, self.season, first)
+
+    def update(self, keys, start, values):
+        """Інкрементно оновлює модель новими або зміненими днями.
+
+        Повертає False, якщо оновлення неможливе (інші ряди чи початок, змінені
+        перші два тижні або надто довга історія) і модель треба навчити заново.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if list(keys) != self.keys or start != self.start:
+            return False
+        if values.shape[1] < self.days or values.shape[1] > MAX_HISTORY_DAYS:
+            return False
+
+        changed = np.flatnonzero((values[:, :self.days] != self.values).any(axis=0))
+        first = int(changed[0]) if changed.size else self.days
+        if first < 2 * SEASON_DAYS:
+            return False
+        if first < values.shape[1]:
+            self._extend(values, first)
+        return True
+
+    def forecast(self, horizon):
+        """Прогноз (ряди, horizon) на дні, що йдуть після історії; від'ємні значення обрізаються."""
+        steps = np.arange(1, horizon + 1)[:, None]
+        phases = self.days + (steps[:, 0] - 1) % SEASON_DAYS
+        predicted = self.level[-1] + steps * self.trend[-1] + self.season[phases]
+        return np.maximum(predicted, 0).T
+
+def history_start(user_id, today):
+    """Дата, з якої будувати ряди для моделі користувача.
+
+    Поки кешована модель може оновлюватися інкрементно, ряди починаються з її
+    початку; інакше — з FORECAST_HISTORY_DAYS днів тому.
+    """
+    with _models_lock:
+        model = _models.get(user_id)
+    if model is not None and (today - model.start).days <= MAX_HISTORY_DAYS:
+        return model.start
+    return today - timedelta(days=FORECAST_HISTORY_DAYS)
+
+def get_forecaster(user_id, keys, start, values):
+    """Модель для рядів користувача: оновлена кешована або навчена заново."""
+    with _models_lock:
+        model = _models.get(user_id)
+        if model is None or not model.update(keys, start, values):
+            model = SeasonalForecaster.fit(keys, start, values)
+        _models[user_id] = model
+        _models.move_to_end(user_id)
+        while len(_models) > MODEL_CACHE_SIZE:
+            _models.popitem(last=False)
+        return model
+
+def clear_forecasters(user_id=None):
+    with _models_lock:
+        if user_id is None:
+            _models.clear()
+        else:
+            _models.pop(user_id, None)
+
+__all__ = [
+    'SEASON_DAYS',
+    'FORECAST_HISTORY_DAYS',
+    'SeasonalForecaster',
+    'history_start',
+    'get_forecaster',
+    'clear_forecasters',
+]
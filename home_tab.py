@@ -15,6 +15,8 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.spinner import Spinner
 from kivy.uix.carousel import Carousel
 from kivy.uix.gridlayout import GridLayout
+from kivy.uix.filechooser import FileChooserListView
+from kivy.uix.progressbar import ProgressBar
 from kivy.metrics import dp
 from kivy.app import App
 from kivy.clock import Clock
@@ -25,8 +27,10 @@ from kivy.utils import platform
 # --- ІМПОРТ ТА ЗАГЛУШКИ (для незалежності) ---
 # Припускаємо, що ці утиліти доступні в utils/db_manager.py
 try:
-    from utils.db_manager import cursor, conn, log_transaction, get_user_cards, debug_transactions, get_total_balance, update_card_balance, create_user_card, update_user_card, delete_user_card, transfer_money_between_cards, safe_color_conversion, is_valid_email, is_valid_password, hash_password, check_password
+    from utils.db_manager import cursor, conn, log_transaction, get_user_cards, get_transactions_page, search_transactions, get_total_balance, update_card_balance, create_user_card, update_user_card, delete_user_card, transfer_money_between_cards, new_idempotency_key, from_cents, safe_color_conversion, is_valid_email, is_valid_password, hash_password, check_password
     from utils.widgets import WhitePopup, WhiteButton, WhiteTextInput
+    from utils.db_executor import run_read_query, run_in_background, cancel_pending
+    from utils.statement_import import import_statement
 except ImportError:
     class MockCursor:
         def execute(self, *args): pass
@@ -38,18 +42,29 @@ except ImportError:
     conn = MockConn()
     def log_transaction(*args): pass
     def get_user_cards(*args): return [{'id': 1, 'name': 'Demo Card', 'number': '4444', 'bank': 'Mono', 'balance': 100.0, 'color': [0.1, 0.3, 0.6, 1]}]
-    def debug_transactions(*args): return []
+    def get_transactions_page(*args, **kwargs): return {'transactions': [], 'next_cursor': None}
+    def search_transactions(*args, **kwargs): return {'transactions': [], 'next_cursor': None}
     def get_total_balance(*args): return 0.0
-    def update_card_balance(*args): return True
+    def update_card_balance(*args, **kwargs): return True
     def create_user_card(*args): return 1
     def update_user_card(*args): return True
     def delete_user_card(*args): return True
-    def transfer_money_between_cards(*args): return True, "Успіх"
+    def transfer_money_between_cards(*args, **kwargs): return True, "Успіх"
+    def new_idempotency_key(): return ""
+    def from_cents(cents): return cents or 0.0
     def safe_color_conversion(color): return [0.2, 0.4, 0.8, 1]
     def is_valid_email(email): return '@' in email
     def is_valid_password(password): return len(password) >= 6
     def hash_password(password): return f"hashed_{password}"
     def check_password(input_password, hashed_password): return f"hashed_{input_password}" == hashed_password
+    def run_read_query(fn, *args, owner=None, on_result=None, on_error=None, **kwargs):
+        result = fn(cursor, *args, **kwargs)
+        if on_result: on_result(result)
+    def cancel_pending(owner): pass
+    def run_in_background(fn, *args, on_result=None, on_error=None, **kwargs):
+        result = fn(*args, **kwargs)
+        if on_result: on_result(result)
+    def import_statement(*args, **kwargs): return {'read': 0, 'inserted': 0, 'duplicates': 0, 'skipped': 0, 'cards_created': 0, 'error': None}
 
     # Заглушки для віджетів
     class WhitePopup(Popup): 
@@ -172,10 +187,15 @@ class HomeTab(Screen):
         self.cards_data = []
         self.available_banks = ["Всі банки"]
         self.current_popup = None
-        Clock.schedule_once(self.delayed_init, 0.5)
-    
-    def delayed_init(self, dt):
-        self.update_content()
+        # Курсор наступної сторінки історії (None — більше немає)
+        self.history_cursor = None
+        self.history_loading = False
+        self.history_rows = 0
+        # Пошук в історії: запит, відкладений виклик і окремий власник фонових запитів,
+        # щоб пошук не скасовував завантаження карток
+        self.history_query = ""
+        self._search_event = None
+        self._history_owner = object()
     
     def get_app(self):
         return App.get_running_app()
@@ -188,6 +208,13 @@ class HomeTab(Screen):
     def on_pre_enter(self):
         self._update_scheduled = False
     
+    def on_leave(self):
+        cancel_pending(self)
+        cancel_pending(self._history_owner)
+        if self._search_event:
+            self._search_event.cancel()
+            self._search_event = None
+    
     def update_content(self):
         app = self.get_app()
         
@@ -197,32 +224,59 @@ class HomeTab(Screen):
                 self.ids.welcome_label.font_size = dp(16) 
                 self.ids.welcome_label.text = f"Вітаємо, {app.current_user}!"
             
-            try:
-                cards_balance = get_total_balance(cursor, app.current_user_id)
-                
-                if 'balance_label' in self.ids:
-                    # ЗМЕНШЕНО font_size
-                    self.ids.balance_label.font_size = dp(20) 
-                    self.ids.balance_label.text = f"Загальний баланс: {cards_balance:.2f} $"
-                    
-                self.load_user_cards()
-                self.update_transactions_history()
-                    
-            except Exception as e:
-                if 'balance_label' in self.ids:
-                    self.ids.balance_label.text = "Помилка завантаження"
+            if 'balance_label' in self.ids and not self.cards_data:
+                self.ids.balance_label.text = "Завантаження..."
+            
+            # Запити до БД виконуються у фоновому потоці, віджети оновлюються в on_content_loaded
+            cancel_pending(self)
+            cancel_pending(self._history_owner)
+            run_read_query(self.fetch_content, app.current_user_id, owner=self,
+                           on_result=self.on_content_loaded, on_error=self.on_content_error)
         else:
             if 'welcome_label' in self.ids:
                 self.ids.welcome_label.text = "Вітаємо!"
             if 'balance_label' in self.ids:
                 self.ids.balance_label.text = "Загальний баланс: 0.00 $"
     
-    def load_user_cards(self):
+    def fetch_content(self, c, user_id):
+        """Виконується в робочому потоці: баланс, картки та історія транзакцій."""
+        return {
+            'balance': get_total_balance(c, user_id),
+            'cards': get_user_cards(c, user_id),
+            'transactions': self.fetch_history_page(c, user_id, self.history_query),
+        }
+
+    def fetch_history_page(self, c, user_id, query="", after=None):
+        """Сторінка історії: повнотекстовий пошук, якщо задано запит, інакше — від новіших."""
+        if query.strip():
+            return search_transactions(c, user_id, query, after=after)
+        return get_transactions_page(c, user_id, after=after)
+    
+    def on_content_loaded(self, data):
+        try:
+            if 'balance_label' in self.ids:
+                # ЗМЕНШЕНО font_size
+                self.ids.balance_label.font_size = dp(20) 
+                self.ids.balance_label.text = f"Загальний баланс: {data['balance']:.2f} $"
+                
+            self.load_user_cards(data['cards'])
+            self.update_transactions_history(data['transactions'])
+                
+        except Exception as e:
+            print(f"Помилка оновлення головної вкладки: {traceback.format_exc()}")
+    
+    def on_content_error(self, error):
+        print(f"Помилка завантаження головної вкладки: {error}")
+        if 'balance_label' in self.ids:
+            self.ids.balance_label.text = "Помилка завантаження"
+    
+    def load_user_cards(self, raw_cards_data=None):
         """Завантажує картки, створюючи маску на основі останніх 4 цифр номера."""
         try:
             app = self.get_app()
             
-            raw_cards_data = get_user_cards(cursor, app.current_user_id)
+            if raw_cards_data is None:
+                raw_cards_data = get_user_cards(cursor, app.current_user_id)
             
             self.cards_data = []
             for card in raw_cards_data:
@@ -613,6 +667,9 @@ class HomeTab(Screen):
         cancel_btn = WhiteButton(text="Скасувати", background_color=LIGHT_GRAY, color=DARK_TEXT, font_size=dp(14))
         deposit_btn = WhiteButton(text="Поповнити", background_color=SUCCESS_GREEN, font_size=dp(14))
         
+        # Один ключ на відкрите вікно: повторне натискання не створить дубль
+        action_key = new_idempotency_key()
+        
         def deposit_to_card(instance):
             try:
                 amount_text = amount_input.text.strip()
@@ -621,11 +678,10 @@ class HomeTab(Screen):
                 amount = float(amount_text)
                 if amount <= 0: error_label.text = "Сума має бути додатною"; return
                     
-                success = update_card_balance(cursor, conn, card_data['id'], amount)
+                success = update_card_balance(cursor, conn, card_data['id'], amount, idempotency_key=action_key)
                 
                 if success:
                     self.current_popup.dismiss()
-                    self.load_user_cards()
                     self.update_content()
                     self.show_success_message(f"Картку '{card_data['name']}' поповнено на {amount:.2f} $!")
                 else:
@@ -646,6 +702,82 @@ class HomeTab(Screen):
         self.current_popup = popup
         popup.open()
 
+    # --- ІМПОРТ ВИПИСКИ ---
+
+    def show_import_modal(self, instance=None):
+        """Вибір файлу виписки CSV/OFX для імпорту в історію."""
+        content = BoxLayout(orientation='vertical', spacing=dp(8), padding=dp(10))
+        content.add_widget(Label(text="Оберіть виписку (CSV або OFX)", font_size=dp(14), bold=True, color=DARK_TEXT, size_hint_y=None, height=dp(30)))
+
+        start_path = '/sdcard/Download' if platform == 'android' else os.path.expanduser('~')
+        chooser = FileChooserListView(path=start_path if os.path.isdir(start_path) else os.getcwd(),
+                                      filters=['*.csv', '*.CSV', '*.ofx', '*.OFX', '*.qfx', '*.QFX'])
+        content.add_widget(chooser)
+
+        error_label = Label(text="", color=ERROR_RED, size_hint_y=None, height=dp(25), font_size=dp(12))
+        content.add_widget(error_label)
+
+        buttons_layout = BoxLayout(size_hint_y=None, height=dp(45), spacing=dp(8))
+        cancel_btn = WhiteButton(text="Скасувати", background_color=LIGHT_GRAY, color=DARK_TEXT, font_size=dp(14))
+        import_btn = WhiteButton(text="Імпортувати", background_color=PRIMARY_BLUE, font_size=dp(14))
+
+        def start(instance):
+            if not chooser.selection:
+                error_label.text = "Оберіть файл"
+                return
+            popup.dismiss()
+            self.start_statement_import(chooser.selection[0])
+
+        import_btn.bind(on_press=start)
+        buttons_layout.add_widget(cancel_btn)
+        buttons_layout.add_widget(import_btn)
+        content.add_widget(buttons_layout)
+
+        popup = WhitePopup(title=' ', content=content, size_hint=(0.95, 0.85))
+        cancel_btn.bind(on_press=lambda x: popup.dismiss())
+        self.current_popup = popup
+        popup.open()
+
+    def start_statement_import(self, path):
+        """Імпортує виписку у фоновому потоці, показуючи прогрес у вікні."""
+        app = self.get_app()
+        if not getattr(app, 'current_user_id', None): return
+
+        content = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(15))
+        content.add_widget(Label(text=f"Імпорт: {os.path.basename(path)}", font_size=dp(14), bold=True, color=DARK_TEXT, size_hint_y=None, height=dp(30)))
+        progress_bar = ProgressBar(max=1.0, value=0, size_hint_y=None, height=dp(20))
+        content.add_widget(progress_bar)
+        status_label = Label(text="Читання файлу...", font_size=dp(12), color=DARK_GRAY, size_hint_y=None, height=dp(25))
+        content.add_widget(status_label)
+
+        popup = WhitePopup(title=' ', content=content, size_hint=(0.8, 0.3), auto_dismiss=False)
+        popup.open()
+
+        def show_progress(fraction, stats):
+            progress_bar.value = fraction
+            status_label.text = f"Оброблено рядків: {stats['read']}"
+
+        def on_progress(fraction, stats):
+            # Викликається в робочому потоці — віджети оновлюємо в головному
+            Clock.schedule_once(lambda dt: show_progress(fraction, stats), 0)
+
+        def on_done(stats):
+            popup.dismiss()
+            if stats['error']:
+                self.show_error_message(f"Помилка імпорту: {stats['error']}")
+                return
+            self.update_content()
+            self.show_success_message(
+                f"Імпортовано: {stats['inserted']}\nДублікатів: {stats['duplicates']}, пропущено: {stats['skipped']}"
+            )
+
+        def on_error(error):
+            popup.dismiss()
+            self.show_error_message(f"Помилка імпорту: {error}")
+
+        run_in_background(import_statement, path, app.current_user_id, progress=on_progress,
+                          on_result=on_done, on_error=on_error)
+
     def show_edit_card_modal(self, card_data):
         scrollview, content = self._create_scrollable_content()
         
@@ -720,7 +852,6 @@ class HomeTab(Screen):
             
             if success:
                 self.current_popup.dismiss()
-                self.load_user_cards()
                 self.update_content()
                 self.show_success_message("Картку успішно оновлено!")
             else:
@@ -774,7 +905,6 @@ class HomeTab(Screen):
             success = delete_user_card(cursor, conn, card_data['id'])
             if success:
                 self.current_popup.dismiss()
-                self.load_user_cards()
                 self.update_content()
                 self.show_success_message("Картку успішно видалено!")
             else:
@@ -849,6 +979,9 @@ class HomeTab(Screen):
         # ЗМЕНШЕНО font_size
         cancel_btn = WhiteButton(text="Скасувати", background_color=LIGHT_GRAY, color=DARK_TEXT, font_size=dp(14))
         transfer_btn = WhiteButton(text="Переказати", background_color=SUCCESS_GREEN, font_size=dp(14))
+        
+        # Один ключ на відкрите вікно: повторне натискання не створить дубль
+        action_key = new_idempotency_key()
 
         def transfer_money(instance):
             try:
@@ -864,12 +997,11 @@ class HomeTab(Screen):
                 if not to_card_id: error_label.text = "Картку отримувача не знайдено"; return
                     
                 success, message = transfer_money_between_cards(
-                    cursor, conn, from_card_data['id'], to_card_id, amount
+                    cursor, conn, from_card_data['id'], to_card_id, amount, idempotency_key=action_key
                 )
                 
                 if success:
                     self.current_popup.dismiss()
-                    self.load_user_cards()
                     self.update_content()
                     self.show_success_message(f"Переказ {amount:.2f} $ успішний!")
                 else:
@@ -891,7 +1023,40 @@ class HomeTab(Screen):
         popup.open()
 
   
-    def update_transactions_history(self):
+    # Затримка пошуку після останнього натискання клавіші, с
+    SEARCH_DEBOUNCE = 0.3
+
+    def on_search_text(self, text):
+        """Перезапускає пошук лише після паузи у введенні."""
+        if self._search_event:
+            self._search_event.cancel()
+        self._search_event = Clock.schedule_once(lambda dt: self.run_history_search(text), self.SEARCH_DEBOUNCE)
+
+    def run_history_search(self, text):
+        self._search_event = None
+        if text.strip() == self.history_query.strip():
+            self.history_query = text
+            return
+        self.history_query = text
+
+        app = self.get_app()
+        if not getattr(app, 'current_user_id', None): return
+
+        # Результати попереднього запиту вже не актуальні
+        cancel_pending(self._history_owner)
+        self.history_loading = True
+        run_read_query(self.fetch_history_page, app.current_user_id, text, owner=self._history_owner,
+                       on_result=self.update_transactions_history, on_error=self.on_more_transactions_error)
+
+    # Фіксована ширина стовпців "Дата" та "Сума" в історії
+    HISTORY_DATE_WIDTH = dp(60)
+    HISTORY_AMOUNT_WIDTH = dp(75)
+    HISTORY_SPACING = dp(4)
+    # Максимальна довжина опису в рядку історії
+    HISTORY_MAX_DESC_LENGTH = 18
+
+    def update_transactions_history(self, page=None):
+        """Показує першу сторінку історії; наступні підвантажуються під час прокрутки."""
         if 'history_container' not in self.ids: return
 
         history_container = self.ids.history_container
@@ -900,6 +1065,10 @@ class HomeTab(Screen):
         history_container.size_hint_y = None
         history_container.bind(minimum_height=history_container.setter('height'))
 
+        self.history_cursor = None
+        self.history_loading = False
+        self.history_rows = 0
+
         try:
             app = self.get_app()
             
@@ -910,143 +1079,168 @@ class HomeTab(Screen):
             
             # Обгортаємо виклик БД в окремий try/except для ідентифікації проблем з даними
             try:
-                transactions = debug_transactions(cursor, app.current_user_id)
+                if page is None:
+                    page = self.fetch_history_page(cursor, app.current_user_id, self.history_query)
             except Exception as e:
                 print(f"Помилка БД при отриманні транзакцій: {traceback.format_exc()}")
                 # ЗМЕНШЕНО font_size та height
                 history_container.add_widget(Label(text="Помилка БД при завантаженні історії", color=ERROR_RED, size_hint_y=None, height=dp(30)))
                 return
 
-            if not transactions:
+            if not page['transactions']:
+                if 'transactions_count' in self.ids:
+                    self.ids.transactions_count.text = "0"
                 # ЗМЕНШЕНО font_size та height
-                history_container.add_widget(Label(text="Ще немає транзакцій", font_size=dp(14), color=DARK_GRAY, size_hint_y=None, height=dp(60)))
+                empty_text = "Нічого не знайдено" if self.history_query.strip() else "Ще немає транзакцій"
+                history_container.add_widget(Label(text=empty_text, font_size=dp(14), color=DARK_GRAY, size_hint_y=None, height=dp(60)))
                 return
 
-            # --- Визначення фіксованої ширини для стовпців "Дата" та "Сума" ---
-            DATE_WIDTH = dp(60)  # ЗМЕНШЕНО
-            AMOUNT_WIDTH = dp(75) # ЗМЕНШЕНО
-            # Додатковий простір між стовпцями
-            SPACING = dp(4) # ЗМЕНШЕНО
+            SPACING = self.HISTORY_SPACING
             
             # Заголовок
             # ЗМЕНШЕНО height
             header_layout = BoxLayout(size_hint_y=None, height=dp(25), padding=[SPACING, SPACING, SPACING, SPACING], spacing=SPACING)
             
             # ЗМЕНШЕНО font_size
-            header_layout.add_widget(Label(text="Дата", size_hint_x=None, width=DATE_WIDTH, color=DARK_GRAY, font_size=dp(10), bold=True, halign='left'))
+            header_layout.add_widget(Label(text="Дата", size_hint_x=None, width=self.HISTORY_DATE_WIDTH, color=DARK_GRAY, font_size=dp(10), bold=True, halign='left'))
             header_layout.add_widget(Label(text="Опис", size_hint_x=1, color=DARK_GRAY, font_size=dp(10), bold=True, halign='left')) 
-            header_layout.add_widget(Label(text="Сума", size_hint_x=None, width=AMOUNT_WIDTH, color=DARK_GRAY, font_size=dp(10), bold=True, halign='right'))
+            header_layout.add_widget(Label(text="Сума", size_hint_x=None, width=self.HISTORY_AMOUNT_WIDTH, color=DARK_GRAY, font_size=dp(10), bold=True, halign='right'))
             history_container.add_widget(header_layout)
 
-            filtered_transactions = []
-            seen_transactions = set()
-            
-            for trans in transactions:
-                # Перевірка формату транзакції (4 елементи)
-                if len(trans) != 4:
-                    print(f"Пропущено некоректну транзакцію: {trans}")
-                    continue
-                
-                trans_type, amount, description, created_at = trans
-                
-                if trans_type == 'card_creation': continue
-                
-                # Припускаємо, що created_at є унікальним
-                trans_key = (trans_type, amount, description, created_at) 
-                
-                if trans_key not in seen_transactions:
-                    seen_transactions.add(trans_key)
-                    filtered_transactions.append(trans)
-
-            # --- ЗМІНА: Встановлення ліміту для опису ---
-            MAX_DESC_LENGTH = 18 # ЗМЕНШЕНО
-            
-            for i, (trans_type, amount, description, created_at) in enumerate(filtered_transactions):
-                try:
-                    date_time = datetime.now() 
-                    date_str = date_time.strftime('%d.%m %H:%M')
-
-                    if trans_type in ('deposit', 'savings_return', 'card_deposit', 'savings_interest', 'savings_completed', 'transfer_in', 'income', 'envelope_deposit'):
-                        amount_color = SUCCESS_GREEN
-                        sign = "+"
-                    else:
-                        amount_color = ERROR_RED
-                        sign = "-"
-                        
-                    # Скорочення опису, якщо він занадто довгий
-                    display_description = description
-                    if len(description) > MAX_DESC_LENGTH:
-                        display_description = description[:MAX_DESC_LENGTH].strip() + "..."
-
-                    # ВИПРАВЛЕНО: Додано spacing=SPACING
-                    trans_layout = BoxLayout(size_hint_y=None, padding=[SPACING, SPACING, SPACING, SPACING], spacing=SPACING) 
-                    
-                    
-                    # --- Ініціалізація віджетів для рядка (з фіксованою шириною) ---
-                    
-                    # ЗМЕНШЕНО font_size
-                    date_label = Label(text=date_str, size_hint_x=None, width=DATE_WIDTH, color=DARK_TEXT, font_size=dp(9), valign='top', halign='left')
-                    
-                    # Опис (size_hint_x=1) - використовуємо скорочений текст, ЗМЕНШЕНО font_size
-                    desc_label = Label(text=display_description, size_hint_x=1, color=DARK_TEXT, font_size=dp(11), halign='left', valign='top')
-                    
-                    # ЗМЕНШЕНО font_size
-                    amount_label = Label(text=f"{sign}{abs(amount):.2f} $", size_hint_x=None, width=AMOUNT_WIDTH, color=amount_color, font_size=dp(11), bold=True, valign='top', halign='right')
-
-                    # --- Логіка динамічної висоти ---
-                    def set_min_height(instance, width):
-                        # width - загальна ширина BoxLayout
-                        # Розрахунок ширини, доступної для поля "Опис"
-                        # Віднімаємо фіксовані ширини, два SPACING (між колонками) та два SPACING (padding BoxLayout)
-                        # NOTE: Оскільки ми скоротили текст, переносу може не бути, але логіку зберігаємо
-                        desc_width = width - DATE_WIDTH - AMOUNT_WIDTH - (3 * SPACING)
-                        
-                        # Встановлюємо text_size для автоматичного переносу (залишаємо на випадок, якщо скорочення недостатнє)
-                        desc_label.text_size = (desc_width, None)
-                        
-                        desc_label.texture_update()
-                        min_h_desc = desc_label.texture_size[1]
-                        
-                        # Додаємо вертикальний padding. ЗМЕНШЕНО min_height
-                        min_h_new = max(dp(25), min_h_desc + dp(8)) 
-                        
-                        instance.height = min_h_new
-                        instance.minimum_height = min_h_new
-                        date_label.height = min_h_new
-                        amount_label.height = min_h_new
-                        desc_label.height = min_h_new
-
-                    # Прив'язка динамічного оновлення висоти до зміни ширини контейнера
-                    trans_layout.bind(width=set_min_height)
-                    
-                    with trans_layout.canvas.before:
-                        bg_color = (0.98, 0.98, 0.98, 1) if i % 2 == 0 else (0.95, 0.95, 0.95, 1)
-                        Color(*bg_color)
-                        trans_layout.bg_rect = Rectangle(pos=trans_layout.pos, size=trans_layout.size)
-                    
-                    trans_layout.bind(pos=lambda inst, val: setattr(inst.bg_rect, 'pos', val), size=lambda inst, val: setattr(inst.bg_rect, 'size', val))
-                    
-                    trans_layout.add_widget(date_label)
-                    trans_layout.add_widget(desc_label)
-                    trans_layout.add_widget(amount_label)
-                    history_container.add_widget(trans_layout)
-                    
-                    # Примусове оновлення розміру після додавання віджетів
-                    Clock.schedule_once(lambda dt: set_min_height(trans_layout, history_container.width), 0)
-
-
-                except Exception as e:
-                    # Виведення детальної помилки, якщо збій стався при обробці одного рядка
-                    print(f"Помилка обробки окремої транзакції {i}: {traceback.format_exc()}")
-                    # ЗМЕНШЕНО font_size та height
-                    history_container.add_widget(Label(text=f"Помилка в рядку {i}", color=ERROR_RED, size_hint_y=None, height=dp(25)))
-                    continue
+            self.append_transactions(page)
 
         except Exception as e:
             # Цей блок ловить критичні помилки, які не були спіймані вище
             print(f"Критична помилка в update_transactions_history: {traceback.format_exc()}")
             # ЗМЕНШЕНО font_size та height
             history_container.add_widget(Label(text="Критична помилка завантаження історії", color=ERROR_RED, size_hint_y=None, height=dp(30)))
+
+    def append_transactions(self, page):
+        """Додає рядки сторінки в кінець історії та запам'ятовує курсор наступної."""
+        if 'history_container' not in self.ids: return
+        history_container = self.ids.history_container
+
+        self.history_cursor = page['next_cursor']
+
+        for trans in page['transactions']:
+            if trans['type'] == 'card_creation': continue
+            try:
+                self._add_transaction_row(history_container, trans, self.history_rows)
+            except Exception as e:
+                # Виведення детальної помилки, якщо збій стався при обробці одного рядка
+                print(f"Помилка обробки окремої транзакції {self.history_rows}: {traceback.format_exc()}")
+                # ЗМЕНШЕНО font_size та height
+                history_container.add_widget(Label(text=f"Помилка в рядку {self.history_rows}", color=ERROR_RED, size_hint_y=None, height=dp(25)))
+            self.history_rows += 1
+
+        if 'transactions_count' in self.ids:
+            self.ids.transactions_count.text = f"{self.history_rows}{'+' if self.history_cursor else ''}"
+
+        # Якщо сторінка не заповнила список, прокрутки не буде — довантажуємо одразу
+        Clock.schedule_once(lambda dt: self._fill_history_viewport(), 0)
+
+    def _add_transaction_row(self, history_container, trans, i):
+        DATE_WIDTH = self.HISTORY_DATE_WIDTH
+        AMOUNT_WIDTH = self.HISTORY_AMOUNT_WIDTH
+        SPACING = self.HISTORY_SPACING
+
+        trans_type, amount, description = trans['type'], trans['amount'], trans['description']
+
+        # created_ts — секунди Unix, показуємо в локальному часі
+        date_time = datetime.fromtimestamp(trans['timestamp']) if trans.get('timestamp') else datetime.now()
+        date_str = date_time.strftime('%d.%m %H:%M')
+
+        if trans_type in ('deposit', 'savings_return', 'card_deposit', 'savings_interest', 'savings_completed', 'transfer_in', 'income', 'envelope_deposit'):
+            amount_color = SUCCESS_GREEN
+            sign = "+"
+        else:
+            amount_color = ERROR_RED
+            sign = "-"
+            
+        # Скорочення опису, якщо він занадто довгий
+        display_description = description
+        if len(description) > self.HISTORY_MAX_DESC_LENGTH:
+            display_description = description[:self.HISTORY_MAX_DESC_LENGTH].strip() + "..."
+
+        # ВИПРАВЛЕНО: Додано spacing=SPACING
+        trans_layout = BoxLayout(size_hint_y=None, padding=[SPACING, SPACING, SPACING, SPACING], spacing=SPACING) 
+        
+        # --- Ініціалізація віджетів для рядка (з фіксованою шириною) ---
+        
+        # ЗМЕНШЕНО font_size
+        date_label = Label(text=date_str, size_hint_x=None, width=DATE_WIDTH, color=DARK_TEXT, font_size=dp(9), valign='top', halign='left')
+        
+        # Опис (size_hint_x=1) - використовуємо скорочений текст, ЗМЕНШЕНО font_size
+        desc_label = Label(text=display_description, size_hint_x=1, color=DARK_TEXT, font_size=dp(11), halign='left', valign='top')
+        
+        # ЗМЕНШЕНО font_size
+        amount_label = Label(text=f"{sign}{abs(amount):.2f} $", size_hint_x=None, width=AMOUNT_WIDTH, color=amount_color, font_size=dp(11), bold=True, valign='top', halign='right')
+
+        # --- Логіка динамічної висоти ---
+        def set_min_height(instance, width):
+            # width - загальна ширина BoxLayout
+            # Віднімаємо фіксовані ширини та проміжки між колонками
+            desc_width = width - DATE_WIDTH - AMOUNT_WIDTH - (3 * SPACING)
+            
+            # Встановлюємо text_size для автоматичного переносу (залишаємо на випадок, якщо скорочення недостатнє)
+            desc_label.text_size = (desc_width, None)
+            
+            desc_label.texture_update()
+            min_h_desc = desc_label.texture_size[1]
+            
+            # Додаємо вертикальний padding. ЗМЕНШЕНО min_height
+            min_h_new = max(dp(25), min_h_desc + dp(8)) 
+            
+            instance.height = min_h_new
+            instance.minimum_height = min_h_new
+            date_label.height = min_h_new
+            amount_label.height = min_h_new
+            desc_label.height = min_h_new
+
+        # Прив'язка динамічного оновлення висоти до зміни ширини контейнера
+        trans_layout.bind(width=set_min_height)
+        
+        with trans_layout.canvas.before:
+            bg_color = (0.98, 0.98, 0.98, 1) if i % 2 == 0 else (0.95, 0.95, 0.95, 1)
+            Color(*bg_color)
+            trans_layout.bg_rect = Rectangle(pos=trans_layout.pos, size=trans_layout.size)
+        
+        trans_layout.bind(pos=lambda inst, val: setattr(inst.bg_rect, 'pos', val), size=lambda inst, val: setattr(inst.bg_rect, 'size', val))
+        
+        trans_layout.add_widget(date_label)
+        trans_layout.add_widget(desc_label)
+        trans_layout.add_widget(amount_label)
+        history_container.add_widget(trans_layout)
+        
+        # Примусове оновлення розміру після додавання віджетів
+        Clock.schedule_once(lambda dt: set_min_height(trans_layout, history_container.width), 0)
+
+    def on_history_scroll(self, scroll_view, scroll_y):
+        """Біля нижнього краю списку підвантажує наступну сторінку."""
+        if scroll_y <= 0.1:
+            self.load_more_transactions()
+
+    def _fill_history_viewport(self):
+        if 'history_scroll' not in self.ids or 'history_container' not in self.ids: return
+        if self.ids.history_container.height <= self.ids.history_scroll.height:
+            self.load_more_transactions()
+
+    def load_more_transactions(self):
+        if self.history_loading or not self.history_cursor: return
+        app = self.get_app()
+        if not getattr(app, 'current_user_id', None): return
+
+        self.history_loading = True
+        run_read_query(self.fetch_history_page, app.current_user_id, self.history_query, after=self.history_cursor,
+                       owner=self._history_owner, on_result=self.on_more_transactions_loaded, on_error=self.on_more_transactions_error)
+
+    def on_more_transactions_loaded(self, page):
+        self.history_loading = False
+        self.append_transactions(page)
+
+    def on_more_transactions_error(self, error):
+        self.history_loading = False
+        print(f"Помилка підвантаження історії: {error}")
     
     def show_success_message(self, message):
         content = BoxLayout(orientation='vertical', spacing=dp(15), padding=dp(15)) # ЗМЕНШЕНО spacing та padding
@@ -1217,7 +1411,7 @@ class LoginScreen(Screen):
                 result = cursor.fetchone()
                 
                 if result:
-                    balance = result[0]
+                    balance = from_cents(result[0])
                 else:
                     cursor.execute("INSERT INTO wallets (user_id, balance) VALUES (?, ?)", (user_id, 0.0))
                     conn.commit()
@@ -0,0 +1,161 @@
+import itertools
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+
+from utils.db_executor import export_executor
+
+# --- ФОНОВІ ЗАДАЧІ (ЗВІТИ ТА ЕКСПОРТ) ---
+# Задачі виконуються по черзі в окремому потоці export_executor, тож кілька
+# звітів можна поставити одразу, а запити вкладок не чекають на них.
+# Функція задачі отримує курсор читання першим аргументом, а також progress
+# і cancel_event; повертає stats з ключами cancelled та error (None — успіх).
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+JOB_STATE_LABELS = {
+    JOB_QUEUED: 'У черзі',
+    JOB_RUNNING: 'Виконується',
+    JOB_DONE: 'Готово',
+    JOB_FAILED: 'Помилка',
+    JOB_CANCELLED: 'Скасовано',
+}
+
+# Скільки завершених задач зберігати для показу в UI
+MAX_FINISHED_JOBS = 20
+
+_job_ids = itertools.count(1)
+
+@contextmanager
+def atomic_output(path):
+    """Шлях для запису результату: "<path>.part", який після блоку атомарно стає path.
+
+    Якщо блок завершився винятком, частковий результат видаляється, а path не змінюється.
+    Працює і для файлів, і для тек.
+    """
+    part_path = path + ".part"
+    remove_path(part_path)
+    try:
+        yield part_path
+    except BaseException:
+        remove_path(part_path)
+        raise
+    if os.path.isdir(part_path):
+        remove_path(path)
+    os.replace(part_path, path)
+
+def remove_path(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+class Job:
+    """Одна фонова задача: стан, прогрес і прапорець скасування."""
+
+    def __init__(self, name):
+        self.id = next(_job_ids)
+        self.name = name
+        self.state = JOB_QUEUED
+        self.progress = 0.0
+        self.detail = ""
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def finished(self):
+        return self.state in (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+    @property
+    def state_label(self):
+        return JOB_STATE_LABELS.get(self.state, self.state)
+
+    def cancel(self):
+        """Скасовує задачу: ще не розпочата не виконається, поточна зупиниться між кроками."""
+        if not self.finished:
+            self.cancel_event.set()
+
+class JobQueue:
+    """Черга фонових задач, що виконуються послідовно."""
+
+    def __init__(self, executor=export_executor):
+        self._executor = executor
+        self._lock = threading.Lock()
+        self.jobs = []
+
+    def submit(self, name, fn, *args, on_done=None, **kwargs):
+        """Ставить fn(cursor, *args, progress=..., cancel_event=..., **kwargs) у чергу.
+
+        on_done(job) викликається в головному потоці після завершення задачі.
+        """
+        job = Job(name)
+
+        def progress(fraction, detail=None):
+            job.progress = fraction
+            if detail:
+                job.detail = detail
+
+        def run(cursor):
+            if job.cancel_event.is_set():
+                job.state = JOB_CANCELLED
+                return job
+            job.state = JOB_RUNNING
+            try:
+                job.result = fn(cursor, *args, progress=progress, cancel_event=job.cancel_event, **kwargs)
+            except Exception as e:
+                print(f"Помилка фонової задачі '{name}': {e}")
+                job.error = str(e)
+                job.state = JOB_FAILED
+                return job
+
+            result = job.result if isinstance(job.result, dict) else {}
+            if result.get('cancelled'):
+                job.state = JOB_CANCELLED
+            elif result.get('error'):
+                job.error = result['error']
+                job.state = JOB_FAILED
+            else:
+                job.progress = 1.0
+                job.state = JOB_DONE
+            return job
+
+        with self._lock:
+            self.jobs.append(job)
+            self._trim()
+
+        self._executor.submit_read(run, on_result=on_done, on_error=lambda e: print(f"Помилка фонової задачі '{name}': {e}"))
+        return job
+
+    def cancel_all(self):
+        for job in list(self.jobs):
+            job.cancel()
+
+    def active(self):
+        return [job for job in self.jobs if not job.finished]
+
+    def _trim(self):
+        finished = [job for job in self.jobs if job.finished]
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            self.jobs.remove(job)
+
+# Спільна черга звітів для всіх екранів
+job_queue = JobQueue()
+
+__all__ = [
+    'JOB_QUEUED',
+    'JOB_RUNNING',
+    'JOB_DONE',
+    'JOB_FAILED',
+    'JOB_CANCELLED',
+    'Job',
+    'JobQueue',
+    'job_queue',
+    'atomic_output',
+    'remove_path',
+]
@@ -9,7 +9,9 @@ from kivy.clock import Clock
 # Припускаємо, що ці утиліти доступні в utils/db_manager.py
 try:
     # Додано check_password для функціоналу входу
-    from utils.db_manager import conn, cursor, is_valid_email, is_valid_password, hash_password, log_transaction, get_total_balance, check_password
+    from utils.db_manager import conn, cursor, is_valid_email, is_valid_password, hash_password, log_transaction, get_total_balance, check_password, from_cents, update_password_hash
+    # Перевірка пароля у фоновому потоці, щоб вхід не блокував інтерфейс
+    from utils.auth_service import check_password_async
 except ImportError:
     # Заглушки для імітації відсутності utils
     class MockCursor:
@@ -25,9 +27,13 @@ except ImportError:
     def hash_password(password): return f"hashed_{password}"
     def log_transaction(*args): pass
     def get_total_balance(*args): return 0.0
+    def from_cents(cents): return cents or 0.0
     # Додано заглушку для check_password
     def check_password(input_password, hashed_password): 
         return f"hashed_{input_password}" == hashed_password
+    def check_password_async(password, stored, on_result, on_error=None):
+        on_result((check_password(password, stored), None))
+    def update_password_hash(*args): return False
 
 class RegistrationScreen(Screen):
  
@@ -146,7 +152,10 @@ class RegistrationScreen(Screen):
 class LoginScreen(Screen):
 
     def login_user(self):
-        """Обробляє вхід користувача, перевіряє пароль і встановлює стан програми."""
+        """Обробляє вхід користувача: пароль перевіряється у фоні, далі — finish_login."""
+        if self.ids.login_spinner.active:
+            return
+
         email = self.ids.email.text.strip()
         
         try:
@@ -162,56 +171,77 @@ class LoginScreen(Screen):
             # 1. Пошук користувача та його хешованого пароля
             cursor.execute("SELECT id, username, password FROM users WHERE email=?", (email,))
             user = cursor.fetchone()
+        except Exception as e:
+            msg_label.text = f"Помилка входу: {str(e)}"
+            print(f"Login error: {traceback.format_exc()}")
+            return
+
+        if not user:
+            msg_label.text = "Невірна електронна адреса або пароль"
+            return
+
+        # 2. PBKDF2 рахується в потоці auth_service, поки крутиться індикатор
+        msg_label.text = ""
+        self.ids.login_spinner.active = True
+        check_password_async(
+            password, user[2],
+            on_result=lambda result: self.finish_login(user, result),
+            on_error=self.login_failed
+        )
+
+    def login_failed(self, error):
+        self.ids.login_spinner.active = False
+        self.ids.login_message.text = f"Помилка входу: {str(error)}"
+        print(f"Login error: {error}")
+
+    def finish_login(self, user, result):
+        """Завершує вхід після перевірки пароля; result — (вірний, новий хеш або None)."""
+        self.ids.login_spinner.active = False
+        msg_label = self.ids.login_message
+        is_valid, new_hash = result
+
+        if not is_valid:
+            msg_label.text = "Невірна електронна адреса або пароль"
+            return
+
+        try:
+            user_id, username, _ = user
+            app = App.get_running_app()
+
+            # Хеш старого формату або зі слабшими параметрами оновлюється непомітно
+            if new_hash:
+                update_password_hash(cursor, conn, user_id, new_hash)
             
-            if user and check_password(password, user[2]):
-                user_id, username, _ = user
-                app = App.get_running_app()
-                
-                # 2. Оновлення стану програми
-                app.current_user = username
-                app.current_user_id = user_id
+            # 3. Оновлення стану програми
+            app.current_user = username
+            app.current_user_id = user_id
 
-                # 3. Перевірка та завантаження балансу
-                cursor.execute("SELECT balance FROM wallets WHERE user_id=?", (user_id,))
-                result = cursor.fetchone()
-                
-                if result:
-                    balance = result[0]
-                else:
-                    # Якщо гаманець не існує (хоча після реєстрації має бути), створюємо його
-                    cursor.execute("INSERT INTO wallets (user_id, balance) VALUES (?, ?)", (user_id, 0.0))
-                    conn.commit()
-                    balance = 0.0
-
-                app.balance = balance
-                
-                msg_label.text = f"Успішний вхід: {username}, баланс: ${balance:.2f}"
-                print(f"Login successful: {username}, user_id: {user_id}, balance: {balance}")
-                
-                # 4. Очищення полів
-                self.ids.email.text = ""
-                self.ids.password_field.ids.password_input.text = ""
+            # 4. Перевірка та завантаження балансу
+            cursor.execute("SELECT balance FROM wallets WHERE user_id=?", (user_id,))
+            result = cursor.fetchone()
+            
+            if result:
+                balance = from_cents(result[0])
+            else:
+                # Якщо гаманець не існує (хоча після реєстрації має бути), створюємо його
+                cursor.execute("INSERT INTO wallets (user_id, balance) VALUES (?, ?)", (user_id, 0.0))
+                conn.commit()
+                balance = 0.0
 
-                # 5. Перехід
-                self.manager.transition.direction = 'left'
-                self.manager.current = "dashboard_screen"
-                
-                # 6. Оновлення Dashboard
-                # Викликаємо force_dashboard_update з невеликою затримкою
-                Clock.schedule_once(lambda dt: self.force_dashboard_update(), 0.1)
+            app.balance = balance
+            
+            msg_label.text = f"Успішний вхід: {username}, баланс: ${balance:.2f}"
+            print(f"Login successful: {username}, user_id: {user_id}, balance: {balance}")
+            
+            # 5. Очищення полів
+            self.ids.email.text = ""
+            self.ids.password_field.ids.password_input.text = ""
+
+            # 6. Перехід
+            self.manager.transition.direction = 'left'
+            self.manager.current = "dashboard_screen"
+            # Дані головної вкладки оновлює DashboardScreen.on_enter
                 
-            else:
-                msg_label.text = "Невірна електронна адреса або пароль"
         except Exception as e:
             msg_label.text = f"Помилка входу: {str(e)}"
             print(f"Login error: {traceback.format_exc()}")
-
-    def force_dashboard_update(self):
-        """Примусово оновлює Dashboard, викликаючи метод оновлення у ньому."""
-        dashboard = self.manager.get_screen('dashboard_screen')
-        
-        if hasattr(dashboard, 'update_all_tabs'):
-            dashboard.update_all_tabs()
-        elif 'home_tab' in dashboard.ids and hasattr(dashboard.ids.tab_manager.get_screen('home_tab'), 'update_content'):
-             # Якщо update_all_tabs немає, оновлюємо хоча б HomeTab
-            dashboard.ids.tab_manager.get_screen('home_tab').update_content()
\ No newline at end of file
@@ -25,23 +25,28 @@ from kivy.app import App
 from kivy.lang import Builder
 from kivy.uix.screenmanager import ScreenManager, SlideTransition
 from kivy.core.window import Window
+from kivy.clock import Clock
 from kivy.properties import StringProperty, NumericProperty
 
 # КРИТИЧНО: Ініціалізація БД виконується тут.
 # Змінено імпорт з assets.db_manager на utils.db_manager (як стандартна практика)
-from utils.db_manager import setup_db, conn 
+# Імпорт не відкриває БД: вона ініціалізується у фоні з build() (setup_db)
+from utils.db_manager import setup_db, conn, checkpoint_database
+from utils.db_connection import CHECKPOINT_INTERVAL
+from utils.auth_service import calibrate_async
+from utils.startup_timing import mark
 
 from screens.start_screen import StartScreen
 from screens.registration_screen import RegistrationScreen
 from screens.login_screen import LoginScreen
+# Вкладки dashboard (модулі та kv-правила) завантажуються при першому переході: screens.dashboard.TAB_REGISTRY
 from screens.dashboard import DashboardScreen
-from screens.home_tab import HomeTab
-from screens.savings_tab import SavingsTab
-from screens.analytics_tab import AnalyticsTab
-from screens.account_tab import AccountTab
+
+mark("imports")
 
 # Переконайтеся, що файл 'kv/screens.kv' існує
 Builder.load_file("kv/screens.kv")
+mark("kv_loaded")
 
 class FinanceScreenManager(ScreenManager):
     current_user = StringProperty("")
@@ -57,7 +62,8 @@ class FinanceApp(App):
         self.balance = 0.0
 
     def build(self):
-        # 1. БД ініціалізована в utils/db_manager.py
+        # 1. БД відкривається у фоновому потоці; екрани, що звернуться до неї раніше, дочекаються
+        setup_db(background=True)
         
         # Налаштування для Android
         if platform == 'android':
@@ -78,11 +84,25 @@ class FinanceApp(App):
         # Створюємо dashboard (екран з табами)
         dashboard = DashboardScreen(name="dashboard_screen")
         sm.add_widget(dashboard)
+
+        # Час до першого кадру: перший flip вікна після build
+        Window.bind(on_flip=self.on_first_frame)
+        mark("build")
         
         return sm
 
+    def on_first_frame(self, *args):
+        Window.unbind(on_flip=self.on_first_frame)
+        mark("first_frame")
+
     def on_start(self):
         """Викликається при запуску додатку"""
+        # Періодичний checkpoint WAL, щоб файл журналу не розростався
+        Clock.schedule_interval(lambda dt: checkpoint_database(), CHECKPOINT_INTERVAL)
+
+        # Кількість ітерацій PBKDF2 під швидкість пристрою (у фоні, до першого входу)
+        calibrate_async()
+
         if platform == 'android':
             print("Додаток запущено на Android")
             self.setup_android()
@@ -104,9 +124,15 @@ class FinanceApp(App):
             # Це може статися, якщо android.storage не знайдено, наприклад, на емуляторах
             print(f"Помилка налаштування Android: {e}")
 
+    def on_pause(self):
+        """Android може завершити процес у фоні — скидаємо WAL в основний файл"""
+        checkpoint_database()
+        return True
+
     def on_stop(self):
         """Викликається при закритті додатку: закриття з'єднання з БД"""
         if conn:
+            checkpoint_database("TRUNCATE")
             conn.close()
             print("З'єднання з базою даних закрито")
 
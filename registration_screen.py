@@ -5,10 +5,11 @@ import sys
 
 from kivy.uix.screenmanager import Screen
 from kivy.app import App
-from kivy.clock import Clock
 # Припускаємо, що ці утиліти доступні в utils/db_manager.py
 try:
     from utils.db_manager import conn, cursor, is_valid_email, is_valid_password, hash_password, log_transaction, get_total_balance
+    # Хешування пароля у фоновому потоці, щоб реєстрація не блокувала інтерфейс
+    from utils.auth_service import hash_password_async
 except ImportError:
     # Заглушки для імітації відсутності utils
     class MockCursor:
@@ -24,11 +25,14 @@ except ImportError:
     def hash_password(password): return f"hashed_{password}"
     def log_transaction(*args): pass
     def get_total_balance(*args): return 0.0
+    def hash_password_async(password, on_result, on_error=None): on_result(hash_password(password))
 
 class RegistrationScreen(Screen):
  
     def register_user(self):
-        """Обробляє реєстрацію нового користувача, перевіряє дані та виконує авто-вхід."""
+        """Обробляє реєстрацію нового користувача: перевіряє дані, хешує пароль у фоні, далі — create_account."""
+        if self.ids.reg_spinner.active:
+            return
         
         # ВИПРАВЛЕНО: Доступ до тексту PasswordTextInput через його внутрішній ID
         try:
@@ -67,9 +71,31 @@ class RegistrationScreen(Screen):
                 self.manager.transition.direction = 'left'
                 self.manager.current = "login_screen"
                 return
+        except Exception as e:
+            msg_label.text = f"Помилка: {str(e)}"
+            print(f"Registration error: {traceback.format_exc()}")
+            return
 
-            hashed_pw = hash_password(password)
-            
+        # PBKDF2 рахується в потоці auth_service, поки крутиться індикатор
+        msg_label.text = ""
+        self.ids.reg_spinner.active = True
+        hash_password_async(
+            password,
+            on_result=lambda hashed_pw: self.create_account(username, email, hashed_pw),
+            on_error=self.registration_failed
+        )
+
+    def registration_failed(self, error):
+        self.ids.reg_spinner.active = False
+        self.ids.reg_message.text = f"Помилка: {str(error)}"
+        print(f"Registration error: {error}")
+
+    def create_account(self, username, email, hashed_pw):
+        """Створює обліковий запис з готовим хешем пароля та виконує авто-вхід."""
+        self.ids.reg_spinner.active = False
+        msg_label = self.ids.reg_message
+
+        try:
             # 1. Створення користувача
             cursor.execute(
                 "INSERT INTO users(username, email, password, created_at) VALUES(?, ?, ?, ?)",
@@ -116,25 +142,10 @@ class RegistrationScreen(Screen):
             
             self.manager.transition.direction = 'left'
             self.manager.current = "dashboard_screen"
-            
-            # ВИПРАВЛЕНО: Виклик примусового оновлення для Dashboard
-            # Запускаємо оновлення після невеликої затримки, щоб менеджер екранів встиг переключитися.
-            Clock.schedule_once(lambda dt: self.force_dashboard_update(), 0.1)
+            # Дані головної вкладки оновлює DashboardScreen.on_enter
             
         except Exception as e:
             print(f"Error during auto-login: {traceback.format_exc()}")
             self.ids.reg_message.text = "Реєстрація успішна! Будь ласка, увійдіть вручну."
             self.manager.transition.direction = 'left'
             self.manager.current = "login_screen"
-
-    def force_dashboard_update(self):
-        """Примусово оновлює Dashboard, викликаючи метод оновлення у ньому."""
-        dashboard = self.manager.get_screen('dashboard_screen')
-        
-        # Перевіряємо, чи існує метод оновлення на DashboardScreen
-        if hasattr(dashboard, 'update_all_tabs'):
-            dashboard.update_all_tabs()
-        elif 'home_tab' in dashboard.ids and hasattr(dashboard.ids.tab_manager.get_screen('home_tab'), 'update_content'):
-             # Якщо update_all_tabs немає, оновлюємо хоча б HomeTab
-            dashboard.ids.tab_manager.get_screen('home_tab').update_content()
-
@@ -13,12 +13,14 @@ from kivy.clock import Clock
 from kivy.graphics import Color, Rectangle, Line, RoundedRectangle
 from kivy.properties import NumericProperty, StringProperty, ListProperty, ObjectProperty 
 import traceback
+from contextlib import nullcontext
 from typing import Optional, Dict, Any, List
 
 # --- Імпорт з utils ---
 try:
-    from utils.db_manager import cursor, conn, log_transaction, log_savings_transaction, get_user_cards, get_user_card_by_id
+    from utils.db_manager import cursor, conn, log_transaction, log_savings_transaction, get_user_cards, get_user_card_by_id, transaction, record_transaction, new_idempotency_key, to_cents, from_cents
     from utils.widgets import SavingsPlanItem
+    from utils.db_executor import run_read_query, cancel_pending
 except ImportError:
     # --- ЗАГЛУШКИ ДЛЯ ТЕСТУВАННЯ (MOCK) ---
     class MockCursor:
@@ -37,11 +39,20 @@ except ImportError:
     conn = MockConn()
     def log_transaction(*args): print(f"[MOCK] Log transaction: {args}")
     def log_savings_transaction(*args): print(f"[MOCK] Log savings transaction: {args}")
+    def transaction(): return nullcontext(cursor)
+    def record_transaction(*args): print(f"[MOCK] Record transaction: {args}"); return True
+    def new_idempotency_key(): return ""
+    def to_cents(amount): return amount
+    def from_cents(cents): return cents
     def get_user_cards(cursor, user_id): 
         return [{'id': 1, 'name': 'Demo Card', 'balance': 1000.0}, {'id': 2, 'name': 'Bank Card', 'balance': 500.0}]
     def get_user_card_by_id(cursor, card_id): 
         if card_id == 1: return {'id': 1, 'name': 'Demo Card', 'balance': 1000.0}
         return None
+    def run_read_query(fn, *args, owner=None, on_result=None, on_error=None, **kwargs):
+        result = fn(cursor, *args, **kwargs)
+        if on_result: on_result(result)
+    def cancel_pending(owner): pass
 
     # --- ФІНАЛЬНА МАКСИМАЛЬНО ОПТИМІЗОВАНА ЗАГЛУШКА SavingsPlanItem ---
     from kivy.uix.behaviors import ButtonBehavior
@@ -266,22 +277,11 @@ class SavingsTab(Screen):
         Clock.schedule_once(self._deferred_update, 0.1)
     
     def _deferred_update(self, dt):
-        self.load_user_cards()
         self.clear_inputs()
         self.update_savings_tab()
 
-    def load_user_cards(self):
-        """Завантажує актуальний список карток користувача в user_cards ListProperty."""
-        app = self.get_app()
-        user_id = getattr(app, 'current_user_id', 1) 
-        
-        if user_id:
-            try:
-                self.user_cards = get_user_cards(cursor, user_id)
-            except Exception:
-                self.user_cards = []
-        else:
-            self.user_cards = []
+    def on_leave(self):
+        cancel_pending(self)
     
     def clear_inputs(self):
         """Очищення полів вводу та скидання вибраного плану."""
@@ -324,27 +324,51 @@ class SavingsTab(Screen):
     # --- ДИНАМІЧНЕ ОНОВЛЕННЯ GUI ---
 
     def update_savings_tab(self):
-        """Динамічно завантажує та відображає плани заощаджень."""
+        """Завантажує картки та плани заощаджень у фоновому потоці; відображення — в on_savings_loaded."""
+        if 'savings_container' not in self.ids: return
+        savings_container = self.ids.savings_container
+        
+        app = self.get_app()
+        # ВИПРАВЛЕННЯ: Використовуємо 1 як резервний ID, якщо справжній ID не встановлено
+        user_id = getattr(app, 'current_user_id', 1) 
+
+        if not user_id:
+            self.user_cards = []
+            savings_container.clear_widgets()
+            savings_container.add_widget(Label(text="Будь ласка, увійдіть в систему (ID: None)", font_size=dp(16), color=DARK_TEXT))
+            return
+
+        # Поки дані завантажуються, попередній список лишається на екрані; порожній — отримує заглушку
+        if not savings_container.children:
+            savings_container.add_widget(Label(text="Завантаження...", font_size=dp(14), color=DARK_GRAY, size_hint_y=None, height=dp(50)))
+
+        cancel_pending(self)
+        run_read_query(self.fetch_savings, user_id, owner=self,
+                       on_result=self.on_savings_loaded, on_error=self.on_savings_error)
+
+    def fetch_savings(self, c, user_id):
+        """Виконується в робочому потоці: картки користувача та його плани заощаджень."""
+        c.execute(
+            "SELECT id, name, target_amount, current_amount, deadline, status FROM savings_plans WHERE user_id=? ORDER BY created_at DESC",
+            (user_id,)
+        )
+        return {'cards': get_user_cards(c, user_id), 'plans': c.fetchall()}
+
+    def on_savings_error(self, error):
+        print(f"Помилка завантаження планів заощаджень: {error}")
+        if 'savings_container' in self.ids:
+            self.ids.savings_container.clear_widgets()
+            self.ids.savings_container.add_widget(Label(text="Помилка завантаження", font_size=dp(16), color=ERROR_RED))
+
+    def on_savings_loaded(self, data):
+        """Відображає плани заощаджень (головний потік)."""
         if 'savings_container' not in self.ids: return
         savings_container = self.ids.savings_container
         savings_container.clear_widgets()
+        self.user_cards = data['cards']
         
         try:
-            app = self.get_app()
-            # ВИПРАВЛЕННЯ: Використовуємо 1 як резервний ID, якщо справжній ID не встановлено
-            user_id = getattr(app, 'current_user_id', 1) 
-
-            if not user_id:
-                savings_container.add_widget(Label(text="Будь ласка, увійдіть в систему (ID: None)", font_size=dp(16), color=DARK_TEXT))
-                return
-            
-            cursor.execute(
-                "SELECT id, name, target_amount, current_amount, deadline, status FROM savings_plans WHERE user_id=? ORDER BY created_at DESC",
-                (user_id,)
-            )
-            plans = cursor.fetchall()
-            
-            print(f"[DEBUG] User ID: {user_id}. Plans Fetched: {len(plans) if plans else 0}") 
+            plans = data['plans']
 
             if not plans:
                 savings_container.add_widget(Label(
@@ -361,8 +385,8 @@ class SavingsTab(Screen):
                 
                 plan_id, name, target, current, deadline, status = plan
                 
-                target_float = float(target) if target is not None else 0
-                current_float = float(current) if current is not None else 0
+                target_float = from_cents(target)
+                current_float = from_cents(current)
                 
                 progress = (current_float / target_float * 100) if target_float > 0 else 0
                 days_left = 0
@@ -499,12 +523,12 @@ class SavingsTab(Screen):
         try:
             app = self.get_app()
             user_id = getattr(app, 'current_user_id', 1) 
-            cursor.execute("INSERT INTO savings_plans (user_id, name, target_amount, deadline) VALUES (?, ?, ?, ?)",
-                (user_id, plan_name, target_amount, deadline if deadline else None))
-            plan_id = cursor.lastrowid
-            
-            log_savings_transaction(cursor, conn, user_id, plan_id, 0, "plan_created", f"Створено план заощаджень: {plan_name}")
-            conn.commit()
+            with transaction():
+                cursor.execute("INSERT INTO savings_plans (user_id, name, target_amount, deadline) VALUES (?, ?, ?, ?)",
+                    (user_id, plan_name, to_cents(target_amount), deadline if deadline else None))
+                plan_id = cursor.lastrowid
+                
+                log_savings_transaction(cursor, conn, user_id, plan_id, 0, "plan_created", f"Створено план заощаджень: {plan_name}")
             
             self.clear_inputs()
             self.update_savings_tab()
@@ -515,7 +539,7 @@ class SavingsTab(Screen):
             self._display_message(f"Помилка створення плану: {str(e)}", True)
 
 
-    def add_to_plan(self, plan_id: int, plan_name: str, amount_text: str, card_id: Optional[int] = None):
+    def add_to_plan(self, plan_id: int, plan_name: str, amount_text: str, card_id: Optional[int] = None, idempotency_key: Optional[str] = None):
         """Додає кошти до плану."""
         amount = self._validate_amount(amount_text)
         if amount is None: return
@@ -534,18 +558,22 @@ class SavingsTab(Screen):
             cursor.execute("SELECT current_amount, target_amount FROM savings_plans WHERE id = ? AND user_id = ?", (plan_id, user_id))
             plan = cursor.fetchone()
             current_amount, target_amount = plan
+            amount_cents = to_cents(amount)
             
-            if current_amount + amount > target_amount:
-                max_amount = target_amount - current_amount
+            if current_amount + amount_cents > target_amount:
+                max_amount = from_cents(target_amount - current_amount)
                 self._display_message(f"Максимум: ${max_amount:.2f}", True); return
             
-            cursor.execute("UPDATE user_cards SET balance = balance - ? WHERE id = ?", (amount, card_id))
-            cursor.execute("UPDATE savings_plans SET current_amount = current_amount + ? WHERE id = ?", (amount, plan_id))
-            
-            log_transaction(cursor, conn, user_id, "savings_deposit", amount, f"Переведено до плану '{plan_name}' з картки {selected_card['name']}")
-            log_savings_transaction(cursor, conn, user_id, plan_id, amount, "deposit", f"Додано до плану заощаджень з картки {selected_card['name']}")
+            # Одна дія користувача — один commit
+            with transaction():
+                if not record_transaction(cursor, user_id, "savings_deposit", amount, f"Переведено до плану '{plan_name}' з картки {selected_card['name']}", card_id, idempotency_key):
+                    return
+                
+                cursor.execute("UPDATE user_cards SET balance = balance - ? WHERE id = ?", (amount_cents, card_id))
+                cursor.execute("UPDATE savings_plans SET current_amount = current_amount + ? WHERE id = ?", (amount_cents, plan_id))
+                
+                log_savings_transaction(cursor, conn, user_id, plan_id, amount, "deposit", f"Додано до плану заощаджень з картки {selected_card['name']}")
             
-            conn.commit()
             self.update_savings_tab()
             self._display_message(f"Успішно додано ${amount:.2f} до {plan_name} з картки {selected_card['name']}")
             self._update_home_tab()
@@ -554,7 +582,7 @@ class SavingsTab(Screen):
             self._display_message(f"Помилка додавання: {str(e)}", True)
 
 
-    def remove_from_plan(self, plan_id: int, plan_name: str, amount_text: str, card_id: Optional[int] = None):
+    def remove_from_plan(self, plan_id: int, plan_name: str, amount_text: str, card_id: Optional[int] = None, idempotency_key: Optional[str] = None):
         """Вилучає кошти з плану."""
         amount = self._validate_amount(amount_text)
         if amount is None: return
@@ -568,20 +596,23 @@ class SavingsTab(Screen):
             user_id = getattr(app, 'current_user_id', 1) 
             cursor.execute("SELECT current_amount FROM savings_plans WHERE id = ? AND user_id = ?", (plan_id, user_id))
             plan = cursor.fetchone()
-            current_amount = plan[0] if plan else 0
+            current_amount = from_cents(plan[0]) if plan else 0
             
             if amount > current_amount: self._display_message(f"Недостатньо коштів. Доступно: ${current_amount:.2f}", True); return
             
             selected_card = get_user_card_by_id(cursor, card_id)
             card_name = selected_card['name'] if selected_card else "картки"
             
-            cursor.execute("UPDATE user_cards SET balance = balance + ? WHERE id = ?", (amount, card_id))
-            cursor.execute("UPDATE savings_plans SET current_amount = current_amount - ? WHERE id = ?", (amount, plan_id))
-            
-            log_transaction(cursor, conn, user_id, "savings_return", amount, f"Повернено з плану '{plan_name}' на картку {card_name}")
-            log_savings_transaction(cursor, conn, user_id, plan_id, amount, "withdrawal", f"Вилучено з плану заощаджень на картку {card_name}")
+            # Одна дія користувача — один commit
+            with transaction():
+                if not record_transaction(cursor, user_id, "savings_return", amount, f"Повернено з плану '{plan_name}' на картку {card_name}", card_id, idempotency_key):
+                    return
+                
+                cursor.execute("UPDATE user_cards SET balance = balance + ? WHERE id = ?", (to_cents(amount), card_id))
+                cursor.execute("UPDATE savings_plans SET current_amount = current_amount - ? WHERE id = ?", (to_cents(amount), plan_id))
+                
+                log_savings_transaction(cursor, conn, user_id, plan_id, amount, "withdrawal", f"Вилучено з плану заощаджень на картку {card_name}")
             
-            conn.commit()
             self.update_savings_tab()
             self._display_message(f"Успішно вилучено ${amount:.2f} з {plan_name} на картку {card_name}")
             self._update_home_tab()
@@ -596,7 +627,7 @@ class SavingsTab(Screen):
             user_id = getattr(app, 'current_user_id', 1) 
             cursor.execute("SELECT current_amount FROM savings_plans WHERE id = ? AND user_id = ?", (plan_id, user_id))
             plan = cursor.fetchone()
-            current_amount = plan[0] if plan else 0
+            current_amount = from_cents(plan[0]) if plan else 0
             
             if current_amount <= 0: self._display_message("У плані немає коштів для завершення", True); return
             
@@ -636,6 +667,7 @@ class SavingsTab(Screen):
         if not plan_data: return
         
         current_name, current_target, current_deadline = plan_data
+        current_target = from_cents(current_target)
         
         
         # АДАПТИВНІСТЬ: Зменшено height і font_size
@@ -695,14 +727,13 @@ class SavingsTab(Screen):
                 app = self.get_app()
                 user_id = getattr(app, 'current_user_id', 1) 
                 
-                cursor.execute(
-                    "UPDATE savings_plans SET name=?, target_amount=?, deadline=? WHERE id=?",
-                    (new_name, new_target, new_deadline if new_deadline else None, self.selected_plan_id)
-                )
-                
-                log_savings_transaction(cursor, conn, user_id, self.selected_plan_id, 0, "plan_updated", f"Оновлено план заощаджень")
-                
-                conn.commit()
+                with transaction():
+                    cursor.execute(
+                        "UPDATE savings_plans SET name=?, target_amount=?, deadline=? WHERE id=?",
+                        (new_name, to_cents(new_target), new_deadline if new_deadline else None, self.selected_plan_id)
+                    )
+                    
+                    log_savings_transaction(cursor, conn, user_id, self.selected_plan_id, 0, "plan_updated", f"Оновлено план заощаджень")
                 
                 self.selected_plan_name = new_name
                 popup.dismiss()
@@ -733,7 +764,7 @@ class SavingsTab(Screen):
         
         cursor.execute("SELECT current_amount FROM savings_plans WHERE id = ?", (self.selected_plan_id,))
         result = cursor.fetchone()
-        current_amount = result[0] if result else 0
+        current_amount = from_cents(result[0]) if result else 0
 
         if current_amount > 0:
             self._show_card_selection_for_deletion(self.selected_plan_id, self.selected_plan_name, current_amount)
@@ -741,9 +772,9 @@ class SavingsTab(Screen):
             try:
                 app = self.get_app()
                 user_id = getattr(app, 'current_user_id', 1) 
-                cursor.execute("DELETE FROM savings_plans WHERE id=?", (self.selected_plan_id,))
-                log_savings_transaction(cursor, conn, user_id, self.selected_plan_id, 0, "plan_deleted", f"Видалено план заощаджень")
-                conn.commit()
+                with transaction():
+                    cursor.execute("DELETE FROM savings_plans WHERE id=?", (self.selected_plan_id,))
+                    log_savings_transaction(cursor, conn, user_id, self.selected_plan_id, 0, "plan_deleted", f"Видалено план заощаджень")
                 
                 self.clear_inputs()
                 self.update_savings_tab()
@@ -794,13 +825,15 @@ class SavingsTab(Screen):
     def _show_card_selection_popup(self, plan_id: int, plan_name: str, amount: float, operation_type: str):
         """Відображає попап для операцій додавання/вилучення."""
         operation_text = "додавання до" if operation_type == "add" else "вилучення з"
+        # Один ключ на відкрите вікно: повторне підтвердження не створить дубль
+        action_key = new_idempotency_key()
         
         def callback(selected_card):
             card_id = selected_card['id']
             if operation_type == "add":
-                self.add_to_plan(plan_id, plan_name, str(amount), card_id)
+                self.add_to_plan(plan_id, plan_name, str(amount), card_id, action_key)
             else:
-                self.remove_from_plan(plan_id, plan_name, str(amount), card_id)
+                self.remove_from_plan(plan_id, plan_name, str(amount), card_id, action_key)
 
         popup, _ = self._create_popup_content(
             title=f"Оберіть картку для {operation_text} плану",
@@ -812,6 +845,8 @@ class SavingsTab(Screen):
 
     def _show_card_selection_for_completion(self, plan_id: int, plan_name: str, amount: float):
         """Відображає попап для отримання коштів при завершенні плану."""
+        action_key = new_idempotency_key()
+        
         def callback(selected_card):
             # Фінальна транзакція завершення
             try:
@@ -819,13 +854,15 @@ class SavingsTab(Screen):
                 user_id = getattr(app, 'current_user_id', 1)
                 card_id = selected_card['id']
                 
-                cursor.execute("UPDATE user_cards SET balance = balance + ? WHERE id = ?", (amount, card_id))
-                cursor.execute("UPDATE savings_plans SET status='completed', current_amount=0 WHERE id=?", (plan_id,))
-                
-                log_transaction(cursor, conn, user_id, "savings_completed", amount, f"Завершено план: {plan_name} на картку {selected_card['name']}")
-                log_savings_transaction(cursor, conn, user_id, plan_id, amount, "plan_completed", f"Завершено план на картку {selected_card['name']}")
+                with transaction():
+                    if not record_transaction(cursor, user_id, "savings_completed", amount, f"Завершено план: {plan_name} на картку {selected_card['name']}", card_id, action_key):
+                        return
+                    
+                    cursor.execute("UPDATE user_cards SET balance = balance + ? WHERE id = ?", (to_cents(amount), card_id))
+                    cursor.execute("UPDATE savings_plans SET status='completed', current_amount=0 WHERE id=?", (plan_id,))
+                    
+                    log_savings_transaction(cursor, conn, user_id, plan_id, amount, "plan_completed", f"Завершено план на картку {selected_card['name']}")
                 
-                conn.commit()
                 self.update_savings_tab()
                 self._display_message(f"План '{plan_name}' успішно завершено! ${amount:.2f} додано на картку {selected_card['name']}.")
                 self._update_home_tab()
@@ -844,6 +881,8 @@ class SavingsTab(Screen):
         
     def _show_card_selection_for_deletion(self, plan_id: int, plan_name: str, amount: float):
         """Відображає попап для повернення коштів при видаленні плану."""
+        action_key = new_idempotency_key()
+        
         def callback(selected_card):
             # Фінальна транзакція видалення
             try:
@@ -851,13 +890,15 @@ class SavingsTab(Screen):
                 user_id = getattr(app, 'current_user_id', 1)
                 card_id = selected_card['id']
                 
-                cursor.execute("UPDATE user_cards SET balance = balance + ? WHERE id = ?", (amount, card_id))
-                cursor.execute("DELETE FROM savings_plans WHERE id=?", (plan_id,))
-                
-                log_transaction(cursor, conn, user_id, "savings_return", amount, f"Повернено при видаленні плану: {plan_name} на картку {selected_card['name']}")
-                log_savings_transaction(cursor, conn, user_id, plan_id, amount, "plan_deleted", f"Видалено план з поверненням на картку {selected_card['name']}")
+                with transaction():
+                    if not record_transaction(cursor, user_id, "savings_return", amount, f"Повернено при видаленні плану: {plan_name} на картку {selected_card['name']}", card_id, action_key):
+                        return
+                    
+                    cursor.execute("UPDATE user_cards SET balance = balance + ? WHERE id = ?", (to_cents(amount), card_id))
+                    cursor.execute("DELETE FROM savings_plans WHERE id=?", (plan_id,))
+                    
+                    log_savings_transaction(cursor, conn, user_id, plan_id, amount, "plan_deleted", f"Видалено план з поверненням на картку {selected_card['name']}")
                 
-                conn.commit()
                 self.clear_inputs()
                 self.update_savings_tab()
                 self._display_message(f"План успішно видалено! ${amount:.2f} повернуто на картку {selected_card['name']}.")
@@ -0,0 +1,71 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# --- ЧАС ХОЛОДНОГО СТАРТУ ---
+# Позначки етапів запуску (імпорти, build, перший кадр, готовність БД) у
+# мілісекундах від запуску процесу та тривалості окремих кроків (measure).
+# На Linux/Android момент запуску береться з /proc, тож враховується й час
+# інтерпретатора до першого імпорту; на інших платформах відлік іде від
+# імпорту цього модуля.
+
+_marks = []
+_durations = []
+_marks_lock = threading.Lock()
+
+def _process_start():
+    """Момент запуску процесу (time.time()) або поточний момент, якщо /proc недоступний."""
+    try:
+        with open('/proc/self/stat') as f:
+            # Поля після назви процесу в дужках; starttime — 22-ге поле stat
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.time()
+
+PROCESS_START = _process_start()
+
+def elapsed_ms():
+    return (time.time() - PROCESS_START) * 1000
+
+def mark(name):
+    """Записує позначку етапу запуску й виводить її в лог. Повертає мс від старту."""
+    ms = elapsed_ms()
+    with _marks_lock:
+        _marks.append((name, ms))
+    print(f"[startup] {name}: {ms:.0f} мс")
+    return ms
+
+@contextmanager
+def measure(name):
+    """Записує тривалість блоку (мс) під назвою name, наприклад імпорт чи створення вкладки."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        with _marks_lock:
+            _durations.append((name, ms))
+        print(f"[startup] {name}: {ms:.1f} мс (тривалість)")
+
+def startup_marks():
+    """[(етап, мс від старту)] у порядку запису."""
+    with _marks_lock:
+        return list(_marks)
+
+def startup_durations():
+    """[(крок, тривалість у мс)] у порядку запису."""
+    with _marks_lock:
+        return list(_durations)
+
+__all__ = [
+    'PROCESS_START',
+    'elapsed_ms',
+    'mark',
+    'measure',
+    'startup_marks',
+    'startup_durations',
+]
@@ -0,0 +1,397 @@
+import codecs
+import csv
+import hashlib
+import os
+import re
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+
+from utils.db_manager import (
+    transaction, bulk_insert_transactions, get_categorizer, bump_data_version, to_cents,
+    record_balance_checkpoint
+)
+
+# --- ІМПОРТ БАНКІВСЬКИХ ВИПИСОК (CSV / OFX) ---
+# Файл читається потоково: парсери — генератори, що віддають по одній операції,
+# а вставка йде пакетами executemany в одній транзакції. Повторний імпорт того ж
+# файлу нічого не дублює: idempotency_key рядка — хеш його вмісту.
+
+IMPORT_CHUNK_SIZE = 5000
+READ_BLOCK_SIZE = 64 * 1024
+
+# Можливі назви стовпців CSV (порівнюються в нижньому регістрі)
+CSV_COLUMN_ALIASES = {
+    'date': ('date', 'дата', 'дата операції', 'transaction date', 'posted date', 'booking date'),
+    'amount': ('amount', 'сума', 'сума операції', 'сума в валюті картки', 'transaction amount'),
+    'debit': ('debit', 'витрата', 'списання', 'дебет'),
+    'credit': ('credit', 'надходження', 'зарахування', 'кредит'),
+    'description': ('description', 'опис', 'опис операції', 'призначення', 'призначення платежу', 'details', 'memo'),
+    'card': ('card', 'картка', 'номер картки', 'рахунок', 'account'),
+    'bank': ('bank', 'банк'),
+}
+
+# Підтримувані формати дат; розбираються регулярними виразами, бо перебір
+# форматів через strptime займав більшу частину часу імпорту
+_TIME = r"(?:[ T](\d{1,2}):(\d{2})(?::(\d{2}))?)?"
+DATE_PATTERNS = (
+    # YYYY-MM-DD[ HH:MM[:SS]]
+    (re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})" + _TIME), (0, 1, 2)),
+    # DD.MM.YYYY[ HH:MM[:SS]] та DD/MM/YYYY
+    (re.compile(r"(\d{1,2})[./](\d{1,2})[./](\d{4})" + _TIME), (2, 1, 0)),
+    # OFX: YYYYMMDD[HHMMSS[.XXX]][TZ]
+    (re.compile(r"(\d{4})(\d{2})(\d{2})(?:(\d{2})(\d{2})(\d{2})?)?(?:\.\d+)?(?:\[.*\])?"), (0, 1, 2)),
+)
+
+INSERT_SQL = '''
+    INSERT INTO transactions (user_id, type, amount, description, card_id, created_at, idempotency_key, category)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(idempotency_key) DO NOTHING
+'''
+
+class StatementFile:
+    """Потокове читання файлу з лічильником прочитаних байтів для прогресу."""
+
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path) or 1
+        self.bytes_read = 0
+        self.encoding = self._detect_encoding()
+
+    def _detect_encoding(self):
+        with open(self.path, 'rb') as f:
+            sample = f.read(READ_BLOCK_SIZE)
+        if sample.startswith(b'\xef\xbb\xbf'):
+            return 'utf-8-sig'
+        try:
+            # Обрізаний на межі блоку символ не вважається помилкою
+            sample.decode('utf-8')
+        except UnicodeDecodeError as e:
+            if e.start < len(sample) - 3:
+                # Українські банки часто вивантажують у Windows-1251
+                return 'cp1251'
+        return 'utf-8'
+
+    @property
+    def fraction(self):
+        return min(1.0, self.bytes_read / self.size)
+
+    def lines(self):
+        with open(self.path, 'rb') as f:
+            for raw in f:
+                self.bytes_read += len(raw)
+                yield raw.decode(self.encoding, errors='replace')
+
+    def blocks(self):
+        # Інкрементальний декодер не ламає багатобайтові символи на межі блоків
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+        with open(self.path, 'rb') as f:
+            while True:
+                raw = f.read(READ_BLOCK_SIZE)
+                self.bytes_read += len(raw)
+                yield decoder.decode(raw, final=not raw)
+                if not raw:
+                    break
+
+def detect_format(path):
+    """'ofx' або 'csv' за розширенням, а для невідомих розширень — за вмістом."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.ofx', '.qfx'):
+        return 'ofx'
+    if ext == '.csv':
+        return 'csv'
+    with open(path, 'rb') as f:
+        head = f.read(1024).upper()
+    return 'ofx' if b'OFXHEADER' in head or b'<OFX>' in head else 'csv'
+
+def parse_amount(value):
+    """'1 234,56', '1.234,56', '1,234.56', '-12.50', '(12.50)' -> Decimal. Порожнє або некоректне значення -> None.
+
+    Якщо є і кома, і крапка, десятковим роздільником вважається той, що стоїть останнім.
+    """
+    if value is None:
+        return None
+    text = str(value).strip().replace('\xa0', '').replace(' ', '')
+    if not text:
+        return None
+    negative = text.startswith('(') and text.endswith(')')
+    text = text.strip('()')
+    if ',' in text and '.' in text:
+        thousands = ',' if text.rfind('.') > text.rfind(',') else '.'
+        text = text.replace(thousands, '').replace(',', '.')
+    else:
+        text = text.replace(',', '.')
+    text = re.sub(r"[^0-9.+-]", "", text)
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        print(f"Некоректна сума у виписці: {value}")
+        return None
+    return -amount if negative else amount
+
+def parse_date(value):
+    """Локальна дата з виписки -> рядок UTC у форматі created_at."""
+    text = (value or '').strip()
+    for pattern, (year, month, day) in DATE_PATTERNS:
+        match = pattern.fullmatch(text)
+        if match:
+            parts = match.groups()
+            try:
+                parsed = datetime(int(parts[year]), int(parts[month]), int(parts[day]),
+                                  *(int(part or 0) for part in parts[3:6]))
+            except ValueError:
+                break
+            return parsed.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    raise ValueError(f"Некоректна дата: {value}")
+
+def _resolve_columns(header, mapping=None):
+    """Заголовок CSV -> {поле: індекс стовпця}. mapping перекриває автовизначення."""
+    normalized = [(name or '').strip().lower() for name in header]
+    columns = {}
+    for field, aliases in CSV_COLUMN_ALIASES.items():
+        for index, name in enumerate(normalized):
+            if name in aliases:
+                columns[field] = index
+                break
+    for field, name in (mapping or {}).items():
+        if name.strip().lower() in normalized:
+            columns[field] = normalized.index(name.strip().lower())
+
+    if 'date' not in columns or ('amount' not in columns and 'debit' not in columns and 'credit' not in columns):
+        raise ValueError("У CSV не знайдено стовпців дати та суми")
+    return columns
+
+def parse_csv(source, mapping=None):
+    """Генератор операцій з CSV: dict з date, amount, description, card, bank, ref."""
+    lines = source.lines()
+    first = next(lines, None)
+    if first is None:
+        return
+
+    try:
+        dialect = csv.Sniffer().sniff(first, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+
+    def all_lines():
+        yield first
+        yield from lines
+
+    reader = csv.reader(all_lines(), dialect)
+    columns = _resolve_columns(next(reader), mapping)
+
+    def cell(row, field):
+        index = columns.get(field)
+        return row[index].strip() if index is not None and index < len(row) else ''
+
+    for row in reader:
+        if not any(value.strip() for value in row):
+            continue
+        if 'amount' in columns:
+            amount = parse_amount(cell(row, 'amount'))
+        else:
+            # Окремі стовпці списання та зарахування
+            amount = (parse_amount(cell(row, 'credit')) or 0) - abs(parse_amount(cell(row, 'debit')) or 0)
+        yield {
+            'date': cell(row, 'date'),
+            'amount': amount,
+            'description': cell(row, 'description'),
+            'card': cell(row, 'card'),
+            'bank': cell(row, 'bank'),
+            'ref': None,
+        }
+
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+def parse_ofx(source):
+    """Генератор операцій з OFX (SGML і XML). Теги розбираються по блоках, без DOM."""
+    account = ''
+    bank = ''
+    record = None
+    buffer = ''
+
+    for block in source.blocks():
+        buffer += block
+        # Останній тег може бути обрізаний на межі блоку — лишаємо його на наступний прохід
+        cut = buffer.rfind('<')
+        if cut <= 0:
+            continue
+        ready, buffer = buffer[:cut], buffer[cut:]
+        for closing, tag, value in _OFX_TAG.findall(ready):
+            tag = tag.upper()
+            value = value.strip()
+            if tag == 'STMTTRN':
+                if closing and record is not None:
+                    yield _ofx_operation(record, account, bank)
+                    record = None
+                elif not closing:
+                    record = {}
+            elif closing:
+                continue
+            elif tag == 'ACCTID':
+                account = value
+            elif tag == 'ORG':
+                bank = value
+            elif record is not None:
+                record[tag] = value
+
+    for closing, tag, value in _OFX_TAG.findall(buffer):
+        if tag.upper() == 'STMTTRN' and closing and record is not None:
+            yield _ofx_operation(record, account, bank)
+            record = None
+
+def _ofx_operation(record, account, bank):
+    name, memo = record.get('NAME', ''), record.get('MEMO', '')
+    description = name if not memo or memo == name else f"{name} {memo}".strip()
+    return {
+        'date': record.get('DTPOSTED', ''),
+        'amount': parse_amount(record.get('TRNAMT')),
+        'description': description,
+        'card': account,
+        'bank': bank,
+        'ref': record.get('FITID'),
+    }
+
+def _card_digits(value):
+    return re.sub(r"\D", "", value or "")
+
+class CardResolver:
+    """Зіставляє картку з виписки (номер або назва) з user_cards, створюючи відсутні."""
+
+    def __init__(self, cursor, user_id, default_card_id=None, create_missing=True):
+        self.cursor = cursor
+        self.user_id = user_id
+        self.default_card_id = default_card_id
+        self.create_missing = create_missing
+        self.created = 0
+        self._cache = {}
+        cursor.execute("SELECT id, name, number FROM user_cards WHERE user_id=?", (user_id,))
+        self._cards = cursor.fetchall()
+
+    def resolve(self, card, bank=''):
+        card = (card or '').strip()
+        if not card:
+            return self.default_card_id
+        if card in self._cache:
+            return self._cache[card]
+
+        digits = _card_digits(card)
+        card_id = None
+        for existing_id, name, number in self._cards:
+            number_digits = _card_digits(number)
+            if digits and len(digits) >= 4 and number_digits.endswith(digits[-4:]):
+                card_id = existing_id
+                break
+            if name.strip().lower() == card.lower():
+                card_id = existing_id
+                break
+
+        if card_id is None and self.create_missing:
+            number = digits or card
+            name = f"Імпорт {number[-4:]}" if digits else card
+            self.cursor.execute(
+                "INSERT INTO user_cards (user_id, name, number, bank, balance) VALUES (?, ?, ?, ?, 0)",
+                (self.user_id, name, number, bank or "Імпорт")
+            )
+            card_id = self.cursor.lastrowid
+            record_balance_checkpoint(self.cursor, card_id, 0)
+            self._cards.append((card_id, name, number))
+            self.created += 1
+
+        card_id = card_id if card_id is not None else self.default_card_id
+        self._cache[card] = card_id
+        return card_id
+
+def _import_key(user_id, operation, created_at, amount_cents, seen):
+    """Ключ ідемпотентності з хешу вмісту рядка.
+
+    Однакові рядки в одному файлі (дві кави за ту ж суму в ту ж хвилину) розрізняються
+    порядковим номером повтору, тож повторний імпорт файлу дає ті самі ключі.
+    """
+    if operation['ref']:
+        content = f"{user_id}|ofx|{operation['card']}|{operation['ref']}"
+    else:
+        content = f"{user_id}|{created_at}|{amount_cents}|{operation['description']}|{operation['card']}"
+    occurrence = seen.get(content, 0)
+    seen[content] = occurrence + 1
+    digest = hashlib.sha1(f"{content}|{occurrence}".encode('utf-8')).hexdigest()
+    return f"import-{digest}"
+
+def import_statement(path, user_id, fmt=None, mapping=None, card_id=None, progress=None,
+                     chunk_size=IMPORT_CHUNK_SIZE, create_cards=True):
+    """Імпортує виписку в transactions однією транзакцією.
+
+    progress(fraction, stats) викликається після кожного пакета. Баланси карток
+    не змінюються: виписка — це історія, а не нові операції.
+    Повертає stats: read, inserted, duplicates, skipped, cards_created, error.
+    """
+    stats = {'read': 0, 'inserted': 0, 'duplicates': 0, 'skipped': 0, 'cards_created': 0, 'error': None}
+    try:
+        source = StatementFile(path)
+        fmt = fmt or detect_format(path)
+        operations = parse_ofx(source) if fmt == 'ofx' else parse_csv(source, mapping)
+
+        with transaction() as c, bulk_insert_transactions(c):
+            categorizer = get_categorizer(c, user_id)
+            cards = CardResolver(c, user_id, card_id, create_cards)
+            seen = {}
+            chunk = []
+
+            def flush():
+                c.executemany(INSERT_SQL, chunk)
+                inserted = max(c.rowcount, 0)
+                stats['inserted'] += inserted
+                stats['duplicates'] += len(chunk) - inserted
+                chunk.clear()
+                if progress:
+                    progress(source.fraction, dict(stats))
+
+            for operation in operations:
+                stats['read'] += 1
+                try:
+                    created_at = parse_date(operation['date'])
+                except ValueError as e:
+                    print(f"Пропущено рядок {stats['read']} виписки: {e}")
+                    stats['skipped'] += 1
+                    continue
+                amount_cents = to_cents(operation['amount'])
+                if not amount_cents:
+                    stats['skipped'] += 1
+                    continue
+
+                description = operation['description'] or "Імпорт виписки"
+                chunk.append((
+                    user_id,
+                    'income' if amount_cents > 0 else 'expense',
+                    abs(amount_cents),
+                    description,
+                    cards.resolve(operation['card'], operation['bank']),
+                    created_at,
+                    _import_key(user_id, operation, created_at, amount_cents, seen),
+                    categorizer.categorize(description),
+                ))
+                if len(chunk) >= chunk_size:
+                    flush()
+
+            if chunk:
+                flush()
+            stats['cards_created'] = cards.created
+            bump_data_version(user_id)
+
+        if progress:
+            progress(1.0, dict(stats))
+    except Exception as e:
+        print(f"Error importing statement: {e}")
+        stats['error'] = str(e)
+        stats['inserted'] = 0
+    return stats
+
+__all__ = [
+    'IMPORT_CHUNK_SIZE',
+    'detect_format',
+    'parse_amount',
+    'parse_date',
+    'parse_csv',
+    'parse_ofx',
+    'StatementFile',
+    'import_statement',
+]
@@ -7,6 +7,8 @@ from kivy.uix.carousel import Carousel
 from kivy.uix.button import Button
 from kivy.uix.label import Label
 from kivy.uix.textinput import TextInput
+from kivy.uix.widget import Widget
+from kivy.clock import Clock
 from kivy.graphics import Color, RoundedRectangle, Rectangle, Line
 from kivy.properties import (
     StringProperty, 
@@ -133,6 +135,25 @@ class PasswordTextInput(BoxLayout):
     def toggle_password(self):
         self.password = not self.password
 
+class BusySpinner(Widget):
+    """Індикатор очікування: дуга, що обертається, поки active (вигляд — у screens.kv)."""
+    active = BooleanProperty(False)
+    angle = NumericProperty(0)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._spin_event = None
+
+    def on_active(self, instance, active):
+        if active and self._spin_event is None:
+            self._spin_event = Clock.schedule_interval(self._spin, 1 / 30.)
+        elif not active and self._spin_event is not None:
+            self._spin_event.cancel()
+            self._spin_event = None
+
+    def _spin(self, dt):
+        self.angle = (self.angle + 360 * dt) % 360
+
 class SavingsPlanItem(BoxLayout):
     plan_name = StringProperty("")
     current_amount = NumericProperty(0)